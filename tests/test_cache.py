@@ -0,0 +1,112 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from tyrannosaurus.cache import ResponseCache, atomic_write
+
+from tests import TestResources
+
+
+class TestCache:
+    def test_fresh_hit(self):
+        requests = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, headers={"ETag": '"v1"'}, text="hello")
+
+        with TestResources.temp_dir() as path, httpx.Client(
+            transport=httpx.MockTransport(handle)
+        ) as client:
+            cache = ResponseCache(path, ttl=60)
+            assert cache.fetch(client, "https://example.org/a").text == "hello"
+            assert cache.fetch(client, "https://example.org/a").text == "hello"
+            assert len(requests) == 1
+
+    def test_revalidate(self):
+        requests = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(
+                200,
+                headers={"ETag": '"v1"', "Last-Modified": "Mon, 03 Oct 2022 00:00:00 GMT"},
+                json={"info": {"version": "1.0"}},
+            )
+
+        async def fetch(cache: ResponseCache) -> httpx.Response:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                return await cache.fetch_async(client, "https://example.org/b")
+
+        with TestResources.temp_dir() as path:
+            cache = ResponseCache(path, ttl=0)
+            assert asyncio.run(fetch(cache)).json() == {"info": {"version": "1.0"}}
+            r = asyncio.run(fetch(cache))
+            assert r.status_code == 200
+            assert r.json() == {"info": {"version": "1.0"}}
+            assert len(requests) == 2
+            assert "If-None-Match" not in requests[0].headers
+            assert requests[1].headers["If-Modified-Since"] == "Mon, 03 Oct 2022 00:00:00 GMT"
+
+    def test_unwritable_or_missing(self, monkeypatch):
+        requests = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, headers={"ETag": '"v1"'}, text="hello")
+
+        def read_only(self, path, data) -> None:
+            raise PermissionError(path)
+
+        url = "https://example.org/d"
+        with TestResources.temp_dir() as path, httpx.Client(
+            transport=httpx.MockTransport(handle)
+        ) as client:
+            cache = ResponseCache(path, ttl=0)
+            assert cache.fetch(client, url).text == "hello"
+            with monkeypatch.context() as m:
+                m.setattr(ResponseCache, "_write", read_only)
+                assert cache.fetch(client, url).text == "hello"
+            assert requests[-1].headers["If-None-Match"] == '"v1"'
+            # the body disappears after the entry was read: a 304 is followed by a full request
+            entry = cache.get(url)
+            monkeypatch.setattr(cache, "get", lambda _: entry)
+            for ttl in [0, 60]:
+                cache.ttl = ttl
+                cache._paths(url)[1].unlink()
+                requests.clear()
+                assert cache.fetch(client, url).text == "hello"
+                assert "If-None-Match" not in requests[-1].headers
+
+    def test_atomic_write(self, monkeypatch):
+        def fail(src, dst) -> None:
+            raise PermissionError(dst)
+
+        with TestResources.temp_dir() as path:
+            atomic_write(path / "a" / "x.txt", "old")
+            monkeypatch.setattr(os, "replace", fail)
+            with pytest.raises(PermissionError):
+                atomic_write(path / "a" / "x.txt", b"new")
+            assert [p.name for p in (path / "a").iterdir()] == ["x.txt"]
+            assert (path / "a" / "x.txt").read_text(encoding="utf8") == "old"
+
+    def test_not_cached(self):
+        def handle(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(503)
+
+        with TestResources.temp_dir() as path, httpx.Client(
+            transport=httpx.MockTransport(handle)
+        ) as client:
+            cache = ResponseCache(path, ttl=60)
+            assert cache.fetch(client, "https://example.org/c").status_code == 503
+            assert cache.get("https://example.org/c") is None
+
+
+if __name__ == "__main__":
+    pytest.main()
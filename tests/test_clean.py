@@ -1,8 +1,13 @@
+import os
+import shutil
+import subprocess  # nosec
 from pathlib import Path
 
 import pytest
 
+from tyrannosaurus import clean
 from tyrannosaurus.clean import Clean
+from tyrannosaurus.helpers import MtimeIndex, TrashList
 
 from tests import TestResources
 
@@ -32,6 +37,109 @@ class TestClean:
         assert ".ipynb_checkpoints" in st
         assert ".tox" in st
 
+    def test_clean_parallel(self):
+        with TestResources.temp_dir() as root:
+            (root / "pyproject.toml").write_text(
+                TestResources.resource("fake", "pyproject.toml").read_text(encoding="utf8"),
+                encoding="utf8",
+            )
+            for d in ["a/__pycache__", "b/c/__pycache__", "b/eggs", "d/e"]:
+                (root / d).mkdir(parents=True)
+            cleaner = Clean(dists=False, aggressive=False, hard_delete=True, dry_run=False, jobs=4)
+            trashed = cleaner.clean(root)
+            assert [p.relative_to(root).as_posix() for p, _ in trashed] == [
+                "a/__pycache__",
+                "b/c/__pycache__",
+                "b/eggs",
+            ]
+            assert not (root / "b" / "eggs").exists()
+            assert (root / "d" / "e").exists()
+
+    def test_clean_incremental(self):
+        with TestResources.temp_dir() as root:
+            root = root.resolve()
+            (root / "pyproject.toml").write_text(
+                TestResources.resource("fake", "pyproject.toml").read_text(encoding="utf8"),
+                encoding="utf8",
+            )
+            for d in ["a/b/c", "d/__pycache__"]:
+                (root / d).mkdir(parents=True)
+            # the index ignores mtimes too recent to trust
+            for d in [root, root / "a", root / "a/b", root / "a/b/c", root / "d"]:
+                os.utime(d, ns=(1_000_000_000, 1_000_000_000))
+            cleaner = Clean(dists=False, aggressive=False, hard_delete=True, dry_run=False)
+            assert [p.name for p, _ in cleaner.clean(root)] == ["__pycache__"]
+            index_path = root / ".tyrannosaurus" / "clean-index.json"
+            index = MtimeIndex(index_path, root, TrashList(False, False)).load()
+            # d held trash, so it's listed again next time
+            assert len(index) == 4
+            assert index.unchanged(str(root / "a"), 1_000_000_000) == ["b"]
+            (root / "a/b/c/__pycache__").mkdir()
+            trashed = cleaner.clean(root)
+            # .tyrannosaurus holds only the index, which is kept
+            assert [p.relative_to(root).as_posix() for p, _ in trashed] == ["a/b/c/__pycache__"]
+
+    def test_clean_free(self, monkeypatch):
+        with TestResources.temp_dir() as root:
+            root = root.resolve()
+            (root / "pyproject.toml").write_text(
+                TestResources.resource("fake", "pyproject.toml").read_text(encoding="utf8"),
+                encoding="utf8",
+            )
+            for d, size in [("a/__pycache__", 300), ("b/__pycache__", 500), ("c/eggs", 100)]:
+                (root / d).mkdir(parents=True)
+                (root / d / "x").write_bytes(b"0" * size)
+            cleaner = Clean(False, False, hard_delete=True, dry_run=False, full=True, free=600)
+            trashed = cleaner.clean(root)
+            assert [p.relative_to(root).as_posix() for p, _ in trashed] == [
+                "b/__pycache__",
+                "a/__pycache__",
+            ]
+            assert cleaner.freed == {"__pycache__": 800}
+            assert (root / "c" / "eggs").exists()
+            # a nested candidate is part of its parent's size
+            measured = []
+            monkeypatch.setattr(clean, "tree_size", lambda path: measured.append(path) or 1)
+            sizes = cleaner._measure([root / "c", root / "c" / "eggs"])
+            assert sizes == {root / "c": 1, root / "c" / "eggs": 0}
+            assert measured == [root / "c"]
+
+    @pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+    def test_clean_git(self, monkeypatch):
+        # without free or measure, nothing is sized
+        monkeypatch.setattr(clean, "tree_size", lambda path: pytest.fail(f"Measured {path}"))
+        with TestResources.temp_dir() as root:
+            root = root.resolve()
+            pyproject = TestResources.resource("fake", "pyproject.toml").read_text(encoding="utf8")
+            pyproject += '\n[tool.tyrannosaurus.clean]\ninclude = ["scratch-*"]\n'
+            pyproject += 'exclude = ["vendor"]\ngit = true\n'
+            (root / "pyproject.toml").write_text(pyproject, encoding="utf8")
+            (root / ".gitignore").write_text(".venv/\n", encoding="utf8")
+            dirs = ["a/__pycache__", "a/scratch-1", ".venv/lib/__pycache__", "vendor/__pycache__"]
+            for d in dirs:
+                (root / d).mkdir(parents=True)
+            (root / "b" / "eggs").mkdir(parents=True)
+            (root / "b" / "eggs" / "tracked.txt").write_text("x", encoding="utf8")
+            subprocess.check_call(["git", "init", "-q"], cwd=root)  # nosec
+            subprocess.check_call(["git", "add", "b"], cwd=root)  # nosec
+            cleaner = Clean(dists=False, aggressive=False, hard_delete=True, dry_run=False)
+            trashed = cleaner.clean(root)
+            assert sorted(p.relative_to(root).as_posix() for p, _ in trashed) == [
+                "a/__pycache__",
+                "a/scratch-1",
+            ]
+            assert cleaner.counts == {"__pycache__": 1, "scratch-*": 1}
+            assert cleaner.freed == {}
+            assert (root / "b" / "eggs").exists()
+            assert (root / ".venv" / "lib" / "__pycache__").exists()
+            # without git, only the exclusion applies
+            cleaner = Clean(False, False, hard_delete=True, dry_run=False, full=True, git=False)
+            trashed = cleaner.clean(root)
+            assert sorted(p.relative_to(root).as_posix() for p, _ in trashed) == [
+                ".venv/lib/__pycache__",
+                "b/eggs",
+            ]
+
     def _make_list(self, *paths: str, root: Path):
         made = []
         for p in paths:
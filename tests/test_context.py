@@ -3,9 +3,11 @@ from pathlib import Path
 import pytest
 
 # noinspection PyProtectedMember
-from tyrannosaurus.context import Context, Source, TyrannoInfo
+from tyrannosaurus.context import Context, Source, TyrannoInfo, WriteBatch
 from tyrannosaurus.enums import TomlBuilder
 
+from tests import TestResources
+
 
 class TestContext:
     def test_toml(self):
@@ -49,10 +51,62 @@ class TestContext:
         assert context.has_opt("align")
         assert context.has_target("init")
         assert context.source("linelength") == "100"
+        # from Poetry dependency groups
+        assert "pytest" in context.dev_deps
+        assert "sphinx" in context.dev_deps
         assert str(context.get_bak_path("pyproject.toml")) == str(
             Path(root / ".tyrannosaurus" / f"pyproject.toml.{TyrannoInfo.timestamp}.bak")
         )
 
+    def test_trash_many(self):
+        with TestResources.temp_dir() as root:
+            root = root.resolve()
+            for d in ["a/__pycache__/x", "b/eggs", "c"]:
+                (root / d).mkdir(parents=True)
+            context = Context(root, data=TomlBuilder().build())
+            paths = [root / "a/__pycache__", "a/__pycache__/x", "b/eggs", "missing", "b/eggs"]
+            trashed = context.trash_many(paths, hard_delete=False)
+            assert [p.relative_to(root).as_posix() for p, _ in trashed] == [
+                "a/__pycache__",
+                "b/eggs",
+            ]
+            for p, bak in trashed:
+                assert not p.exists()
+                assert bak.exists()
+                assert bak.parent == context.tmp_path / p.parent.relative_to(root)
+            (root / "a" / "c").mkdir()
+            (root / "a.b").write_text("", encoding="utf8")
+            deleted = context.trash_many(["a", "a.b", "a/c"], hard_delete=True)
+            assert [p.relative_to(root).as_posix() for p, _ in deleted] == ["a", "a.b"]
+            assert not (root / "a").exists() and not (root / "a.b").exists()
+            with pytest.raises(ValueError):
+                context.trash_many([root.parent], hard_delete=True)
+            with pytest.raises(ValueError):
+                context.trash_many(["c/../.."], hard_delete=True)
+
+    def test_write_batch(self):
+        with TestResources.temp_dir() as root:
+            root = root.resolve()
+            (root / "a.txt").write_text("a", encoding="utf8")
+            (root / "b.txt").write_text("b", encoding="utf8")
+            context = Context(root, data=TomlBuilder().build())
+            batch = WriteBatch(context)
+            assert not batch.write(root / "a.txt", "a")
+            assert batch.write(root / "b.txt", "x")
+            assert batch.write(root / "b.txt", "new")
+            assert batch.write(root / "c" / "c.txt", "c")
+            assert (root / "b.txt").read_text(encoding="utf8") == "b"
+            assert batch.commit() == [root / "b.txt", root / "c" / "c.txt"]
+            assert (root / "b.txt").read_text(encoding="utf8") == "new"
+            assert (root / "c" / "c.txt").read_text(encoding="utf8") == "c"
+            # only the file that was replaced is backed up
+            assert [e.path for e in context.store.entries()] == ["b.txt"]
+            batch.write(root / "a.txt", "changed")
+            batch.discard()
+            assert (root / "a.txt").read_text(encoding="utf8") == "a"
+            names = sorted(p.name for p in root.iterdir())
+            assert names == [".tyrannosaurus", "a.txt", "b.txt", "c"]
+
 
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import pytest
+
+from tyrannosaurus.cache import ResponseCache
+from tyrannosaurus.endpoints import Endpoints
+from tyrannosaurus.enums import License, TomlBuilder, _read_url
+from tyrannosaurus.helpers import PyPiHelper
+from tyrannosaurus.scheduler import Scheduler
+from tyrannosaurus.session import Session
+
+from . import TestResources
+
+
+class TestEndpoints:
+    def test_defaults(self, monkeypatch):
+        for var in Endpoints.env_vars.values():
+            monkeypatch.delenv(var, raising=False)
+        endpoints = Endpoints.of()
+        assert endpoints == Endpoints()
+        assert endpoints.uses_pypi_org
+        assert endpoints.pypi_json_urls("typer") == ["https://pypi.org/pypi/typer/json"]
+
+    def test_precedence(self, monkeypatch):
+        for var in Endpoints.env_vars.values():
+            monkeypatch.delenv(var, raising=False)
+        pypi = ["https://mirror.example/pypi/", "https://pypi.org/pypi"]
+        data = (
+            TomlBuilder()
+            .add("tool.tyrannosaurus.urls.pypi", pypi)
+            .add("tool.tyrannosaurus.urls.conda", "https://conda.example/forge")
+            .build()
+        )
+        endpoints = Endpoints.of(data)
+        assert endpoints.pypi == ("https://mirror.example/pypi", "https://pypi.org/pypi")
+        assert endpoints.conda == ("https://conda.example/forge",)
+        assert endpoints.licenses == Endpoints().licenses
+        monkeypatch.setenv(
+            "TYRANNOSAURUS_PYPI_URL", "https://a.example/pypi, https://b.example/pypi"
+        )
+        endpoints = Endpoints.of(data)
+        assert endpoints.pypi == ("https://a.example/pypi", "https://b.example/pypi")
+        assert not endpoints.uses_pypi_org
+        assert endpoints.conda == ("https://conda.example/forge",)
+
+    def test_pypi_fallback(self):
+        requested = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            requested.append(str(request.url))
+            if request.url.host == "b.example":
+                return httpx.Response(200, json={"info": {"version": "2.0"}})
+            return httpx.Response(404)
+
+        async def get(name: str) -> str:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                return await helper.get_version_async(client, name)
+
+        endpoints = Endpoints(pypi=("https://a.example/pypi", "https://b.example/pypi"))
+        with TestResources.temp_dir() as path:
+            helper = PyPiHelper(cache=ResponseCache(path), endpoints=endpoints)
+            assert asyncio.run(get("typer")) == "2.0"
+        assert requested == [
+            "https://a.example/pypi/typer/json",
+            "https://b.example/pypi/typer/json",
+        ]
+
+    def test_license_fallback(self):
+        def handle(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "down.example":
+                return httpx.Response(503)
+            return httpx.Response(200, text="Copyright {{ year }}")
+
+        old = Session.get()
+        try:
+            # fall back to the next mirror right away, rather than retrying
+            scheduler = Scheduler(retries=0)
+            Session.configure(transport=httpx.MockTransport(handle), scheduler=scheduler)
+            _read_url.cache_clear()
+            bases = ["https://down.example/templates", "https://up.example/templates"]
+            urls = License.mit.template_urls(False, bases)
+            assert urls[1] == "https://up.example/templates/mit.txt"
+            assert License.mit.download_license(bases) == "Copyright {{ year }}"
+            assert scheduler.stats()["down.example"].requests == 1
+        finally:
+            _read_url.cache_clear()
+            Session.configure(old)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,88 @@
+import bz2
+import json
+
+import pytest
+
+from tyrannosaurus.forge import ForgeIndex
+from tyrannosaurus.helpers import EnvHelper
+
+from tests import TestResources
+
+
+class TestForge:
+    def test_build(self):
+        with TestResources.temp_dir() as path:
+            index = ForgeIndex.build(["rdkit", "numpy", "NumPy", "typer", "a"], path / "forge.idx")
+            with index:
+                assert len(index) == 4
+                assert list(index) == ["a", "numpy", "rdkit", "typer"]
+                assert "numpy" in index
+                assert "Typer" in index
+                assert "a" in index
+                assert "b" not in index
+                assert "zzz" not in index
+
+    def test_empty(self):
+        with TestResources.temp_dir() as path:
+            with ForgeIndex.build([], path / "forge.idx") as index:
+                assert len(index) == 0
+                assert "numpy" not in index
+
+    def test_repodata(self):
+        repodata = {
+            "info": {"subdir": "noarch"},
+            "packages": {
+                "typer-0.6.1-pyhd8ed1ab_0.tar.bz2": {"name": "typer", "depends": ["click"]},
+                "tomlkit-0.11.4-pyha770c72_0.tar.bz2": {"name": "tomlkit", "depends": []},
+            },
+            "packages.conda": {"httpx-0.23.0-pyhd8ed1ab_1.conda": {"name": "httpx"}},
+        }
+        with TestResources.temp_dir() as path:
+            (path / "repodata.json.bz2").write_bytes(bz2.compress(json.dumps(repodata).encode()))
+            with ForgeIndex.load(path / "repodata.json.bz2", path / "forge.idx") as index:
+                assert list(index) == ["httpx", "tomlkit", "typer"]
+            assert ForgeIndex.is_index(path / "forge.idx")
+            with ForgeIndex.load(path / "forge.idx") as index:
+                assert "httpx" in index
+                assert "click" not in index
+                lines = EnvHelper(index).process("env", {"typer": "^0.6", "click": ">=8"}, False)
+                assert "    - typer>=0.6,<0.7" in lines
+                assert "        - click>=8" in lines
+
+    def test_fetch_source(self, monkeypatch):
+        downloads = []
+
+        def download(cls, subdir, channels):
+            downloads.append((subdir, channels[0]))
+            return {f"{channels[0]}-{subdir}"}
+
+        monkeypatch.setattr(ForgeIndex, "_download", classmethod(download))
+        a, b = ["https://a.example/forge"], ["https://b.example/forge"]
+        assert ForgeIndex.default_path(a, ["noarch"]) != ForgeIndex.default_path(b, ["noarch"])
+        with TestResources.temp_dir() as path:
+            for channels, subdirs in [(a, ["noarch"]), (a, ["noarch"]), (b, ["noarch"])]:
+                with ForgeIndex.fetch(path / "f.idx", subdirs, channels=channels) as index:
+                    assert list(index) == [f"{channels[0]}-noarch"]
+            # switching channels or subdirs rebuilds the index, even if it's fresh
+            with ForgeIndex.fetch(path / "f.idx", ["linux-64"], channels=b) as index:
+                assert list(index) == [f"{b[0]}-linux-64"]
+            assert downloads == [
+                ("noarch", a[0]),
+                ("noarch", b[0]),
+                ("linux-64", b[0]),
+            ]
+
+    def test_local_repodata(self, monkeypatch):
+        with TestResources.temp_dir() as path:
+            monkeypatch.setenv("TYRANNOSAURUS_CACHE_DIR", str(path / "cache"))
+            repodata = {"packages": {"typer-0.6.1-pyhd8ed1ab_0.tar.bz2": {"name": "typer"}}}
+            (path / "repodata.json").write_text(json.dumps(repodata), encoding="utf8")
+            with ForgeIndex.load(path / "repodata.json") as index:
+                assert list(index) == ["typer"]
+                assert index.path == ForgeIndex.local_path(path / "repodata.json")
+            # a local build must never stand in for the downloaded index
+            assert not ForgeIndex.default_path().exists()
+
+
+if __name__ == "__main__":
+    pytest.main()
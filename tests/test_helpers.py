@@ -1,9 +1,23 @@
+import asyncio
 from pathlib import Path
 
+import httpx
 import pytest
 
+from tyrannosaurus.cache import ResponseCache
+
 # noinspection PyProtectedMember
-from tyrannosaurus.helpers import CondaForgeHelper, PyPiHelper, _Env, TrashList
+from tyrannosaurus.helpers import (
+    CondaForgeHelper,
+    PyPiHelper,
+    TrashList,
+    _Env,
+    normalize_pkg_name,
+    parse_size,
+    walk_trash,
+)
+
+from tests import TestResources
 
 
 class TestHelpers:
@@ -16,6 +30,32 @@ class TestHelpers:
         assert TrashList(False, True).should_delete(Path(".tox"))
         assert not TrashList(True, False).should_delete(Path(".tox"))
 
+    def test_trash_classify(self):
+        trash = TrashList(False, False)
+        assert trash.should_delete(Path("project/docs/_build"))
+        assert not trash.should_delete(Path("project/_build"))
+        assert not trash.should_delete(Path("myeggs"))
+        names = ["eggs", "src", "a.egg-info", "_build", "x.pyc"]
+        assert trash.classify(Path("project/docs"), names) == [True, False, True, True, True]
+        assert trash.match(Path("project/docs/_build")) == "docs/_build"
+        assert trash.match(Path("x.pyc")) == r".*\.py[cod]"
+
+    def test_parse_size(self):
+        assert parse_size("5G") == 5 * 1024**3
+        assert parse_size("1.5MiB") == 1536 * 1024
+        assert parse_size("100") == 100
+        with pytest.raises(ValueError):
+            parse_size("5 lightyears")
+
+    def test_walk_trash(self):
+        with TestResources.temp_dir() as root:
+            for d in ["pkg/__pycache__/nested", "pkg/sub/a.egg-info", ".git/__pycache__", "src"]:
+                (root / d).mkdir(parents=True)
+            (root / "pkg" / "eggs").touch()
+            found = walk_trash(root, TrashList(False, False))
+            found = {p.relative_to(root).as_posix() for p in found}
+            assert found == {"pkg/__pycache__", "pkg/sub/a.egg-info"}
+
     def test_env(self):
         _Env(None, None)
         # env = _Env(None, None)
@@ -33,6 +73,66 @@ class TestHelpers:
         np_version = helper.get_version("grayskull")
         assert np_version is not None
 
+    def test_pypi_fan_out(self):
+        class FakeHelper(PyPiHelper):
+            def __init__(self):
+                super().__init__(concurrency=2)
+                self.calls, self.in_flight, self.max_in_flight = [], 0, 0
+
+            async def get_version_async(self, client, name: str) -> str:
+                self.calls.append(name)
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                await asyncio.sleep(0.01)
+                self.in_flight -= 1
+                if name == "missing":
+                    raise LookupError(name)
+                return "2.0"
+
+        helper = FakeHelper()
+        main = {"python": "^3.9", "a": "^1.0", "b": "2.0", "missing": "^1.0", "A": "^1.0"}
+        dev = {"a": "^1.0", "c": "^1.5"}
+        updates, dev_updates = helper.new_versions_many(main, dev)
+        assert sorted(helper.calls) == ["a", "b", "c", "missing"]
+        assert helper.max_in_flight == 2
+        assert updates == {"a": ("1.0", "2.0"), "A": ("1.0", "2.0")}
+        assert dev_updates == {"a": ("1.0", "2.0"), "c": ("1.5", "2.0")}
+
+    def test_normalize(self):
+        assert normalize_pkg_name("Foo.Bar__baz") == "foo-bar-baz"
+        assert normalize_pkg_name("sphinx") == "sphinx"
+
+    def test_pypi_json(self):
+        requested = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            requested.append(request.url.path)
+            if request.url.path == "/pypi/sphinx-rtd-theme/json":
+                return httpx.Response(200, json={"info": {"version": "1.2.0"}})
+            if request.url.path == "/pypi/broken/json":
+                return httpx.Response(503)
+            if request.url.path == "/project/broken":
+                html = '<h1 class="package-header__name">\n  broken 0.3\n</h1>'
+                return httpx.Response(200, text=html)
+            return httpx.Response(404)
+
+        async def get(name: str) -> str:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                return await helper.get_version_async(client, name)
+
+        with TestResources.temp_dir() as path:
+            helper = PyPiHelper(cache=ResponseCache(path))
+            assert asyncio.run(get("Sphinx_RTD.Theme")) == "1.2.0"
+            assert asyncio.run(get("broken")) == "0.3"
+            with pytest.raises(LookupError):
+                asyncio.run(get("nonexistent"))
+        assert requested == [
+            "/pypi/sphinx-rtd-theme/json",
+            "/pypi/broken/json",
+            "/project/broken",
+            "/pypi/nonexistent/json",
+        ]
+
 
 if __name__ == "__main__":
     pytest.main()
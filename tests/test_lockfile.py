@@ -0,0 +1,104 @@
+import pytest
+
+from tyrannosaurus.context import Context
+from tyrannosaurus.helpers import PyPiHelper
+from tyrannosaurus.lockfile import LockCache, LockedPackage, LockFile
+from tyrannosaurus.update import Update
+
+from tests import TestResources
+
+_lock = """[[package]]
+name = "anyio"
+version = "3.6.1"
+description = "High level compatibility layer"
+category = "main"
+optional = false
+python-versions = ">=3.6.2"
+
+[package.dependencies]
+idna = ">=2.8"
+name = "not-a-package"
+
+[[package]]
+name = "h2"
+version = "4.1.0"
+category = "dev"
+optional = true
+files = [
+    {file = "h2-4.1.0.tar.gz", hash = "sha256:a83aca08fbe7aacb79fec788c9c0bac936343560ed9ec18b82a13a12c28d2abb"},
+]
+
+[metadata]
+lock-version = "1.1"
+
+[metadata.files]
+anyio = [
+    {file = "anyio-3.6.1.tar.gz", hash = "sha256:413adf95f93886e442aea925f3ee43baa5a765a64a0f52c6081894f9992fdd0b"},
+]
+"""
+
+
+class TestLockFile:
+    def test_packages(self):
+        with TestResources.temp_dir() as path:
+            (path / "poetry.lock").write_text(_lock, encoding="utf8")
+            lock = LockFile(path / "poetry.lock")
+            assert list(lock.packages()) == [
+                LockedPackage("anyio", "3.6.1", "main", False),
+                LockedPackage("h2", "4.1.0", "dev", True),
+            ]
+            assert len(lock.digest()) == 64
+
+    def test_update_locked(self, monkeypatch):
+        looked_up = []
+
+        async def get_versions(self, names):
+            looked_up.append(list(names))
+            return {"anyio": "3.6.1", "h2": "4.2.0"}
+
+        monkeypatch.setattr(PyPiHelper, "get_versions_async", get_versions)
+        with TestResources.temp_dir("fake") as path, TestResources.temp_dir() as cache_dir:
+            (path / "poetry.lock").write_text(_lock, encoding="utf8")
+            context = Context(path, dry_run=True)
+            cache = LockCache(cache_dir)
+            for _ in range(2):
+                results = Update.update_locked_many([context], cache=cache)
+                assert results == {context.path: {"h2": ("4.1.0", "4.2.0")}}
+            assert looked_up == [["anyio", "h2"]]
+
+    def test_update_locked_failures(self, monkeypatch):
+        looked_up = []
+
+        async def get_versions(self, names):
+            looked_up.append(list(names))
+            # anyio failed to resolve, as in an outage
+            return {"h2": "4.2.0"}
+
+        monkeypatch.setattr(PyPiHelper, "get_versions_async", get_versions)
+        with TestResources.temp_dir("fake") as path, TestResources.temp_dir() as cache_dir:
+            (path / "poetry.lock").write_text(_lock, encoding="utf8")
+            context = Context(path, dry_run=True)
+            cache = LockCache(cache_dir)
+            for _ in range(2):
+                Update.update_locked_many([context], cache=cache)
+            assert looked_up == [["anyio", "h2"], ["anyio", "h2"]]
+            assert list(cache_dir.iterdir()) == []
+            # malformed entries are misses, and failing to write one isn't an error
+            for malformed in ["{}", '{"stored_at": "x"}', '{"stored_at": 1, "updates": [1]}']:
+                (cache_dir / "abc.json").write_text(malformed, encoding="utf8")
+                assert cache.get("abc") is None
+
+            async def get_all(self, names):
+                return {"anyio": "3.6.1", "h2": "4.2.0"}
+
+            def read_only(self, digest, updates):
+                raise PermissionError(digest)
+
+            monkeypatch.setattr(PyPiHelper, "get_versions_async", get_all)
+            monkeypatch.setattr(LockCache, "put", read_only)
+            results = Update.update_locked_many([context], cache=cache)
+            assert results == {context.path: {"h2": ("4.1.0", "4.2.0")}}
+
+
+if __name__ == "__main__":
+    pytest.main()
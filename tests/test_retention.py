@@ -0,0 +1,142 @@
+import os
+import tarfile
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from tyrannosaurus.enums import TomlBuilder
+from tyrannosaurus.retention import BackupArea, BackupStore, RetentionPolicy
+
+from . import TestResources
+
+
+def _stamp(day: int) -> str:
+    return datetime(2022, 1, day).strftime("%Y-%m-%dT%H-%M-%S")
+
+
+class TestRetention:
+    def test_policy(self):
+        data = (
+            TomlBuilder()
+            .add("tool.tyrannosaurus.retention.max-age", "2w")
+            .add("tool.tyrannosaurus.retention.max-size", "1M")
+            .add("tool.tyrannosaurus.retention.keep", 3)
+            .build()
+        )
+        assert RetentionPolicy.of(data) == RetentionPolicy(14 * 86400, 1024**2, 3)
+        assert RetentionPolicy.of(TomlBuilder().build()) is None
+        with pytest.raises(ValueError):
+            RetentionPolicy.parse_age("soon")
+
+    def test_enforce(self):
+        with TestResources.temp_dir() as path:
+            for day in [1, 2, 3, 4]:
+                (path / f"pyproject.toml.{_stamp(day)}.bak").write_text(str(day), encoding="utf8")
+            (path / "pkg").mkdir()
+            (path / "pkg" / f"__pycache__.{_stamp(4)}.bak").mkdir()
+            (path / "pkg" / f"__pycache__.{_stamp(4)}.bak" / "x.pyc").write_bytes(b"0" * 100)
+            area = BackupArea(path, RetentionPolicy(max_age=2.5 * 86400, keep=2))
+            assert len(area.backups()) == 5
+            now = datetime(2022, 1, 5).timestamp()
+            purged = area.enforce(now=now)
+            BackupArea.wait()
+            # days 1 and 2 were compacted; the archive is dated day 2, so it's too old
+            assert [p.name for p in purged] == [f"backups-{_stamp(2)}.tar.gz"]
+            remaining = sorted(b.path.name for b in area.backups())
+            assert remaining == [
+                f"__pycache__.{_stamp(4)}.bak",
+                f"pyproject.toml.{_stamp(3)}.bak",
+                f"pyproject.toml.{_stamp(4)}.bak",
+            ]
+            assert not (path / ".purge").exists() or list((path / ".purge").iterdir()) == []
+
+    def test_compact_and_size(self):
+        with TestResources.temp_dir() as path:
+            for day in [1, 2, 3]:
+                (path / f"a.txt.{_stamp(day)}.bak").write_bytes(b"0" * 1000)
+            area = BackupArea(path, RetentionPolicy(keep=1, max_size=1500))
+            area.enforce()
+            BackupArea.wait()
+            archive = area.archives()[0].path
+            with tarfile.open(archive) as tar:
+                names = sorted(tar.getnames())
+            assert names == [f"a.txt.{_stamp(1)}.bak", f"a.txt.{_stamp(2)}.bak"]
+            # the archive is small, so only the newest backup plus the archive fit
+            assert [b.path.name for b in area.backups()] == [f"a.txt.{_stamp(3)}.bak"]
+
+    def test_purge_all(self):
+        with TestResources.temp_dir() as path:
+            (path / "keep.json").write_text("{}", encoding="utf8")
+            (path / "big").mkdir()
+            (path / "big" / "file").write_text("x", encoding="utf8")
+            assert BackupArea(path).purge_all(keep=["keep.json"])
+            assert not (path / "big").exists()
+            BackupArea.wait()
+            assert sorted(p.name for p in path.iterdir() if p.name != ".purge") == ["keep.json"]
+
+    def test_wait_timeout(self, monkeypatch):
+        release = threading.Event()
+        delete = BackupArea._delete
+
+        def slow_delete(self, paths) -> None:
+            release.wait(10)
+            delete(self, paths)
+
+        monkeypatch.setattr(BackupArea, "_delete", slow_delete)
+        with TestResources.temp_dir() as path:
+            (path / "big").mkdir()
+            BackupArea(path).purge_all()
+            assert not BackupArea.wait(timeout=0.01)
+            release.set()
+            assert BackupArea.wait(timeout=10)
+            assert list((path / ".purge").iterdir()) == []
+
+    def test_store(self):
+        with TestResources.temp_dir() as path:
+            source = path / "pyproject.toml"
+            source.write_text("a", encoding="utf8")
+            store = BackupStore(path / "store")
+            first = store.put(source, "pyproject.toml", _stamp(1))
+            # the mtime is too recent to trust, but identical content adds nothing
+            assert first.mtime is None
+            assert store.put(source, "pyproject.toml", _stamp(2)) == first
+            old = time.time_ns() - 10**10
+            os.utime(source, ns=(old, old))
+            linked = store.put(source, "pyproject.toml", _stamp(2), link=True)
+            assert linked == first
+            source.write_text("b", encoding="utf8")
+            second = store.put(source, "pyproject.toml", _stamp(3), link=True)
+            assert second.blob != first.blob
+            assert store.blob_path(second.blob).read_text(encoding="utf8") == "b"
+            assert store.blob_path(first.blob).read_text(encoding="utf8") == "a"
+            reloaded = BackupStore(path / "store")
+            assert reloaded.entries() == [first, second]
+            assert reloaded.latest("pyproject.toml") == second
+            assert reloaded.remove([first]) == [store.blob_path(first.blob)]
+
+    def test_enforce_store(self):
+        with TestResources.temp_dir() as path:
+            source = path / "a.txt"
+            area = BackupArea(path, RetentionPolicy(keep=1))
+            for day, content in [(1, "x"), (2, "y"), (3, "x"), (4, "z")]:
+                source.write_text(content, encoding="utf8")
+                area.store.put(source, "a.txt", _stamp(day))
+            assert len(area.stored()) == 4
+            assert sum(b.size for b in area.stored()) == 3
+            purged = area.enforce()
+            BackupArea.wait()
+            # all but the newest are compacted; the blobs only they used are deleted silently
+            assert purged == []
+            with tarfile.open(area.archives()[0].path) as tar:
+                names = sorted(tar.getnames())
+            assert names == [f"a.txt.{_stamp(d)}.bak" for d in [1, 2, 3]]
+            assert [e.time for e in area.store.entries()] == [_stamp(4)]
+            assert len(area.store.unreferenced()) == 0
+            blobs = [p for d in (path / "store" / "blobs").iterdir() for p in d.iterdir()]
+            assert len(blobs) == 1
+
+
+if __name__ == "__main__":
+    pytest.main()
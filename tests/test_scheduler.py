@@ -0,0 +1,59 @@
+import asyncio
+
+import httpx
+import pytest
+
+from tyrannosaurus.scheduler import Scheduler, TokenBucket
+from tyrannosaurus.session import Session
+
+
+class TestScheduler:
+    def test_retry_after(self):
+        statuses = [429, 503, 200]
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            status = statuses.pop(0)
+            headers = {"Retry-After": "0"} if status == 429 else {}
+            return httpx.Response(status, headers=headers, text="ok")
+
+        scheduler = Scheduler(backoff=0)
+        session = Session(transport=httpx.MockTransport(handle), scheduler=scheduler)
+        try:
+            r = session.client.get("https://pypi.example/pypi/typer/json")
+            assert r.status_code == 200
+        finally:
+            session.close()
+        stats = scheduler.stats()["pypi.example"]
+        assert stats.requests == 3
+        assert stats.retries == 2
+        assert stats.throttled == 1
+        assert scheduler.report()[0].startswith("pypi.example: 3 requests, 2 retries")
+
+    def test_give_up(self):
+        def handle(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("down", request=request)
+
+        async def get(session: Session) -> None:
+            async with session.async_client() as client:
+                await client.get("https://down.example/x")
+
+        scheduler = Scheduler(retries=2, backoff=0)
+        session = Session(async_transport=httpx.MockTransport(handle), scheduler=scheduler)
+        with pytest.raises(httpx.ConnectError):
+            asyncio.run(get(session))
+        assert scheduler.stats()["down.example"].errors == 3
+        assert scheduler.delay("down.example", 1, httpx.Response(404)) is None
+        too_long = httpx.Response(429, headers={"Retry-After": "3600"})
+        assert scheduler.delay("down.example", 1, too_long) is None
+
+    def test_bucket(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+        bucket.pause(5)
+        assert bucket.reserve() > 4
+
+
+if __name__ == "__main__":
+    pytest.main()
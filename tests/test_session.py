@@ -0,0 +1,46 @@
+import asyncio
+
+import httpx
+import pytest
+
+from tyrannosaurus.enums import License, _read_url
+from tyrannosaurus.session import Session
+
+
+class TestSession:
+    def test_shared_client(self):
+        requests = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            requests.append(request.url.path)
+            return httpx.Response(200, text="Copyright {{ year }} {{ organization }}")
+
+        old = Session.get()
+        try:
+            session = Session.configure(transport=httpx.MockTransport(handle), timeout=5)
+            assert Session.get() is session
+            assert session.client is session.client
+            assert session.client.timeout.read == 5
+            _read_url.cache_clear()
+            assert License.apache2.download_header().startswith("Copyright")
+            assert License.apache2.download_header().startswith("Copyright")
+            License.apache2.download_license()
+            assert len(requests) == 2
+        finally:
+            _read_url.cache_clear()
+            Session.configure(old)
+
+    def test_async_client(self):
+        def handle(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, text="ok")
+
+        async def get(session: Session) -> str:
+            async with session.async_client(max_connections=3) as client:
+                return (await client.get("https://example.org")).text
+
+        session = Session(async_transport=httpx.MockTransport(handle))
+        assert asyncio.run(get(session)) == "ok"
+
+
+if __name__ == "__main__":
+    pytest.main()
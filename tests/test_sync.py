@@ -1,4 +1,8 @@
+import os
+import re
+import shutil
 from datetime import date
+from pathlib import Path
 
 import pytest
 
@@ -6,7 +10,8 @@ from tests import TestResources
 
 # noinspection PyProtectedMember
 from tyrannosaurus.context import Context
-from tyrannosaurus.sync import Sync
+from tyrannosaurus.helpers import CondaForgeHelper
+from tyrannosaurus.sync import LineRewriter, Sync, SyncState, TargetResult
 
 
 class TestSync:
@@ -20,6 +25,168 @@ class TestSync:
         assert lines[1] == f'__date__ = "{date.today()}"'
         assert lines[2] == '__status__ = "Development"'
 
+    def test_sync_parallel(self, monkeypatch):
+        context = Context(TestResources.resource("fake"), dry_run=True)
+        sync = Sync(context)
+
+        def fail() -> None:
+            raise ValueError("broken")
+
+        monkeypatch.setattr(sync, "fix_dockerfile", fail)
+        sync.sync(jobs=4)
+        assert [r.target for r in sync.results] == list(sync.targets)
+        assert [r.target for r in sync.failures] == ["dockerfile"]
+        assert sync.results[0].lines == sync.fix_init()
+        assert sync.report()[0].startswith("init: 3 lines")
+        assert "dockerfile: failed" in sync.report()[1]
+
+    def test_sync_incremental(self, monkeypatch):
+        with TestResources.temp_dir() as root:
+            root = root / "fake"
+            shutil.copytree(TestResources.resource("fake"), root)
+            init = root / "grayskull" / "__init__.py"
+            sync = Sync(Context(root))
+            sync.sync()
+            assert sync.results[0].lines == sync.fix_init()
+            old = 1_000_000_000
+            os.utime(init, ns=(old, old))
+            sync.sync()
+            assert sync.results[0].skipped
+            # the mtime is now recorded, so a stat is enough
+            with monkeypatch.context() as m:
+                m.setattr(SyncState, "_digest", lambda *args: pytest.fail("Read the file"))
+                sync.sync()
+                assert sync.results[0].skipped
+            init.write_text(init.read_text(encoding="utf8") + "\n", encoding="utf8")
+            sync.sync()
+            assert not sync.results[0].skipped
+            sync.context.sources["status"] = "Production/Stable"
+            sync.sync()
+            assert not sync.results[0].skipped
+            sync.sync(full=True)
+            assert not sync.results[0].skipped
+
+    def test_sync_incremental_recipe(self):
+        with TestResources.temp_dir() as root:
+            root = root / "fake"
+            shutil.copytree(TestResources.resource("fake"), root)
+            recipe = root / "recipes" / "meta.yaml"
+            recipe.parent.mkdir()
+            recipe.write_text('{% set version = "0.0.1" %}\n', encoding="utf8")
+            sync = Sync(Context(root))
+            sync.context.targets.add("recipe")
+            sync.context.sources["recipe"] = "recipes/meta.yaml"
+            sync.context.sources["long_description"] = " ".join(["word"] * 40)
+
+            def run() -> TargetResult:
+                sync.sync()
+                return next(r for r in sync.results if r.target == "recipe")
+
+            assert not run().skipped
+            assert run().skipped
+            # the descriptions are wrapped to the line length
+            wrapped = recipe.read_text(encoding="utf8")
+            sync.context.sources["linelength"] = "40"
+            assert not run().skipped
+            assert recipe.read_text(encoding="utf8") != wrapped
+            del sync.context.sources["linelength"]
+            sync.context.data.x["tool"]["black"]["line-length"] = 60
+            assert not run().skipped
+            assert run().skipped
+
+    def test_write_if_changed(self, monkeypatch):
+        with TestResources.temp_dir() as root:
+            root = root / "fake"
+            shutil.copytree(TestResources.resource("fake"), root)
+            init = root / "grayskull" / "__init__.py"
+            sync = Sync(Context(root))
+            sync.sync()
+            old = 1_000_000_000
+            os.utime(init, ns=(old, old))
+            n_backups = len(sync.context.store.entries())
+            sync.sync(full=True)
+            assert init.stat().st_mtime_ns == old
+            assert len(sync.context.store.entries()) == n_backups
+
+            def fail() -> None:
+                with sync._batched() as batch:
+                    batch.write(root / "Dockerfile", "FROM scratch")
+                raise ValueError("broken")
+
+            monkeypatch.setattr(sync, "fix_dockerfile", fail)
+            sync.context.sources["status"] = "Production/Stable"
+            sync.sync(full=True)
+            assert [r.target for r in sync.failures] == ["dockerfile"]
+            assert not (root / "Dockerfile").exists()
+            assert 'Production/Stable"' in init.read_text(encoding="utf8")
+
+    def test_check(self):
+        with TestResources.temp_dir() as root:
+            root = root / "fake"
+            shutil.copytree(TestResources.resource("fake"), root)
+            init = root / "grayskull" / "__init__.py"
+            Sync(Context(root)).sync()
+            before = init.read_text(encoding="utf8")
+            sync = Sync(Context(root, dry_run=True))
+            assert sync.check() == {}
+            assert "environment" not in [r.target for r in sync.results]
+            sync.context.sources["status"] = "Production/Stable"
+            diffs = sync.check()
+            assert list(diffs.keys()) == [init]
+            assert diffs[init][:2] == ["--- a/grayskull/__init__.py", "+++ b/grayskull/__init__.py"]
+            assert any(line.startswith("+") and "Production/Stable" in line for line in diffs[init])
+            assert init.read_text(encoding="utf8") == before
+
+    def test_check_env(self, monkeypatch):
+        monkeypatch.setattr(CondaForgeHelper, "has_pkg", lambda self, name: True)
+        with TestResources.temp_dir() as root:
+            sync = self._env_project(root)
+            env = sync.context.path_source("environment")
+            diffs = sync.check(network=True)
+            assert sync.failures == []
+            assert any(line == "+name: grayskull" for line in diffs[env])
+            assert env.read_text(encoding="utf8") == "name: old\n"
+
+    def test_sync_env(self, monkeypatch):
+        monkeypatch.setattr(CondaForgeHelper, "has_pkg", lambda self, name: True)
+        with TestResources.temp_dir() as root:
+            sync = self._env_project(root)
+            env = sync.context.path_source("environment")
+            sync.sync()
+            assert sync.failures == []
+            assert "name: grayskull" in env.read_text(encoding="utf8").splitlines()
+            assert sync.check(network=True) == {}
+
+    def _env_project(self, root: Path) -> Sync:
+        root = root / "fake"
+        shutil.copytree(TestResources.resource("fake"), root)
+        (root / "environment.yml").write_text("name: old\n", encoding="utf8")
+        context = Context(root)
+        context.targets.add("environment")
+        context.sources["environment"] = "environment.yml"
+        return Sync(context)
+
+    def test_rewriter(self):
+        keys = (
+            "version:",
+            re.compile(r"ver(sion)? *= *(.*)", re.IGNORECASE),
+            "v",
+            re.compile(r"^ {4}- pip *$"),
+        )
+        rewriter = LineRewriter.of(keys)
+        assert LineRewriter.of(keys) is rewriter
+        matches = [rewriter.match(s) for s in ["version: 1", "VER = 2", "v", "    - pip", "x"]]
+        assert matches == [0, 1, 2, 3, None]
+        lines = ["version: 1", "Version = 2", "vx", "    - pip ", "other"]
+        values = ["version: 3", r"ver\1 = 3", "v3", "    - pip >=20\n    - poetry"]
+        assert list(rewriter.rewrite(lines, values)) == [
+            "version: 3",
+            "version = 3",
+            "v3",
+            "    - pip >=20\n    - poetry",
+            "other",
+        ]
+
 
 if __name__ == "__main__":
     pytest.main()
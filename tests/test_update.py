@@ -1,6 +1,9 @@
+import shutil
+
 import pytest
 
 from tyrannosaurus.context import Context
+from tyrannosaurus.helpers import PyPiHelper
 from tyrannosaurus.update import Update
 
 from . import TestResources
@@ -17,6 +20,28 @@ class TestUpdate:
             assert [x for x in sorted(pkgs.keys())] == ["requests", "tomlkit", "typer"]
             assert list(devs) == ["pytest"]
 
+    def test_update_many(self, monkeypatch):
+        looked_up = []
+
+        async def get_versions(self, names):
+            looked_up.append(list(names))
+            return {name: "99.0" for name in names}
+
+        monkeypatch.setattr(PyPiHelper, "get_versions_async", get_versions)
+        with TestResources.temp_dir() as root:
+            for name in ["a", "b", "nested/c", ".tox/d"]:
+                shutil.copytree(TestResources.resource("fake"), root / name)
+            toml = (root / "b" / "pyproject.toml").read_text(encoding="utf8")
+            toml = toml.replace('requests                 = "^2.23"', 'httpx = "^0.23"')
+            (root / "b" / "pyproject.toml").write_text(toml, encoding="utf8")
+            paths = Update.find_projects(root)
+            assert paths == [root / "a", root / "b", root / "nested" / "c"]
+            results = Update.update_many([Context(p, dry_run=True) for p in paths])
+            assert looked_up == [["httpx", "pytest", "requests", "tomlkit", "typer"]]
+            assert sorted(results[(root / "a").resolve()][0]) == ["requests", "tomlkit", "typer"]
+            assert sorted(results[(root / "b").resolve()][0]) == ["httpx", "tomlkit", "typer"]
+            assert results[(root / "b").resolve()][1] == {"pytest": ("7.1.1", "99.0")}
+
 
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,59 @@
+import shutil
+import subprocess  # nosec
+
+import pytest
+
+from tyrannosaurus.vcs import GitIgnore, GitIndex, GitTree
+
+from . import TestResources
+
+
+class TestVcs:
+    @pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+    def test_index(self):
+        with TestResources.temp_dir() as root:
+            root = root.resolve()
+            for f in ["a/b/c/deep.txt", "a/b/c/deeper.txt", "a/x.txt", "top.txt"]:
+                (root / f).parent.mkdir(parents=True, exist_ok=True)
+                (root / f).write_text("x", encoding="utf8")
+            subprocess.check_call(["git", "init", "-q"], cwd=root)  # nosec
+            subprocess.check_call(["git", "add", "."], cwd=root)  # nosec
+            for version in ["2", "4"]:
+                subprocess.check_call(  # nosec
+                    ["git", "update-index", "--index-version", version], cwd=root
+                )
+                index = GitIndex.read(root / ".git" / "index")
+                assert index.files == {"a/b/c/deep.txt", "a/b/c/deeper.txt", "a/x.txt", "top.txt"}
+                assert index.dirs == {"a", "a/b", "a/b/c"}
+            tree = GitTree.find(root / "a" / "b")
+            assert tree.root == root
+            assert tree.tracked(root / "a" / "b")
+            assert not tree.tracked(root / "a" / "y.txt")
+            assert tree.relative(root.parent) is None
+
+    def test_ignore(self):
+        with TestResources.temp_dir() as root:
+            (root / ".gitignore").write_text(
+                "# comment\n*.log\n!keep.log\n/build\nnode_modules/\ndocs/**/gen\n",
+                encoding="utf8",
+            )
+            (root / "sub").mkdir()
+            (root / "sub" / ".gitignore").write_text("local\n!x.log\n", encoding="utf8")
+            ignore = GitIgnore(root)
+            expected = {
+                ("x.log", False): True,
+                ("keep.log", False): False,
+                ("build", True): True,
+                ("sub/build", True): False,
+                ("sub/node_modules", True): True,
+                ("node_modules", False): False,
+                ("docs/a/b/gen", True): True,
+                ("sub/local", False): True,
+                ("local", False): False,
+                ("sub/x.log", False): False,
+            }
+            assert {k: ignore.ignored(*k) for k in expected} == expected
+
+
+if __name__ == "__main__":
+    pytest.main()
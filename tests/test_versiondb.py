@@ -0,0 +1,101 @@
+import asyncio
+import xmlrpc.client
+
+import httpx
+import pytest
+
+from tyrannosaurus.helpers import PyPiHelper
+from tyrannosaurus.versiondb import VersionDatabase
+
+from tests import TestResources
+
+
+class TestVersionDatabase:
+    def test_sync(self):
+        calls = []
+        events = [
+            ("Typer", "0.7.0", 1, "new release", 101),
+            ("typer", "0.8.0b1", 2, "new release", 102),
+            ("untracked", "9.0", 3, "new release", 103),
+            ("httpx", "0.23.0", 4, "add source file httpx-0.23.0.tar.gz", 104),
+            ("httpx", "0.23.0", 5, "remove release", 105),
+            ("tomlkit", "0.10.0", 6, "new release", 106),
+        ]
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            params, method = xmlrpc.client.loads(request.content)
+            calls.append((method, params))
+            result = 100 if method == "changelog_last_serial" else events
+            body = xmlrpc.client.dumps((result,), methodresponse=True)
+            return httpx.Response(200, content=body.encode(), headers={"Content-Type": "text/xml"})
+
+        with TestResources.temp_dir() as path, httpx.Client(
+            transport=httpx.MockTransport(handle)
+        ) as client:
+            with VersionDatabase(path / "v.sqlite", url="https://mirror/pypi", client=client) as db:
+                assert db.sync() == 0
+                assert db.serial == 100
+                db.put("typer", "0.6.1")
+                db.put("httpx", "0.23.0")
+                db.put("tomlkit", "0.11.4")
+                assert db.sync() == 2
+                assert calls == [("changelog_last_serial", ()), ("changelog_since_serial", (100,))]
+                assert db.serial == 106
+                assert db.get("typer") == "0.7.0"
+                assert db.get("httpx") is None
+                assert db.get("tomlkit") == "0.11.4"
+                assert db.get("untracked") is None
+                assert db.get_many(["typer", "tomlkit", "x"]) == {"typer": "0.7.0", "tomlkit": "0.11.4"}
+
+    def test_sync_fallback(self):
+        down = set()
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            if request.url.host in down:
+                return httpx.Response(503)
+            params, method = xmlrpc.client.loads(request.content)
+            serials = {"a.example": 100, "b.example": 5000}
+            result = serials[request.url.host] if method == "changelog_last_serial" else []
+            body = xmlrpc.client.dumps((result,), methodresponse=True)
+            return httpx.Response(200, content=body.encode(), headers={"Content-Type": "text/xml"})
+
+        urls = ["https://a.example/pypi", "https://b.example/pypi"]
+        with TestResources.temp_dir() as path, httpx.Client(
+            transport=httpx.MockTransport(handle)
+        ) as client:
+            with VersionDatabase(path / "v.sqlite", client=client, urls=urls) as db:
+                db.sync()
+                assert (db.serial, db.serial_url) == (100, urls[0])
+                db.put("typer", "0.6.1")
+                assert db.sync() == 0
+                assert db.get("typer") == "0.6.1"
+                # b's serials mean nothing to a, so start over instead of mixing them
+                down.add("a.example")
+                assert db.sync() == 1
+                assert (db.serial, db.serial_url) == (5000, urls[1])
+                assert db.get("typer") is None
+            # the endpoint that issued the serial isn't configured anymore
+            with VersionDatabase(path / "v.sqlite", client=client, urls=urls[:1]) as db:
+                down.clear()
+                db.put("typer", "0.6.1")
+                assert db.sync() == 1
+                assert (db.serial, db.serial_url) == (100, urls[0])
+
+    def test_helper(self):
+        class FakeHelper(PyPiHelper):
+            async def get_version_async(self, client, name: str) -> str:
+                fetched.append(name)
+                return "2.0"
+
+        fetched = []
+        with TestResources.temp_dir() as path:
+            with VersionDatabase(path / "v.sqlite") as db:
+                db.put("a", "1.0")
+                helper = FakeHelper(database=db)
+                assert asyncio.run(helper.get_versions_async(["a", "b"])) == {"a": "1.0", "b": "2.0"}
+                assert fetched == ["b"]
+                assert db.get("b") == "2.0"
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,71 @@
+import pytest
+
+from tyrannosaurus.versions import Version, VersionEngine, VersionRange
+
+
+class TestVersions:
+    def test_order(self):
+        ordered = ["1.0.dev1", "1.0a1", "1.0a2.dev3", "1.0a2", "1.0b1", "1.0rc1", "1.0", "1.0.post1"]
+        ordered += ["1.1", "1.1+abc.9", "1.1+abc.10", "1.1+abc.10.x", "1.1+abc.10.2", "1!0.1"]
+        versions = [Version.parse(v) for v in ordered]
+        assert sorted(reversed(versions)) == versions
+        assert Version.parse("1.2") == Version.parse("1.2.0")
+        assert Version.parse("v1.2-alpha.3") == Version.parse("1.2a3")
+        assert Version.parse("1.0+ABC-9") == Version.parse("1.0+abc.9")
+        assert Version.parse("1.0rc1").is_prerelease
+        assert not Version.parse("1.0.post1").is_prerelease
+        with pytest.raises(ValueError):
+            Version.parse("latest")
+
+    def test_ranges(self):
+        def contains(spec: str, v: str) -> bool:
+            return Version.parse(v) in VersionRange.parse(spec)
+
+        assert contains("^1.2", "1.9.9") and not contains("^1.2", "2.0")
+        assert contains("^0.2.3", "0.2.9") and not contains("^0.2.3", "0.3")
+        assert contains("^0.0.3", "0.0.3") and not contains("^0.0.3", "0.0.4")
+        assert contains("~1.2.3", "1.2.9") and not contains("~1.2.3", "1.3")
+        assert contains("~1", "1.9") and not contains("~1", "2.0")
+        assert contains("~=1.4.2", "1.4.9") and not contains("~=1.4.2", "1.5")
+        assert contains("~=1.4", "1.9") and not contains("~=1.4", "2.0")
+        assert contains("1.2.*", "1.2.7") and not contains("1.2.*", "1.3")
+        assert contains(">=3.8, <4", "3.11") and not contains(">=3.8, <4", "4.0")
+        assert contains(">=1.0 <2.0", "1.5") and not contains(">=1.0 <2.0", "2.0")
+        assert contains("!=1.5", "1.4") and not contains("!=1.5", "1.5.0")
+        assert contains("^1.0 || ^3.0", "3.1") and not contains("^1.0 || ^3.0", "2.1")
+        assert contains("*", "0.0.1")
+        assert contains("=7.1.1", "7.1.1") and not contains("=7.1.1", "7.1.2")
+        with pytest.raises(ValueError):
+            VersionRange.parse("^1.2 garbage")
+
+    def test_updates(self):
+        engine = VersionEngine()
+        current = {
+            "same": "^1.2",
+            "newer": "^1.2",
+            "breaking": ">=0.23, <1",
+            "pinned": "=7.1.1",
+            "table": {"version": "^0.6", "extras": ["all"]},
+            "git": {"git": "https://github.com/x/y.git"},
+            "pre": "^2.0",
+            "unbounded": "*",
+        }
+        latest = {"same": "1.2.0", "newer": "1.3", "breaking": "1.0", "pinned": "7.1.1"}
+        latest.update({"table": "0.7.0", "git": "1.0", "pre": "3.0b1", "unbounded": "5.0"})
+        assert engine.find_updates(current, latest) == {
+            "newer": ("1.2", "1.3"),
+            "breaking": ("0.23", "1.0"),
+            "table": ("0.6", "0.7.0"),
+        }
+
+    def test_conda(self):
+        engine = VersionEngine()
+        assert engine.to_conda("^1.2") == ">=1.2,<2.0"
+        assert engine.to_conda("^0.6") == ">=0.6,<0.7"
+        assert engine.to_conda("~1.2.3") == ">=1.2.3,<1.3.0"
+        assert engine.to_conda(">=3.8, <4") == ">=3.8,<4"
+        assert engine.to_conda("*") == ""
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,224 @@
+"""
+On-disk HTTP response cache with ETag / Last-Modified revalidation.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Optional, Union
+
+import httpx
+
+logger = logging.getLogger(__package__)
+
+
+def user_cache_dir() -> Path:
+    """
+    The per-user cache directory for Tyrannosaurus.
+    Uses ``$TYRANNOSAURUS_CACHE_DIR`` if set, otherwise the platform's usual cache location.
+    """
+    if os.environ.get("TYRANNOSAURUS_CACHE_DIR"):
+        return Path(os.environ["TYRANNOSAURUS_CACHE_DIR"])
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", str(Path.home() / "AppData" / "Local"))
+    elif sys.platform == "darwin":
+        base = str(Path.home() / "Library" / "Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache"))
+    return Path(base) / "tyrannosaurus"
+
+
+def atomic_write(path: Union[Path, str], data: Union[bytes, str]) -> None:
+    """
+    Writes a file via a temporary file next to it and :func:`os.replace`,
+    so readers see either the old contents or the new, never part of a write.
+    Creates the parent directory if needed; text is written as UTF-8.
+    The temporary file is removed if the write fails.
+    """
+    path = Path(path)
+    if isinstance(data, str):
+        data = data.encode(encoding="utf8")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    url: str
+    final_url: str
+    status_code: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_type: Optional[str]
+    stored_at: float
+
+    def validators(self) -> dict[str, str]:
+        """
+        Headers for a conditional request that revalidates this entry.
+        """
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Caches GET responses on disk, keyed by URL.
+
+    Entries younger than ``ttl`` seconds are served without touching the network.
+    Older entries are revalidated with a conditional request; a 304 refreshes them.
+    Only 200 and 404 responses are stored.
+    """
+
+    cacheable_codes = frozenset({200, 404})
+
+    def __init__(self, path: Union[Path, str], ttl: float = 3600):
+        self.path = Path(path)
+        self.ttl = ttl
+
+    @classmethod
+    def default(cls) -> ResponseCache:
+        """
+        A cache under :func:`user_cache_dir`, with a TTL from ``$TYRANNOSAURUS_CACHE_TTL`` (seconds).
+        """
+        ttl = float(os.environ.get("TYRANNOSAURUS_CACHE_TTL", 3600))
+        return ResponseCache(user_cache_dir() / "http", ttl=ttl)
+
+    def fetch(self, client: httpx.Client, url: str, **kwargs) -> httpx.Response:
+        """
+        Performs a GET through the cache with a synchronous client.
+        """
+        entry = self.get(url)
+        if entry is not None and self.is_fresh(entry):
+            cached = self._to_response(entry)
+            if cached is not None:
+                return cached
+            entry = None
+        headers = {} if entry is None else entry.validators()
+        response = self._handle(url, entry, client.get(url, headers=headers, **kwargs))
+        if response is None:
+            # revalidated, but the body is gone
+            response = self._handle(url, None, client.get(url, **kwargs))
+        return response
+
+    async def fetch_async(self, client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+        """
+        Performs a GET through the cache with an async client.
+        """
+        entry = self.get(url)
+        if entry is not None and self.is_fresh(entry):
+            cached = self._to_response(entry)
+            if cached is not None:
+                return cached
+            entry = None
+        headers = {} if entry is None else entry.validators()
+        response = self._handle(url, entry, await client.get(url, headers=headers, **kwargs))
+        if response is None:
+            # revalidated, but the body is gone
+            response = self._handle(url, None, await client.get(url, **kwargs))
+        return response
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return time.time() - entry.stored_at < self.ttl
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        meta_path, body_path = self._paths(url)
+        try:
+            entry = CachedResponse(**json.loads(meta_path.read_text(encoding="utf8")))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError):
+            logger.debug(f"Ignoring corrupt cache entry for {url}", exc_info=True)
+            return None
+        if entry.url != url or not body_path.exists():
+            return None
+        return entry
+
+    def put(self, url: str, response: httpx.Response) -> CachedResponse:
+        entry = CachedResponse(
+            url=url,
+            final_url=str(response.url),
+            status_code=response.status_code,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            content_type=response.headers.get("Content-Type"),
+            stored_at=time.time(),
+        )
+        meta_path, body_path = self._paths(url)
+        self._write(body_path, response.content)
+        self._write(meta_path, json.dumps(asdict(entry)).encode(encoding="utf8"))
+        return entry
+
+    def clear(self) -> None:
+        if self.path.exists():
+            shutil.rmtree(self.path)
+
+    def _handle(
+        self, url: str, entry: Optional[CachedResponse], response: httpx.Response
+    ) -> Optional[httpx.Response]:
+        # None if the response was a 304 but the cached body can't be read
+        if response.status_code == 304 and entry is not None:
+            logger.debug(f"Revalidated cached {url}")
+            entry = replace(entry, stored_at=time.time())
+            meta_path, _ = self._paths(url)
+            try:
+                self._write(meta_path, json.dumps(asdict(entry)).encode(encoding="utf8"))
+            except OSError:
+                logger.warning(f"Could not refresh cached response for {url}", exc_info=True)
+            return self._to_response(entry)
+        if response.status_code in self.cacheable_codes:
+            try:
+                self.put(url, response)
+            except OSError:
+                logger.warning(f"Could not cache response for {url}", exc_info=True)
+        return response
+
+    def _to_response(self, entry: CachedResponse) -> Optional[httpx.Response]:
+        _, body_path = self._paths(entry.url)
+        try:
+            content = body_path.read_bytes()
+        except FileNotFoundError:
+            logger.debug(f"Cached body for {entry.url} disappeared")
+            return None
+        headers = {} if entry.content_type is None else {"Content-Type": entry.content_type}
+        return httpx.Response(
+            entry.status_code,
+            headers=headers,
+            content=content,
+            request=httpx.Request("GET", entry.final_url),
+        )
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode(encoding="utf8")).hexdigest()
+        parent = self.path / key[:2]
+        return parent / (key + ".json"), parent / (key + ".body")
+
+    def _write(self, path: Path, data: bytes) -> None:
+        atomic_write(path, data)
+
+
+__all__ = ["CachedResponse", "ResponseCache", "atomic_write", "user_cache_dir"]
@@ -10,44 +10,196 @@ You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-
 
 from __future__ import annotations
 
+import fnmatch
+import itertools
 import logging
-from collections.abc import Sequence
+import os
+from collections.abc import Callable, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
 from tyrannosaurus.context import Context
-from tyrannosaurus.helpers import TrashList, scandir_fast
+from tyrannosaurus.helpers import (
+    MtimeIndex,
+    TrashList,
+    tree_size,
+    walk_trash,
+    walk_trash_parallel,
+)
+from tyrannosaurus.sync import SyncState
+from tyrannosaurus.vcs import GitTree
 
 logger = logging.getLogger(__package__)
 
 
+@dataclass(frozen=True)
+class CleanConfig:
+    """
+    Settings from ``[tool.tyrannosaurus.clean]``.
+
+    Attributes:
+        include: More names, paths, or globs to trash (see :class:`TrashList`)
+        exclude: Globs of paths (relative to the project) to never trash or search;
+                 a glob without a ``/`` is also matched against each name
+        git: Skip directories that git ignores and that contain nothing tracked,
+             and never trash anything tracked
+    """
+
+    include: tuple[str, ...] = ()
+    exclude: tuple[str, ...] = ()
+    git: bool = False
+
+    @classmethod
+    def of(cls, data: Any) -> CleanConfig:
+        table = data.get("tool.tyrannosaurus.clean", {})
+        return CleanConfig(
+            include=tuple(str(s) for s in table.get("include", [])),
+            exclude=tuple(str(s) for s in table.get("exclude", [])),
+            git=bool(table.get("git", False)),
+        )
+
+    def excludes(self, path: str) -> bool:
+        """
+        Whether a path, relative to the project and with ``/``, matches an exclude glob.
+        """
+        name = path.rsplit("/", 1)[-1]
+        return any(
+            fnmatch.fnmatchcase(path, g) or "/" not in g and fnmatch.fnmatchcase(name, g)
+            for g in self.exclude
+        )
+
+
 class Clean:
-    def __init__(self, dists: bool, aggressive: bool, hard_delete: bool, dry_run: bool):
+    def __init__(
+        self,
+        dists: bool,
+        aggressive: bool,
+        hard_delete: bool,
+        dry_run: bool,
+        jobs: int = 1,
+        full: bool = False,
+        free: Optional[int] = None,
+        git: Optional[bool] = None,
+        measure: bool = False,
+    ):
+        """
+        Constructor.
+
+        Args:
+            dists: Remove dists
+            aggressive: Delete additional files
+            hard_delete: Use shutil.rmtree instead of moving to .tyrannosaurus
+            dry_run: Don't write; just output
+            jobs: Number of threads for walking and deleting
+            full: List every directory, ignoring the index saved by the last run
+            free: Stop after this many bytes, trashing the largest candidates first
+            git: Use git's index and ignore files (see :class:`CleanConfig`);
+                 if None, use the ``git`` setting from pyproject.toml
+            measure: Record the bytes freed per pattern in :attr:`freed` (implied by ``free``);
+                     this walks every trashed directory, so it's off by default
+        """
         self.dists = dists
         self.aggressive = aggressive
         self.hard_delete = hard_delete
         self.dry_run = dry_run
+        self.jobs = jobs
+        self.full = full
+        self.free = free
+        self.git = git
+        self.measure = measure or free is not None
+        self.counts: Mapping[str, int] = {}
+        self.freed: Mapping[str, int] = {}
 
     def clean(self, path: Path) -> Sequence[tuple[Path, Optional[Path]]]:
         context = Context(path, dry_run=self.dry_run)
         logger.info(f"Clearing {context.tmp_path}")
         trashed = []
-        destroyed = context.destroy_tmp()
-        if destroyed:
-            trashed.append((context.tmp_path, None))
-        trash = TrashList(self.dists, self.aggressive)
-        # we're going to do these in order to save time overall
-        for p in trash.get_list():
-            tup = context.trash(p, self.hard_delete)
-            if tup[0] is not None:
-                trashed.append(tup)
-        for p in scandir_fast(path, trash):
-            p = Path(p)
-            if trash.should_delete(p):
-                tup = context.trash(p, self.hard_delete)
-                if tup[0] is not None:
-                    trashed.append(tup)
+        config = CleanConfig.of(context.data)
+        use_git = config.git if self.git is None else self.git
+        tree = GitTree.find(context.path) if use_git else None
+        trash = TrashList(self.dists, self.aggressive, config.include)
+        prune = self._pruner(context.path, config, tree)
+        index = MtimeIndex(context.tmp_path / "clean-index.json", context.path, trash)
+        if not self.full:
+            index.load()
+        if context.retention is None:
+            if context.destroy_tmp(keep=[index.path.name, SyncState.file_name]):
+                trashed.append((context.tmp_path, None))
+        else:
+            trashed.extend((p, None) for p in context.enforce_retention())
+        # the fixed paths first, then whatever the walk finds
+        if self.jobs > 1:
+            found = walk_trash_parallel(context.path, trash, self.jobs, index, prune)
+        else:
+            found = walk_trash(context.path, trash, index, prune)
+        candidates = itertools.chain((context.path / p for p in trash.get_list()), found)
+        candidates = self._allowed(context.path, dict.fromkeys(candidates), config, tree)
+        sizes = self._measure(candidates) if self.measure else {}
+        if self.free is not None:
+            candidates = self._budget(candidates, sizes)
+        removed = context.trash_many(candidates, self.hard_delete, jobs=self.jobs)
+        counts, freed = {}, {}
+        for p, _ in removed:
+            pattern = trash.match(p) or p.name
+            counts[pattern] = counts.get(pattern, 0) + 1
+            if self.measure:
+                freed[pattern] = freed.get(pattern, 0) + sizes.get(p, 0)
+        self.counts, self.freed = counts, freed
+        trashed.extend(removed)
+        if not self.dry_run:
+            index.save()
         return trashed
 
+    def _pruner(
+        self, root: Path, config: CleanConfig, tree: Optional[GitTree]
+    ) -> Optional[Callable[[str], bool]]:
+        if len(config.exclude) == 0 and tree is None:
+            return None
+
+        def prune(directory: str) -> bool:
+            rel = os.path.relpath(directory, root).replace(os.sep, "/")
+            return config.excludes(rel) or tree is not None and tree.prunes(directory)
+
+        return prune
+
+    def _allowed(
+        self, root: Path, candidates: Sequence[Path], config: CleanConfig, tree: Optional[GitTree]
+    ) -> Sequence[Path]:
+        allowed = []
+        for p in candidates:
+            if config.excludes(p.relative_to(root).as_posix()):
+                logger.debug(f"Not trashing excluded {p}")
+            elif tree is not None and tree.tracked(p):
+                logger.warning(f"Not trashing {p}, which git tracks")
+            else:
+                allowed.append(p)
+        return allowed
+
+    def _measure(self, candidates: Sequence[Path]) -> Mapping[Path, int]:
+        # a candidate inside another is counted in its size (and goes with it), so skip it
+        given = set(candidates)
+        outer = [p for p in candidates if not any(a in given for a in p.parents)]
+        sizes = dict.fromkeys(candidates, 0)
+        if self.jobs > 1:
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                sizes.update(zip(outer, pool.map(tree_size, outer)))
+        else:
+            sizes.update((p, tree_size(p)) for p in outer)
+        return sizes
+
+    def _budget(self, candidates: Sequence[Path], sizes: Mapping[Path, int]) -> Sequence[Path]:
+        chosen, total = [], 0
+        # ties broken by path so the choice is deterministic
+        for p in sorted(candidates, key=lambda c: (-sizes[c], str(c))):
+            if total >= self.free:
+                break
+            chosen.append(p)
+            total += sizes[p]
+        if total < self.free:
+            logger.warning(f"Found only {total} of the {self.free} bytes requested")
+        return chosen
+
 
-__all__ = ["Clean"]
+__all__ = ["Clean", "CleanConfig"]
@@ -13,12 +13,14 @@ import inspect
 import logging
 import os
 import re
+import xmlrpc.client
 from collections.abc import Sequence
 from dataclasses import dataclass
 from pathlib import Path
 from subprocess import check_call  # nosec
 from typing import Optional
 
+import httpx
 import typer
 from typer.models import ArgumentInfo, OptionInfo
 
@@ -26,11 +28,13 @@ from tyrannosaurus.clean import Clean
 from tyrannosaurus.context import Context
 from tyrannosaurus.enums import DevStatus, License
 from tyrannosaurus.envs import CondaEnv
-from tyrannosaurus.helpers import _Env
+from tyrannosaurus.forge import ForgeIndex
+from tyrannosaurus.helpers import _Env, format_size, parse_size
 from tyrannosaurus.new import New
-from tyrannosaurus.recipes import Recipe
+from tyrannosaurus.session import Session
 from tyrannosaurus.sync import Sync
 from tyrannosaurus.update import Update
+from tyrannosaurus.versiondb import VersionDatabase
 
 logger = logging.getLogger(__package__)
 
@@ -91,6 +95,11 @@ class CliState:
         if self.verbose:
             logger.setLevel(logging.DEBUG)
 
+    def report_http(self) -> None:
+        if self.verbose:
+            for line in Session.get().scheduler.report():
+                Msg.info(line)
+
 
 def tyranno_main(
     version: bool = flag("version", "Write version and exit"),
@@ -231,17 +240,48 @@ class CliCommands:
     @staticmethod
     @cli.command()
     def sync(
+        jobs: Optional[int] = typer.Option(
+            None, help="Number of threads [default: one per target]", show_default=False
+        ),
+        full: bool = flag("full", "Run every target, even if nothing changed since the last sync"),
+        check: bool = flag("check", "Write nothing; show a diff and fail if out of sync"),
+        network: bool = flag("network", "With --check, also check targets that use the network"),
         dry_run: bool = flag("dry-run", "Don't write; just output"),
         verbose: bool = flag("verbose", "Output more info"),
     ) -> None:  # pragma: no cover
         """
         Sync project metadata between configured files.
         """
-        state = CliState(dry_run=dry_run, verbose=verbose)
+        state = CliState(dry_run=dry_run or check, verbose=verbose)
         context = Context(Path(os.getcwd()), dry_run=state.dry_run)
+        if check:
+            syncer = Sync(context)
+            diffs = syncer.check(network=network)
+            for diff in diffs.values():
+                for line in diff:
+                    typer.echo(line)
+            for r in syncer.failures:
+                Msg.failure(f"Failed to check {r.target}: {r.error}")
+            if len(diffs) > 0:
+                Msg.failure(f"{len(diffs)} files are out of sync; run 'tyrannosaurus sync'")
+            if len(syncer.failures) > 0:
+                failed = ", ".join(r.target for r in syncer.failures)
+                Msg.failure(f"Could not check {len(syncer.failures)} targets ({failed})")
+            if len(diffs) > 0 or len(syncer.failures) > 0:
+                raise typer.Exit(1)
+            Msg.success("Everything is in sync.")
+            return
         Msg.info("Syncing metadata...")
         Msg.info("Currently, only targets 'init' and 'recipe' are implemented.")
-        targets = Sync(context).sync()
+        syncer = Sync(context)
+        targets = syncer.sync(jobs=jobs, full=full)
+        if verbose:
+            for line in syncer.report():
+                Msg.info(line)
+        if len(syncer.failures) > 0:
+            for r in syncer.failures:
+                Msg.failure(f"Failed to sync {r.target}: {r.error}")
+            raise typer.Exit(1)
         Msg.success(f"Done. Synced to {len(targets)} targets: {targets}")
 
     @staticmethod
@@ -253,6 +293,16 @@ class CliCommands:
         ),
         dev: bool = flag("dev", "Include dev/build dependencies"),
         extras: bool = flag("extras", "Include optional dependencies"),
+        forge_index: Optional[str] = typer.Option(
+            None,
+            help=inspect.cleandoc(
+                """
+                Check Conda-Forge offline, using this repodata.json or index file.
+                Use 'download' to fetch (and cache) the Conda-Forge repodata.
+                """
+            ),
+            show_default=False,
+        ),
         dry_run: bool = flag("dry-run", "Don't write; just output"),
         verbose: bool = flag("verbose", "Output more info"),
     ) -> None:  # pragma: no cover
@@ -264,8 +314,14 @@ class CliCommands:
         context = Context(Path(os.getcwd()), dry_run=state.dry_run)
         if name is None:
             name = context.project
-        CondaEnv(name, dev=dev, extras=extras).create(context, path)
+        index = None
+        if forge_index == "download":
+            index = ForgeIndex.fetch(channels=context.endpoints.conda)
+        elif forge_index is not None:
+            index = ForgeIndex.load(Path(forge_index))
+        CondaEnv(name, dev=dev, extras=extras, index=index).create(context, path)
         Msg.success(f"Wrote environment file {path}")
+        state.report_http()
 
     @staticmethod
     @cli.command()
@@ -276,6 +332,9 @@ class CliCommands:
         """
         Generate a Conda recipe using grayskull.
         """
+        # grayskull is slow to import, so only import it for this command
+        from tyrannosaurus.recipes import Recipe
+
         state = CliState(dry_run=dry_run, verbose=verbose)
         dry_run = state.dry_run
         context = Context(Path(os.getcwd()), dry_run=dry_run)
@@ -286,25 +345,76 @@ class CliCommands:
     @staticmethod
     @cli.command()
     def update(
+        paths: Optional[list[Path]] = typer.Argument(
+            None, help="Project roots [default: the current directory]", show_default=False
+        ),
+        scan: bool = flag("scan", "Search under the paths for projects with a pyproject.toml"),
+        lock: bool = flag("lock", "Compare the versions in poetry.lock, including transitive deps"),
         auto_fix=flag("auto-fix", "Update dependencies in place (not supported yet)", hidden=True),
+        concurrency: int = typer.Option(16, help="Maximum number of simultaneous PyPi requests"),
+        version_db: Optional[Path] = typer.Option(
+            None,
+            help="Local SQLite database of latest versions, synced from PyPi's changelog",
+            show_default=False,
+        ),
         verbose: bool = flag("verbose", "Output more information"),
     ) -> None:  # pragma: no cover
         """
         Find and list dependencies that could be updated.
 
         Args:
+            paths: Project roots [default: the current directory]
+            scan: Search under the paths for projects with a pyproject.toml
+            lock: Compare the versions in poetry.lock, including transitive deps
             auto_fix: Update dependencies in place (not supported yet)
+            concurrency: Maximum number of simultaneous PyPi requests
+            version_db: Local SQLite database of latest versions, synced from PyPi's changelog
             verbose: Output more information
         """
         state = CliState(verbose=verbose)
-        context = Context(Path(os.getcwd()), dry_run=not auto_fix)
-        updates, dev_updates = Update(context).update()
-        Msg.info("Main updates:")
-        for pkg, (old, up) in updates.items():
-            Msg.info(f"    {pkg}:  {old} --> {up}")
-        Msg.info("Dev updates:")
-        for pkg, (old, up) in dev_updates.items():
-            Msg.info(f"    {pkg}:  {old} --> {up}")
+        paths = [Path(os.getcwd())] if not paths else paths
+        if scan:
+            paths = [p for path in paths for p in Update.find_projects(path)]
+        contexts = []
+        for path in paths:
+            try:
+                contexts.append(Context(path, dry_run=not auto_fix))
+            except (OSError, KeyError, ValueError):
+                Msg.failure(f"Skipping {path}: could not read pyproject.toml")
+                logger.debug(f"Failed reading {path}", exc_info=True)
+        database = None
+        if version_db is not None:
+            # like the lookups, use the first project's mirrors
+            urls = contexts[0].endpoints.pypi if len(contexts) > 0 else None
+            database = VersionDatabase(version_db, urls=urls)
+            try:
+                database.sync()
+            except (OSError, httpx.HTTPError, xmlrpc.client.Error):
+                Msg.failure("Could not sync the version database; it may be out of date")
+                logger.debug("Version database sync failed", exc_info=True)
+        if lock:
+            locked = Update.update_locked_many(
+                contexts, concurrency=concurrency, database=database
+            )
+            for path, updates in locked.items():
+                if len(locked) > 1:
+                    Msg.success(f"{path}:")
+                Msg.info("Locked updates:")
+                for pkg, (old, up) in updates.items():
+                    Msg.info(f"    {pkg}:  {old} --> {up}")
+            state.report_http()
+            return
+        results = Update.update_many(contexts, concurrency=concurrency, database=database)
+        for path, (updates, dev_updates) in results.items():
+            if len(results) > 1:
+                Msg.success(f"{path}:")
+            Msg.info("Main updates:")
+            for pkg, (old, up) in updates.items():
+                Msg.info(f"    {pkg}:  {old} --> {up}")
+            Msg.info("Dev updates:")
+            for pkg, (old, up) in dev_updates.items():
+                Msg.info(f"    {pkg}:  {old} --> {up}")
+        state.report_http()
         if not state.dry_run:
             Msg.failure("Auto-fixing is not supported yet!")
 
@@ -318,6 +428,21 @@ class CliCommands:
         hard_delete: bool = flag(
             "hard-delete", "Use shutil.rmtree instead of moving to .tyrannosaurus"
         ),
+        jobs: int = typer.Option(1, help="Number of threads for walking and deleting"),
+        full: bool = flag("full", "Rescan every directory, ignoring the index from the last run"),
+        free: Optional[str] = typer.Option(
+            None,
+            help="Stop once this much (e.g. 5G) is trashed, largest first; "
+            + "use --hard-delete to release the space now",
+            show_default=False,
+        ),
+        git: Optional[bool] = typer.Option(
+            None,
+            "--git/--no-git",
+            help="Skip what git ignores and never trash what it tracks "
+            + "[default: from tool.tyrannosaurus.clean]",
+            show_default=False,
+        ),
         dry_run: bool = flag("dry-run", "Don't write; just output"),
         verbose: bool = flag("verbose", "Output more information"),
     ) -> None:  # pragma: no cover
@@ -328,8 +453,31 @@ class CliCommands:
         """
         state = CliState(verbose=verbose, dry_run=dry_run)
         dry_run = state.dry_run
-        trashed = Clean(dists, aggressive, hard_delete, dry_run).clean(Path(os.getcwd()))
-        Msg.info(f"Trashed {len(trashed)} paths.")
+        try:
+            n_bytes = None if free is None else parse_size(free)
+        except ValueError:
+            raise typer.BadParameter(f"Invalid size {free}", param_hint="--free")
+        # measuring walks every trashed tree, so only do it to report sizes
+        cleaner = Clean(
+            dists,
+            aggressive,
+            hard_delete,
+            dry_run,
+            jobs=jobs,
+            full=full,
+            free=n_bytes,
+            git=git,
+            measure=verbose,
+        )
+        trashed = cleaner.clean(Path(os.getcwd()))
+        if cleaner.measure:
+            Msg.info(f"Trashed {len(trashed)} paths ({format_size(sum(cleaner.freed.values()))}).")
+            for pattern, n_bytes in sorted(cleaner.freed.items(), key=lambda e: -e[1]):
+                Msg.info(f"    {pattern}:  {format_size(n_bytes)}")
+        else:
+            Msg.info(f"Trashed {len(trashed)} paths.")
+            for pattern, n in sorted(cleaner.counts.items(), key=lambda e: -e[1]):
+                Msg.info(f"    {pattern}:  {n}")
 
     @staticmethod
     @cli.command()
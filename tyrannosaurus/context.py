@@ -14,45 +14,53 @@ import logging
 import os
 import re
 import shutil
-from collections.abc import Mapping, Sequence
+import threading
+from collections.abc import Iterable, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Union
 
 from tyrannosaurus import TyrannoInfo
+from tyrannosaurus.endpoints import Endpoints
 from tyrannosaurus.enums import DevStatus, License, Toml
 from tyrannosaurus.parser import LiteralParser
+from tyrannosaurus.retention import BackupArea, BackupStore, RetentionPolicy
 
 logger = logging.getLogger(__package__)
 
 
 class Source:
     @classmethod
-    def parse(cls, s: str, toml: Toml) -> Union[str, Sequence]:
+    def literal_parser(cls, toml: Toml) -> LiteralParser:
+        """
+        The parser for quoted (literal) sources, which can be reused for every source in ``toml``.
+        """
         from tyrannosaurus import TyrannoInfo
 
-        project = toml["tool.poetry.name"]
-        version = toml["tool.poetry.version"]
-        description = toml["tool.poetry.description"]
-        authors = toml["tool.poetry.authors"]
-        keywords = toml["tool.poetry.keywords"]
-        license_name = toml["tool.poetry.license"]
-        status = DevStatus.guess_from_version(version)
+        # lookups in a tomlkit document are slow, so do them once
+        poetry = toml["tool.poetry"]
+        version = poetry["version"]
+        return LiteralParser(
+            project=poetry["name"],
+            user=None,
+            authors=poetry["authors"],
+            description=poetry["description"],
+            keywords=poetry["keywords"],
+            version=version,
+            status=DevStatus.guess_from_version(version),
+            license_name=poetry["license"],
+            tyranno_vr=TyrannoInfo.version,
+            endpoints=Endpoints.of(toml),
+        )
+
+    @classmethod
+    def parse(
+        cls, s: str, toml: Toml, parser: Optional[LiteralParser] = None
+    ) -> Union[str, Sequence]:
         if isinstance(s, str) and s.startswith("'") and s.endswith("'"):
-            return (
-                LiteralParser(
-                    project=project,
-                    user=None,
-                    authors=authors,
-                    description=description,
-                    keywords=keywords,
-                    version=version,
-                    status=status,
-                    license_name=license_name,
-                    tyranno_vr=TyrannoInfo.version,
-                )
-                .parse(s)
-                .strip("'")
-            )
+            if parser is None:
+                parser = cls.literal_parser(toml)
+            return parser.parse(s).strip("'")
         elif isinstance(s, str):
             value = toml[s]
             return str(value)
@@ -67,14 +75,15 @@ class Context:
         if data is None:
             data = Toml.read(Path(self.path) / "pyproject.toml")
         self.data = data
+        self.endpoints = Endpoints.of(data)
+        self.retention = RetentionPolicy.of(data)
         self.options = {k for k, v in data.get("tool.tyrannosaurus.options", {}).items() if v}
         self.targets = {k for k, v in data.get("tool.tyrannosaurus.targets", {}).items() if v}
-        self.sources = {
-            k: Source.parse(v, data)
-            for k, v in data.get("tool.tyrannosaurus.sources", {}).items()
-            if v
-        }
+        sources = {k: v for k, v in data.get("tool.tyrannosaurus.sources", {}).items() if v}
+        parser = Source.literal_parser(data) if len(sources) > 0 else None
+        self.sources = {k: Source.parse(v, data, parser) for k, v in sources.items()}
         self.tmp_path = self.path / ".tyrannosaurus"
+        self.store = BackupStore(self.tmp_path / BackupArea.store_dir)
         self.dry_run = dry_run
 
     @property
@@ -108,26 +117,52 @@ class Context:
 
     @property
     def dev_deps(self) -> Mapping[str, str]:
-        return self.data["tool.poetry.dev-dependencies"]
+        if "tool.poetry.dev-dependencies" in self.data:
+            return self.data["tool.poetry.dev-dependencies"]
+        # Poetry 1.2+ uses dependency groups instead
+        deps = {}
+        for _, group in self.data.get("tool.poetry.group", {}).items():
+            deps.update(group.get("dependencies", {}))
+        return deps
 
     @property
     def extras(self) -> Mapping[str, str]:
         return self.data["tool.poetry.extras"]
 
-    def destroy_tmp(self) -> bool:
-        if not self.dry_run and self.tmp_path.exists():
-            shutil.rmtree(str(self.tmp_path))
-            return True
-        return False
-
-    def back_up(self, path: Union[Path, str]) -> None:
+    def destroy_tmp(self, keep: Iterable[str] = ()) -> bool:
+        """
+        Empties ``.tyrannosaurus``, except for the named top-level entries.
+        The contents are renamed aside immediately and deleted on a background thread.
+        """
+        if self.dry_run:
+            return False
+        return BackupArea(self.tmp_path).purge_all(keep)
+
+    def enforce_retention(self) -> Sequence[Path]:
+        """
+        Applies ``[tool.tyrannosaurus.retention]`` to ``.tyrannosaurus``, if it's configured.
+
+        Returns:
+            The backups purged
+        """
+        if self.dry_run or self.retention is None:
+            return []
+        return BackupArea(self.tmp_path, self.retention).enforce()
+
+    def back_up(self, path: Union[Path, str], replace: bool = False) -> None:
+        """
+        Saves the file's current contents to the :class:`BackupStore`.
+
+        Args:
+            path: A file in the project
+            replace: The caller will replace the file with :func:`os.replace`, not rewrite it
+        """
         path = Path(path)
         self.check_path(path)
-        bak = self.get_bak_path(path)
         if not self.dry_run:
-            bak.parent.mkdir(exist_ok=True, parents=True)
-            shutil.copyfile(str(path), str(bak))
-            logger.debug(f"Generated backup of {path} to {bak}")
+            name = path.resolve().relative_to(self.path).as_posix()
+            entry = self.store.put(path, name, TyrannoInfo.timestamp, link=replace)
+            logger.debug(f"Backed up {path} as {entry.blob}")
 
     def trash(self, path: str, hard_delete: bool) -> tuple[Optional[Path], Optional[Path]]:
         return self.delete_exact_path(self.path / path, hard_delete=hard_delete)
@@ -151,12 +186,89 @@ class Context:
             logger.debug(f"Trashed {path} to {bak}")
             return path, bak
 
+    def trash_many(
+        self, paths: Iterable[Union[Path, str]], hard_delete: bool, jobs: int = 1
+    ) -> Sequence[tuple[Path, Optional[Path]]]:
+        """
+        Trashes (or deletes) many paths in one batch.
+
+        Each distinct parent directory is resolved once, and containment is checked
+        with a prefix comparison on the resolved paths.
+        All backup directories are created in one pass before anything is moved.
+        Paths that don't exist, repeats, and paths under another path in the batch are skipped.
+
+        Args:
+            paths: Paths, either absolute or relative to the project root
+            hard_delete: Delete instead of moving to ``.tyrannosaurus``
+            jobs: Number of threads for the renames or deletions
+
+        Returns:
+            (path, backup) pairs in the order given; the backup is None if hard-deleted
+
+        Raises:
+            ValueError: If a path is the project root or is outside of it
+        """
+        root = str(self.path)
+        parents: dict[str, str] = {}
+        found: dict[str, None] = {}
+        for path in paths:
+            path = self.path / path
+            parent = str(path.parent)
+            if parent not in parents:
+                parents[parent] = os.path.realpath(parent)
+            # normpath so that a trailing '..' can't escape the prefix check
+            real = os.path.normpath(os.path.join(parents[parent], path.name))
+            if not real.startswith(root + os.sep):
+                raise ValueError(f"Cannot touch {real}: not under the parent dir {root}")
+            if os.path.lexists(real):
+                found[real] = None
+        # anything inside another item goes with it
+        # check every ancestor: a sibling like 'a.b' can sort between 'a' and 'a/c'
+        nested = set()
+        for real in found:
+            parent = os.path.dirname(real)
+            while len(parent) > len(root):
+                if parent in found:
+                    nested.add(real)
+                    break
+                parent = os.path.dirname(parent)
+        items = [
+            (Path(real), None if hard_delete else self._bak_path(Path(real)))
+            for real in found
+            if real not in nested
+        ]
+        if not self.dry_run and not hard_delete:
+            for parent in sorted({bak.parent for _, bak in items}):
+                parent.mkdir(parents=True, exist_ok=True)
+        if jobs > 1:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                list(pool.map(lambda item: self._remove(*item), items))
+        else:
+            for item in items:
+                self._remove(*item)
+        return items
+
+    def _remove(self, path: Path, bak: Optional[Path]) -> None:
+        if bak is None:
+            if not self.dry_run:
+                if path.is_dir() and not path.is_symlink():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink()
+            logger.debug(f"Deleted {path}")
+        else:
+            if not self.dry_run:
+                os.rename(str(path), str(bak))
+            logger.debug(f"Trashed {path} to {bak}")
+
     def get_bak_path(self, path: Union[Path, str]):
         if not str(path).startswith(str(self.path)):
             path = self.path / path
-        path = Path(path).resolve()
-        suffix = path.suffix + "." + TyrannoInfo.timestamp + ".bak"
-        return self.tmp_path / path.relative_to(self.path).with_suffix(suffix)
+        return self._bak_path(Path(path).resolve())
+
+    def _bak_path(self, resolved: Path) -> Path:
+        suffix = resolved.suffix + "." + TyrannoInfo.timestamp + ".bak"
+        return self.tmp_path / resolved.relative_to(self.path).with_suffix(suffix)
 
     def check_path(self, path: Union[Path, str]) -> None:
         # none of these should even be possible, but let's be 100% sure
@@ -195,4 +307,122 @@ class Context:
         return key in self.targets
 
 
-__all__ = ["Context"]
+class WriteBatch:
+    """
+    File writes that take effect together, and only if they change something.
+
+    :meth:`write` compares the new contents with the file's and, if they differ,
+    stages them in a temporary file next to it.
+    :meth:`commit` then backs up every file being replaced
+    and renames all of the staged files into place one after another.
+    A crash before the commit leaves every file as it was;
+    an unchanged file is neither backed up nor touched, so its mtime is kept.
+
+    With ``in_memory``, nothing is staged on disk; the old and new contents are kept in
+    :attr:`changes` instead, for checking.
+    """
+
+    def __init__(self, context: Context, in_memory: bool = False):
+        self.context = context
+        self.in_memory = in_memory
+        self._staged: dict[Path, Path] = {}
+        self._changes: dict[Path, tuple[Optional[str], str]] = {}
+        self._lock = threading.Lock()
+
+    def write(self, path: Union[Path, str], content: str) -> bool:
+        """
+        Stages ``content`` for ``path``, replacing anything staged for it before.
+
+        Returns:
+            Whether the content differs from what's in the file
+
+        Raises:
+            ValueError: If the path isn't under the project root
+        """
+        path = Path(path)
+        # unlike check_path, this allows new files
+        if self.context.path not in path.resolve().parents:
+            raise ValueError(f"Cannot write {path.resolve()}: not under {self.context.path}")
+        data = content.encode(encoding="utf8")
+        try:
+            current = path.read_bytes()
+        except FileNotFoundError:
+            current = None
+        with self._lock:
+            previous = self._staged.pop(path, None)
+            self._changes.pop(path, None)
+        if previous is not None:
+            previous.unlink(missing_ok=True)
+        if data == current:
+            logger.debug(f"{path} is unchanged")
+            return False
+        if self.in_memory:
+            old = None if current is None else current.decode(encoding="utf8", errors="replace")
+            with self._lock:
+                self._changes[path] = old, content
+        elif not self.context.dry_run:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            if current is not None:
+                shutil.copymode(path, tmp)
+            with self._lock:
+                self._staged[path] = tmp
+        return True
+
+    @property
+    def staged(self) -> Sequence[Path]:
+        with self._lock:
+            return list(self._staged)
+
+    @property
+    def changes(self) -> Mapping[Path, tuple[Optional[str], str]]:
+        """
+        For an ``in_memory`` batch, the current (None if missing) and new contents of each file.
+        """
+        with self._lock:
+            return dict(self._changes)
+
+    def absorb(self, other: WriteBatch) -> None:
+        """
+        Takes over another batch's staged writes, so that they're committed with these.
+        """
+        with other._lock:
+            staged, other._staged = other._staged, {}
+            changes, other._changes = other._changes, {}
+        with self._lock:
+            self._changes.update(changes)
+            for path, tmp in staged.items():
+                previous = self._staged.pop(path, None)
+                if previous is not None:
+                    previous.unlink(missing_ok=True)
+                self._staged[path] = tmp
+
+    def discard(self) -> None:
+        with self._lock:
+            staged, self._staged = self._staged, {}
+            self._changes = {}
+        for tmp in staged.values():
+            tmp.unlink(missing_ok=True)
+
+    def commit(self) -> Sequence[Path]:
+        """
+        Backs up the files being replaced, then moves the staged files into place.
+
+        Returns:
+            The paths written
+        """
+        with self._lock:
+            staged, self._staged = self._staged, {}
+        for path in staged:
+            if path.exists():
+                self.context.back_up(path, replace=True)
+        # nothing slow between the renames, to keep the window for a partial update small
+        for path, tmp in staged.items():
+            os.replace(tmp, path)
+        for path in staged:
+            logger.debug(f"Wrote to {path}")
+        return list(staged)
+
+
+__all__ = ["Context", "WriteBatch"]
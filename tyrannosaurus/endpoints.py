@@ -0,0 +1,83 @@
+"""
+Configurable URLs for package indices, Conda channels, and license templates.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass, fields
+from typing import Any, ClassVar, Optional, Union
+
+logger = logging.getLogger(__package__)
+
+
+@dataclass(frozen=True)
+class Endpoints:
+    """
+    Base URLs for each kind of lookup, in order of preference.
+    Each lookup tries the URLs in order and falls back to the next if one fails.
+
+    Attributes:
+        pypi: PyPi-compatible bases, serving ``<base>/<name>/json`` (and XML-RPC at ``<base>``)
+        conda: Conda channel URLs, serving ``<channel>/<subdir>/repodata.json.bz2``
+        anaconda: anaconda.org-style package page bases, serving ``<base>/<name>``
+        licenses: Bases for license templates, serving ``<base>/<name>.txt``
+    """
+
+    pypi: tuple[str, ...] = ("https://pypi.org/pypi",)
+    conda: tuple[str, ...] = ("https://conda.anaconda.org/conda-forge",)
+    anaconda: tuple[str, ...] = ("https://anaconda.org/conda-forge",)
+    licenses: tuple[str, ...] = (
+        "https://raw.githubusercontent.com/licenses/license-templates/master/templates",
+    )
+
+    env_vars: ClassVar[dict[str, str]] = {
+        "pypi": "TYRANNOSAURUS_PYPI_URL",
+        "conda": "TYRANNOSAURUS_CONDA_URL",
+        "anaconda": "TYRANNOSAURUS_ANACONDA_URL",
+        "licenses": "TYRANNOSAURUS_LICENSE_URL",
+    }
+
+    @classmethod
+    def of(cls, data: Optional[Any] = None) -> Endpoints:
+        """
+        Reads endpoints from the environment, then pyproject.toml, then the defaults.
+
+        Environment variables (e.g. ``$TYRANNOSAURUS_PYPI_URL``) take comma-separated URLs.
+        In pyproject.toml, each key under ``[tool.tyrannosaurus.urls]`` takes a string or list.
+
+        Args:
+            data: A :class:`tyrannosaurus.enums.Toml` for pyproject.toml
+        """
+        values = {}
+        urls = {} if data is None else data.get("tool.tyrannosaurus.urls", {})
+        for f in fields(cls):
+            if f.name in urls:
+                values[f.name] = cls._split(urls[f.name])
+            if os.environ.get(cls.env_vars[f.name]):
+                values[f.name] = cls._split(os.environ[cls.env_vars[f.name]])
+        return Endpoints(**values)
+
+    def pypi_json_urls(self, name: str) -> Sequence[str]:
+        return [f"{base}/{name}/json" for base in self.pypi]
+
+    @property
+    def uses_pypi_org(self) -> bool:
+        return any("//pypi.org/" in base + "/" for base in self.pypi)
+
+    @classmethod
+    def _split(cls, value: Union[str, Sequence[str]]) -> tuple[str, ...]:
+        values = re.split(r"[,\s]+", value) if isinstance(value, str) else value
+        return tuple(str(v).rstrip("/") for v in values if str(v).strip() != "")
+
+
+__all__ = ["Endpoints"]
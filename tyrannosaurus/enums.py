@@ -11,13 +11,20 @@ You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-
 from __future__ import annotations
 
 import enum
-from collections.abc import Mapping
+import functools
+import logging
+from collections.abc import Mapping, Sequence
 from pathlib import Path, PurePath
 from typing import Any, Optional, Union
 
 import httpx
 import tomlkit
 
+from tyrannosaurus.endpoints import Endpoints
+from tyrannosaurus.session import Session
+
+logger = logging.getLogger(__package__)
+
 
 class DevStatus(str, enum.Enum):
     planning = "planning"
@@ -245,26 +252,38 @@ class License(str, enum.Enum):
             "agpl3": "GPL",
         }[self.name]
 
-    def download_license(self) -> str:
-        return self._read_url(self.license_url)
+    def download_license(self, bases: Optional[Sequence[str]] = None) -> str:
+        return self._read_urls(self.template_urls(False, bases))
 
-    def download_header(self) -> str:
+    def download_header(self, bases: Optional[Sequence[str]] = None) -> str:
         if self is License.mit:
             return ""
-        return self._read_url(self.header_url)
+        return self._read_urls(self.template_urls(True, bases))
 
-    def _read_url(self, url: str) -> str:
-        response = httpx.get(url)
-        if response.status_code > 400:
-            raise ValueError(f"Status code {response.status_code} for url {url}")
-        return response.text
+    def _read_urls(self, urls: Sequence[str]) -> str:
+        for url in urls[:-1]:
+            try:
+                return _read_url(url)
+            except (ValueError, httpx.HTTPError):
+                logger.warning(f"Failed to download {url}; trying the next mirror", exc_info=True)
+        return _read_url(urls[-1])
 
     @property
     def license_url(self) -> str:
-        return self.header_url.replace("-header", "")
+        return self.template_urls(False)[0]
 
     @property
     def header_url(self) -> str:
+        return self.template_urls(True)[0]
+
+    def template_urls(self, header: bool, bases: Optional[Sequence[str]] = None) -> Sequence[str]:
+        """
+        URLs of the license (or header) template, one per base URL in order of preference.
+
+        Args:
+            header: Get the header rather than the full license
+            bases: Base URLs [default: :attr:`Endpoints.licenses` from the environment]
+        """
         name = {
             "apache2": "apache",
             "ccby": "cc_by",
@@ -276,7 +295,18 @@ class License(str, enum.Enum):
             "cc0": "cc0",
             "agpl3": "agpl3",
         }[self.name]
-        return f"https://raw.githubusercontent.com/licenses/license-templates/master/templates/{name}-header.txt"
+        suffix = "-header" if header else ""
+        bases = Endpoints.of().licenses if bases is None else bases
+        return [f"{base}/{name}{suffix}.txt" for base in bases]
+
+
+@functools.lru_cache(maxsize=64)
+def _read_url(url: str) -> str:
+    # license templates are requested for every parsed file, so only download each once
+    response = Session.get().client.get(url)
+    if response.status_code > 400:
+        raise ValueError(f"Status code {response.status_code} for url {url}")
+    return response.text
 
 
 __all__ = ["DevStatus", "License", "Toml", "TomlBuilder"]
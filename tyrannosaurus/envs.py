@@ -10,32 +10,45 @@ You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-
 import logging
 from collections.abc import Sequence
 from pathlib import Path
+from typing import Optional
 
-from tyrannosaurus.context import Context
+from tyrannosaurus.context import Context, WriteBatch
+from tyrannosaurus.forge import ForgeIndex
 from tyrannosaurus.helpers import EnvHelper
 
 logger = logging.getLogger(__package__)
 
 
 class CondaEnv:
-    def __init__(self, name: str, dev: bool, extras: bool):
+    def __init__(self, name: str, dev: bool, extras: bool, index: Optional[ForgeIndex] = None):
         self.name = name
         self.dev = dev
         self.extras = extras
-
-    def create(self, context: Context, path: Path) -> Sequence[str]:
+        self.index = index
+
+    def create(
+        self, context: Context, path: Path, batch: Optional[WriteBatch] = None
+    ) -> Sequence[str]:
+        """
+        Writes the environment file, if it changed (backing up the old one).
+
+        Args:
+            context: The project
+            path: The file to write
+            batch: Stage the write here instead of writing immediately
+        """
         deps = self._get_deps(context)
         logger.info(f"Writing environment with {len(deps)} dependencies to {path} ...")
-        lines = EnvHelper().process(self.name, deps, self.extras)
-        if not context.dry_run:
-            path.parent.mkdir(parents=True, exist_ok=True)
-            path.write_text("\n".join(lines), encoding="utf8")
+        lines = EnvHelper(self.index, context.endpoints).process(self.name, deps, self.extras)
+        if batch is None:
+            batch = WriteBatch(context)
+            batch.write(path, "\n".join(lines))
+            batch.commit()
+        else:
+            batch.write(path, "\n".join(lines))
         return lines
 
     def _get_deps(self, context: Context) -> Sequence[str]:
-        path = Path(self.name + ".yml")
-        if path.exists():
-            context.back_up(path)
         deps = dict(context.deps)
         if self.dev:
             deps.update(context.dev_deps)
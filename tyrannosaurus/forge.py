@@ -0,0 +1,285 @@
+"""
+Offline index of package names available on Conda-Forge.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import bz2
+import gzip
+import hashlib
+import logging
+import mmap
+import platform
+import re
+import struct
+import sys
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+import httpx
+
+from tyrannosaurus.cache import atomic_write, user_cache_dir
+from tyrannosaurus.endpoints import Endpoints
+from tyrannosaurus.session import Session
+
+logger = logging.getLogger(__package__)
+# every package record in repodata.json has a "name"; nothing else at that depth does
+_name_pattern = re.compile(rb'"name" *: *"([^"]+)"')
+
+
+def current_subdir() -> str:
+    """
+    The Conda subdir for this platform, such as ``linux-64`` or ``osx-arm64``.
+    """
+    machine = platform.machine().lower()
+    arch = {"x86_64": "64", "amd64": "64", "arm64": "arm64", "aarch64": "aarch64"}.get(
+        machine, machine
+    )
+    if sys.platform == "win32":
+        return f"win-{arch}"
+    if sys.platform == "darwin":
+        return f"osx-{arch}"
+    return f"linux-{arch}"
+
+
+class ForgeIndex:
+    """
+    A compact, sorted table of Conda package names that is memory-mapped and binary-searched.
+
+    The file layout is a magic string, a 32-byte digest of where the names came from
+    (see :meth:`source_digest`; zeros if unknown), a little-endian uint32 count ``n``,
+    ``n + 1`` uint32 offsets into the name blob, then the UTF-8 names themselves, sorted bytewise.
+    Lookups are O(log n) and never read the whole file.
+    """
+
+    magic = b"TYRFIDX2"
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self._file = self.path.open("rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(self.magic)] != self.magic:
+            self.close()
+            raise ValueError(f"{self.path} is not a Conda-Forge index")
+        at = len(self.magic)
+        self.source = self._mm[at : at + 32]
+        (self._count,) = struct.unpack_from("<I", self._mm, at + 32)
+        self._offsets_at = at + 32 + 4
+        self._blob_at = self._offsets_at + 4 * (self._count + 1)
+
+    @classmethod
+    def default_path(
+        cls, channels: Optional[Sequence[str]] = None, subdirs: Optional[Sequence[str]] = None
+    ) -> Path:
+        """
+        The download cache for :meth:`fetch`, with a separate file per channels and subdirs.
+
+        Args:
+            channels: Mirrors of the channel [default: from :meth:`Endpoints.of`]
+            subdirs: Conda subdirs [default: ``noarch`` and :func:`current_subdir`]
+        """
+        digest = cls.source_digest(*cls._defaults(channels, subdirs)).hex()[:16]
+        return user_cache_dir() / f"conda-forge-{digest}.idx"
+
+    @classmethod
+    def source_digest(cls, channels: Sequence[str], subdirs: Sequence[str]) -> bytes:
+        """
+        Identifies the channels and subdirs an index was downloaded from.
+        """
+        key = "\n".join([*channels, "", *subdirs]).encode(encoding="utf8")
+        return hashlib.sha256(key).digest()
+
+    @classmethod
+    def local_path(cls, repodata: Union[Path, str]) -> Path:
+        """
+        Where to cache an index built from a local repodata file.
+        The name depends on the file's path, size, and mtime, so it never collides with
+        :meth:`default_path` (the download cache) and is rebuilt if the file changes.
+        """
+        repodata = Path(repodata).resolve()
+        stat = repodata.stat()
+        key = f"{repodata}\0{stat.st_size}\0{stat.st_mtime_ns}".encode(encoding="utf8")
+        digest = hashlib.sha256(key).hexdigest()[:32]
+        return user_cache_dir() / "conda-forge-local" / f"{digest}.idx"
+
+    @classmethod
+    def is_index(cls, path: Union[Path, str]) -> bool:
+        with Path(path).open("rb") as f:
+            return f.read(len(cls.magic)) == cls.magic
+
+    @classmethod
+    def load(cls, path: Union[Path, str], index_path: Optional[Path] = None) -> ForgeIndex:
+        """
+        Opens an index file, or builds one from a ``repodata.json`` (optionally ``.bz2`` or ``.gz``).
+
+        Args:
+            path: An index file or a repodata file
+            index_path: Where to write an index built from repodata [default: :meth:`local_path`]
+        """
+        if cls.is_index(path):
+            return ForgeIndex(path)
+        if index_path is None:
+            index_path = cls.local_path(path)
+            if index_path.exists() and cls.is_index(index_path):
+                return ForgeIndex(index_path)
+        return cls.from_repodata([path], index_path)
+
+    @classmethod
+    def fetch(
+        cls,
+        path: Optional[Path] = None,
+        subdirs: Optional[Sequence[str]] = None,
+        max_age: float = 86400,
+        channels: Optional[Sequence[str]] = None,
+    ) -> ForgeIndex:
+        """
+        Gets an index built from the channel's ``repodata.json.bz2`` files.
+        The download is skipped if an index at ``path`` is younger than ``max_age`` seconds
+        and was built from the same channels and subdirs.
+
+        Args:
+            path: Index file to read or (re)write [default: :meth:`default_path`]
+            subdirs: Conda subdirs to include [default: ``noarch`` and :func:`current_subdir`]
+            max_age: Seconds before the index is rebuilt
+            channels: Mirrors of the channel to try in order [default: from :meth:`Endpoints.of`]
+        """
+        channels, subdirs = cls._defaults(channels, subdirs)
+        path = cls.default_path(channels, subdirs) if path is None else Path(path)
+        source = cls.source_digest(channels, subdirs)
+        if path.exists() and time.time() - path.stat().st_mtime < max_age:
+            try:
+                index = ForgeIndex(path)
+            except ValueError:
+                logger.debug(f"Rebuilding {path}, which is not a current index", exc_info=True)
+            else:
+                if index.source == source:
+                    return index
+                index.close()
+                logger.info(f"Rebuilding {path}, which is from other channels or subdirs")
+        names = set()
+        for subdir in subdirs:
+            names.update(cls._download(subdir, channels))
+        return cls.build(names, path, source)
+
+    @classmethod
+    def _defaults(
+        cls, channels: Optional[Sequence[str]], subdirs: Optional[Sequence[str]]
+    ) -> tuple[Sequence[str], Sequence[str]]:
+        channels = Endpoints.of().conda if channels is None else channels
+        subdirs = ["noarch", current_subdir()] if subdirs is None else subdirs
+        return channels, subdirs
+
+    @classmethod
+    def _download(cls, subdir: str, channels: Sequence[str]) -> set[str]:
+        for channel in channels:
+            url = f"{channel}/{subdir}/repodata.json.bz2"
+            logger.info(f"Downloading {url} ...")
+            try:
+                with Session.get().client.stream("GET", url, follow_redirects=True) as r:
+                    r.raise_for_status()
+                    return cls._scan(cls._bz2_chunks(r.iter_bytes()))
+            except (OSError, httpx.HTTPError):
+                logger.warning(f"Failed downloading {url}", exc_info=True)
+        raise LookupError(f"Could not download {subdir} repodata from any of {channels}")
+
+    @classmethod
+    def from_repodata(
+        cls, repodata: Iterable[Union[Path, str]], path: Union[Path, str]
+    ) -> ForgeIndex:
+        names = set()
+        for p in repodata:
+            with cls._open_repodata(Path(p)) as f:
+                names.update(cls._scan(iter(lambda: f.read(1024 * 1024), b"")))
+        return cls.build(names, path)
+
+    @classmethod
+    def build(
+        cls, names: Iterable[str], path: Union[Path, str], source: bytes = bytes(32)
+    ) -> ForgeIndex:
+        """
+        Writes an index of ``names``, recording ``source`` (see :meth:`source_digest`).
+        """
+        path = Path(path)
+        encoded = sorted({n.lower().encode(encoding="utf8") for n in names})
+        offsets, at = [0], 0
+        for name in encoded:
+            at += len(name)
+            offsets.append(at)
+        header = struct.pack(f"<I{len(offsets)}I", len(encoded), *offsets)
+        atomic_write(path, cls.magic + source + header + b"".join(encoded))
+        logger.debug(f"Wrote Conda-Forge index of {len(encoded)} packages to {path}")
+        return ForgeIndex(path)
+
+    def __contains__(self, name: str) -> bool:
+        key = name.lower().encode(encoding="utf8")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found = self._name_at(mid)
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self._name_at(i).decode(encoding="utf8")
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> ForgeIndex:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _name_at(self, i: int) -> bytes:
+        start, end = struct.unpack_from("<II", self._mm, self._offsets_at + 4 * i)
+        return self._mm[self._blob_at + start : self._blob_at + end]
+
+    @classmethod
+    def _open_repodata(cls, path: Path) -> BinaryIO:
+        if path.suffix == ".bz2":
+            return bz2.open(path, "rb")
+        if path.suffix == ".gz":
+            return gzip.open(path, "rb")
+        return path.open("rb")
+
+    @classmethod
+    def _bz2_chunks(cls, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        decompressor = bz2.BZ2Decompressor()
+        for chunk in chunks:
+            yield decompressor.decompress(chunk)
+
+    @classmethod
+    def _scan(cls, chunks: Iterable[bytes]) -> set[str]:
+        # stream the names out rather than parsing what can be hundreds of MB of JSON
+        names, tail = set(), b""
+        for chunk in chunks:
+            data = tail + chunk
+            end = 0
+            for match in _name_pattern.finditer(data):
+                names.add(match.group(1).decode(encoding="utf8"))
+                end = match.end()
+            # a match could be split across chunks
+            tail = data[max(end, len(data) - 256) :]
+        return names
+
+
+__all__ = ["ForgeIndex", "current_subdir"]
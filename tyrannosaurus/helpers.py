@@ -10,22 +10,58 @@ You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-
 
 from __future__ import annotations
 
+import asyncio
+import fnmatch
+import json
 import logging
 import os
 import re
-from collections.abc import Mapping, Sequence
+import stat
+import time
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from subprocess import SubprocessError, check_output  # nosec
-from typing import Optional, Union
+from typing import Any, Optional, Union
 
 import httpx
 import typer
 
+from tyrannosaurus.cache import ResponseCache, atomic_write
+from tyrannosaurus.endpoints import Endpoints
+from tyrannosaurus.forge import ForgeIndex
+from tyrannosaurus.session import Session
+from tyrannosaurus.versiondb import VersionDatabase
+from tyrannosaurus.versions import VersionEngine
+
 logger = logging.getLogger(__package__)
 
 
+def normalize_pkg_name(name: str) -> str:
+    """
+    Normalizes a distribution name according to PEP 503 (e.g. ``Foo.Bar_baz`` to ``foo-bar-baz``).
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+walk_skip_dirs = frozenset(
+    {".tox", ".pytest_cache", ".git", ".idea", "docs", "__pycache__", ".tyrannosaurus"}
+)
+
+
 class TrashList:
-    def __init__(self, dists: bool, aggressive: bool):
+    def __init__(self, dists: bool, aggressive: bool, include: Iterable[str] = ()):
+        """
+        Constructor.
+
+        Args:
+            dists: Include dists
+            aggressive: Include additional files
+            include: More names, paths like ``docs/_build``, or globs like ``*.log``
+
+        Raises:
+            ValueError: If a glob in ``include`` contains a ``/``
+        """
         self.trash_patterns = {
             ".pytest_cache",
             ".mypy_cache",
@@ -57,25 +93,95 @@ class TrashList:
                     re.compile(r".*[~.]tmp"),
                 }
             )
+        # globs are shown as written
+        self._labels = {}
+        for item in include:
+            if any(c in item for c in "*?["):
+                if "/" in item:
+                    raise ValueError(f"Glob {item} can only match names, not paths")
+                pattern = re.compile(fnmatch.translate(item))
+                self._labels[pattern] = item
+                self.trash_patterns.add(pattern)
+            else:
+                self.trash_patterns.add(item)
+        self.trash_patterns = frozenset(self.trash_patterns)
+        self._compile()
 
     def get_list(self) -> Sequence[str]:
-        return [s for s in self.trash_patterns if isinstance(s, str)]
+        return self._strings
 
     def get_patterns(self) -> Sequence[re.Pattern]:
-        return [s for s in self.trash_patterns if isinstance(s, re.Pattern)]
+        return self._patterns
 
     def should_delete(self, p: Path) -> bool:
-        return any(
-            (
-                (
-                    isinstance(pattern, str)
-                    and str(p).replace("\\", "/").endswith(pattern)
-                    or isinstance(pattern, re.Pattern)
-                    and pattern.fullmatch(p.name)
-                )
-                for pattern in self.trash_patterns
-            )
-        )
+        return self.classify(p.parent, [p.name])[0]
+
+    def match(self, p: Path) -> Optional[str]:
+        """
+        The pattern that matches a path (as written in the list), or None.
+        """
+        return self.matches(p.parent, [p.name])[0]
+
+    def classify(self, parent: Union[Path, str], names: Iterable[str]) -> Sequence[bool]:
+        """
+        Decides which entries of one directory listing should be deleted.
+
+        Args:
+            parent: The directory containing the entries
+            names: The entries' names (not paths)
+
+        Returns:
+            One bool per name, in order
+        """
+        return [m is not None for m in self.matches(parent, names)]
+
+    def matches(self, parent: Union[Path, str], names: Iterable[str]) -> Sequence[Optional[str]]:
+        """
+        Like :meth:`classify`, but gives the matching pattern for each name (or None).
+        """
+        parents = None
+        results = []
+        for name in names:
+            if name in self._names:
+                results.append(name)
+            elif self._regex is not None and (m := self._regex.fullmatch(name)) is not None:
+                pattern = self._patterns[int(m.lastgroup[1:])]
+                results.append(self._labels.get(pattern, pattern.pattern))
+            elif name in self._suffixes:
+                if parents is None:
+                    # split once per listing, not once per entry
+                    parents = str(parent).replace("\\", "/").split("/")[::-1]
+                results.append(self._match_suffix(self._suffixes[name], parents))
+            else:
+                results.append(None)
+        return results
+
+    def _compile(self) -> None:
+        self._strings = [s for s in self.trash_patterns if isinstance(s, str)]
+        self._patterns = [s for s in self.trash_patterns if isinstance(s, re.Pattern)]
+        # plain names go in a set; entries like docs/_build go in a trie keyed from the end
+        self._names = frozenset(s for s in self._strings if "/" not in s)
+        self._suffixes = {}
+        for s in self._strings:
+            if "/" in s:
+                node = self._suffixes
+                for part in reversed(s.strip("/").split("/")):
+                    node = node.setdefault(part, {})
+                node[None] = s
+        # named groups tell us which pattern matched
+        alternation = "|".join(f"(?P<p{i}>{p.pattern})" for i, p in enumerate(self._patterns))
+        self._regex = re.compile(alternation) if len(self._patterns) > 0 else None
+
+    def _match_suffix(
+        self, node: Mapping[Optional[str], Any], parents: Sequence[str]
+    ) -> Optional[str]:
+        for part in parents:
+            if None in node:
+                return node[None]
+            if part not in node:
+                return None
+            node = node[part]
+        return node.get(None)
 
 
 class _Env:
@@ -97,56 +203,174 @@ class _Env:
 
 
 class PyPiHelper:
+    def __init__(
+        self,
+        concurrency: int = 16,
+        cache: Optional[ResponseCache] = None,
+        database: Optional[VersionDatabase] = None,
+        endpoints: Optional[Endpoints] = None,
+    ):
+        """
+        Constructor.
+
+        Args:
+            concurrency: Maximum number of simultaneous requests to PyPi
+            cache: Response cache; defaults to :meth:`ResponseCache.default`
+            database: If set, answer from this local database first and record new lookups in it
+            endpoints: Package index URLs; defaults to :meth:`Endpoints.of` (from the environment)
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, not {concurrency}")
+        self.concurrency = concurrency
+        self.cache = ResponseCache.default() if cache is None else cache
+        self.database = database
+        self.endpoints = Endpoints.of() if endpoints is None else endpoints
+        self.engine = VersionEngine()
+        # normalized names whose lookups failed in the last call to new_versions_many
+        self.failed: set[str] = set()
+
     def new_versions(self, pkg_versions: Mapping[str, str]) -> Mapping[str, tuple[str, str]]:
-        logger.warning("Making a best effort to find new versions. Correctness is not guaranteed.")
-        updated = {}
-        for pkg, version in pkg_versions.items():
-            if pkg == "python":
-                continue
-            logger.debug(f"Searching pypi for package {pkg} (current version: {type(version)})")
-            version = self._extract_version(version)
-            if version is None:
-                logger.error(f"Failed to extract version from {version} for package {pkg}")
-                continue
-            try:
-                new = self.get_version(pkg)
-            except ValueError:
-                logger.error(f"Did not find package {pkg}", exc_info=True)
-            except LookupError:
-                logger.error(f"Failed extracting new version for pypi package {pkg}")
-                logger.debug(f"Version error for {pkg}", exc_info=True)
-            else:
-                if new != version:
-                    updated[pkg] = version, new
+        return self.new_versions_many(pkg_versions)[0]
+
+    def new_versions_many(
+        self, *groups: Mapping[str, str]
+    ) -> Sequence[Mapping[str, tuple[str, str]]]:
+        """
+        Finds new versions for several groups of dependencies (e.g. main and dev) at once.
+        Every distinct package is looked up exactly once, concurrently.
+
+        Args:
+            groups: Mappings of package names to Poetry version constraints
+
+        Returns:
+            One mapping per group, of package names to (old, new) versions
+        """
+        return asyncio.run(self.new_versions_async(*groups))
+
+    async def new_versions_async(
+        self, *groups: Mapping[str, str]
+    ) -> Sequence[Mapping[str, tuple[str, str]]]:
+        currents = []
+        for group in groups:
+            current = {}
+            for pkg, spec in group.items():
+                if pkg == "python":
+                    continue
+                logger.debug(f"Searching pypi for package {pkg} (current version: {spec})")
+                if self.engine.constraint(spec) is None:
+                    logger.error(f"Failed to extract version from {spec} for package {pkg}")
+                    continue
+                current[pkg] = spec
+            currents.append(current)
+        # spellings like Foo_Bar and foo-bar refer to the same package, so look it up once
+        names = sorted({normalize_pkg_name(pkg) for current in currents for pkg in current})
+        found = await self.get_versions_async(names)
+        self.failed = {name for name in names if name not in found}
+        updated = []
+        for current in currents:
+            latest = {pkg: found.get(normalize_pkg_name(pkg)) for pkg in current}
+            latest = {pkg: v for pkg, v in latest.items() if v is not None}
+            updated.append(self.engine.find_updates(current, latest))
         return updated
 
-    def _extract_version(self, version: str) -> Optional[str]:
-        version = str(version)
-        matches = re.compile(r"([0-9]+[^ ,]+)").finditer(version)
-        matches = list(matches)
-        if len(matches) == 0 or len(matches) > 2:
-            return None
-        # assume the last one will be the max if there are two
-        return matches[-1].group(1)
+    async def get_versions_async(self, names: Sequence[str]) -> Mapping[str, str]:
+        """
+        Fetches the latest versions of packages, with at most ``concurrency`` requests in flight.
+        Packages that could not be found or parsed are logged and omitted.
+        """
+        known = {} if self.database is None else self.database.get_many(names)
+        names = [name for name in names if name not in known]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def get_one(client: httpx.AsyncClient, name: str) -> Optional[str]:
+            async with semaphore:
+                try:
+                    return await self.get_version_async(client, name)
+                except ValueError:
+                    logger.error(f"Did not find package {name}", exc_info=True)
+                except LookupError:
+                    logger.error(f"Failed extracting new version for pypi package {name}")
+                    logger.debug(f"Version error for {name}", exc_info=True)
+                except (OSError, httpx.HTTPError):
+                    logger.error(f"Failed fetching {name} from pypi.org", exc_info=True)
+                return None
+
+        async with Session.get().async_client(max_connections=self.concurrency) as client:
+            results = await asyncio.gather(*[get_one(client, name) for name in names])
+        found = {name: version for name, version in zip(names, results) if version is not None}
+        if self.database is not None:
+            for name, version in found.items():
+                self.database.put(name, version)
+        return {**known, **found}
 
     def get_version(self, name: str) -> str:
+        return asyncio.run(self._get_version_standalone(name))
+
+    async def _get_version_standalone(self, name: str) -> str:
+        async with Session.get().async_client() as client:
+            return await self.get_version_async(client, name)
+
+    async def get_version_async(self, client: httpx.AsyncClient, name: str) -> str:
+        """
+        Gets the latest version of a package from the JSON API of each configured index, in order.
+        Falls back to scraping the project's page on pypi.org if no index gives a usable response.
+
+        Raises:
+            LookupError: If the package does not exist or no version could be extracted
+        """
+        version = await self._get_version_from_json(client, name)
+        if version is None and self.endpoints.uses_pypi_org:
+            version = await self._get_version_from_html(client, name)
+        if version is None:
+            raise LookupError(f"No index gave a usable response for package {name}")
+        return version
+
+    async def _get_version_from_json(self, client: httpx.AsyncClient, name: str) -> Optional[str]:
+        urls = self.endpoints.pypi_json_urls(normalize_pkg_name(name))
+        n_missing = 0
+        for url in urls:
+            try:
+                r = await self.cache.fetch_async(client, url, follow_redirects=True)
+            except (OSError, httpx.TransportError):
+                logger.debug(f"Failed fetching {url}", exc_info=True)
+                continue
+            if r.status_code == 404:
+                # a mirror might not have it; keep trying
+                n_missing += 1
+                continue
+            if r.status_code != 200:
+                logger.debug(f"Status code {r.status_code} from {url}")
+                continue
+            try:
+                version = r.json()["info"]["version"]
+            except (ValueError, KeyError, TypeError):
+                logger.debug(f"Unexpected JSON from {url}", exc_info=True)
+                continue
+            if version:
+                return str(version)
+        if n_missing == len(urls):
+            raise LookupError(f"Package {name} not found on {', '.join(self.endpoints.pypi)}")
+        return None
+
+    async def _get_version_from_html(self, client: httpx.AsyncClient, name: str) -> str:
         # lowercase 'sphinx' is allowed in pip & poetry, but will not work for the raw URL request
         if name == "sphinx":
             name = "Sphinx"
         pat = re.compile('"package-header__name">[ \n\t]*' + name + " ([0-9a-zA-Z_.-]+)")
         try:
             try:
-                r = httpx.get(f"https://pypi.org/project/{name}")
-            except OSError:
+                r = await self.cache.fetch_async(client, f"https://pypi.org/project/{name}")
+            except (OSError, httpx.TransportError):
                 logger.debug(f"Failed fetching PyPi vr for package {name}", exc_info=True)
                 r = None
             if r is None or r.status_code > 400:
                 # thanks to Sphinx and a couple of others
-                r = httpx.get(f"https://pypi.org/project/{name.capitalize()}")
+                url = f"https://pypi.org/project/{name.capitalize()}"
+                r = await self.cache.fetch_async(client, url)
                 if r.status_code > 400:
                     raise LookupError(f"Status code {r.status_code} from pypi for package {name}")
-        except OSError:
-            logger.error(
+        except (OSError, httpx.TransportError):
+            logger.debug(
                 f"Failed fetching {name} from pypi.org.",
                 exc_info=True,
             )
@@ -160,22 +384,55 @@ class PyPiHelper:
 
 
 class CondaForgeHelper:
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        index: Optional[ForgeIndex] = None,
+        endpoints: Optional[Endpoints] = None,
+    ):
+        """
+        Constructor.
+
+        Args:
+            cache: Response cache; defaults to :meth:`ResponseCache.default`
+            index: If set, answer from this offline index instead of querying anaconda.org
+            endpoints: Package page URLs; defaults to :meth:`Endpoints.of` (from the environment)
+        """
+        self.cache = ResponseCache.default() if cache is None else cache
+        self.index = index
+        self.endpoints = Endpoints.of() if endpoints is None else endpoints
+
     def has_pkg(self, name: str):
+        if self.index is not None:
+            return name in self.index
         # unfortunately, Anaconda returns 200 even if the page doesn't exist
-        try:
-            r = httpx.get(f"https://anaconda.org/conda-forge/{name}")
-        except OSError:
-            logger.error(
-                f"Failed fetching from anaconda.org. Assuming {name} is in Conda-Forge.",
-                exc_info=True,
-            )
-            return True
-        return "login?next" not in r.url
+        # instead, it redirects to a login page, so we need the final URL
+        for base in self.endpoints.anaconda:
+            try:
+                url = f"{base}/{name}"
+                r = self.cache.fetch(Session.get().client, url, follow_redirects=True)
+            except (OSError, httpx.HTTPError):
+                logger.debug(f"Failed fetching {base}/{name}", exc_info=True)
+                continue
+            if r.status_code == 429 or r.status_code >= 500:
+                # still failing after the scheduler's retries; an error page says nothing
+                logger.warning(f"Status code {r.status_code} from {url}")
+                continue
+            return "login?next" not in str(r.url)
+        logger.error(f"Failed fetching {name} from {self.endpoints.anaconda}. Assuming it exists.")
+        return True
 
 
 class EnvHelper:
+    def __init__(
+        self, index: Optional[ForgeIndex] = None, endpoints: Optional[Endpoints] = None
+    ):
+        self.index = index
+        self.endpoints = endpoints
+
     def process(self, name: str, deps, extras: bool) -> Sequence[str]:
-        helper = CondaForgeHelper()
+        helper = CondaForgeHelper(index=self.index, endpoints=self.endpoints)
+        engine = VersionEngine()
         lines = [
             "# auto-generated by `tyrannosaurus env`",
             "name: " + name,
@@ -192,13 +449,13 @@ class EnvHelper:
                 if "extras" in value:
                     logger.error(f"'extras' not supported for {key} = {value}")
                 value = value.get("version")
-            # TODO handle ~ correctly
-            if "^" in value or "~" in value:
-                vr_pat_1 = re.compile(r"^[^~]([0-9]+)(?:\.([0-9]+))?(?:\.([0-9]+))?$")
-                if (match := vr_pat_1.fullmatch(value)) is not None:
-                    value = f">={match.group(1)}.{match.group(2)},<{int(match.group(1)) + 1}.0"
-                else:
-                    logger.error(f"Couldn't parse {key} = {value}")
+                if value is None:
+                    logger.error(f"Skipping {key}, which has no version")
+                    continue
+            try:
+                value = engine.to_conda(value)
+            except ValueError:
+                logger.error(f"Couldn't parse {key} = {value}")
             line = "    - " + key + value.replace(" ", "")
             if helper.has_pkg(key):
                 lines.append(line)
@@ -215,25 +472,196 @@ class EnvHelper:
         return lines
 
 
-def scandir_fast(topdir: Union[str, Path], trash: TrashList) -> Sequence[Path]:
+_size_units = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def parse_size(value: str) -> int:
+    """
+    Parses a size like ``5G``, ``500MB``, ``1.5GiB``, or ``1024`` into bytes.
+    Units are powers of 1024.
     """
-    Finds paths under a dir.
+    match = re.fullmatch(r" *([0-9]+(?:\.[0-9]*)?) *([kmgt]?)(?:i?b)? *", value.lower())
+    if match is None:
+        raise ValueError(f"Invalid size {value}")
+    return int(float(match.group(1)) * _size_units[match.group(2)])
+
+
+def format_size(n_bytes: int) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if n_bytes < 1024:
+            return f"{n_bytes:.0f} {unit}" if unit == "B" else f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} TiB"
+
+
+def tree_size(path: Union[Path, str]) -> int:
+    """
+    The total size of the files under a directory (or of a file), not following symlinks.
+    Uses the stat results cached on each ``os.DirEntry`` where the platform provides them.
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return 0
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_size
+    total, stack = 0, [os.fspath(path)]
+    while len(stack) > 0:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            logger.debug(f"Could not measure under {path}", exc_info=True)
+    return total
+
+
+class MtimeIndex:
+    """
+    Remembers the subdirectories of directories that held no trash, keyed by directory mtime.
+
+    A directory's mtime changes whenever an entry is added, removed, or renamed in it,
+    so if the mtime is unchanged, its listing can be reused instead of read again.
+    Each directory still costs one ``stat``, because changes deeper down don't touch its mtime.
+    The index is discarded if the root or the trash patterns differ from when it was saved.
+    """
+
+    version = 1
+    # mtimes this recent could still change within the filesystem's timestamp resolution
+    min_age_ns = 2_000_000_000
+
+    def __init__(self, path: Union[Path, str], root: Union[Path, str], trash: TrashList):
+        self.path = Path(path)
+        self.root = os.fspath(root)
+        self.key = repr(sorted(str(p) for p in trash.trash_patterns))
+        self._dirs: dict[str, tuple[int, Sequence[str]]] = {}
+
+    def load(self) -> MtimeIndex:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf8"))
+        except FileNotFoundError:
+            return self
+        except (OSError, ValueError):
+            logger.debug(f"Ignoring corrupt clean index {self.path}", exc_info=True)
+            return self
+        if (data.get("version"), data.get("root"), data.get("key")) == (
+            self.version,
+            self.root,
+            self.key,
+        ):
+            self._dirs = {k: (v[0], v[1]) for k, v in data["dirs"].items()}
+        return self
+
+    def save(self) -> None:
+        data = {"version": self.version, "root": self.root, "key": self.key, "dirs": self._dirs}
+        atomic_write(self.path, json.dumps(data))
+
+    def unchanged(self, directory: str, mtime: int) -> Optional[Sequence[str]]:
+        """
+        The names of the subdirs to descend into, or None if the directory must be listed.
+        """
+        entry = self._dirs.get(directory)
+        return entry[1] if entry is not None and entry[0] == mtime else None
+
+    def record(self, directory: str, mtime: int, subdirs: Sequence[str]) -> None:
+        if time.time_ns() - mtime > self.min_age_ns:
+            self._dirs[directory] = mtime, subdirs
+        else:
+            self._dirs.pop(directory, None)
+
+    def forget(self, directory: str) -> None:
+        self._dirs.pop(directory, None)
+
+    def __len__(self) -> int:
+        return len(self._dirs)
+
+
+def walk_trash(
+    topdir: Union[str, Path],
+    trash: TrashList,
+    index: Optional[MtimeIndex] = None,
+    prune: Optional[Callable[[str], bool]] = None,
+) -> Iterator[Path]:
+    """
+    Lazily finds directories under a dir that should be deleted.
+
+    The walk is iterative and uses the type info cached in each ``os.DirEntry``.
+    It never descends into matched directories or into :data:`walk_skip_dirs`,
+    and it holds only one directory listing (plus a stack of pending dirs) at a time.
 
     Args:
         topdir: The directory to search under
         trash: List of trash dirs
+        index: Reuse (and update) listings of unchanged directories
+        prune: Called with each unmatched directory's path; returns True to skip searching it
+    """
+    stack = [os.fspath(topdir)]
+    while len(stack) > 0:
+        matches, subdirs = _list_trash(stack.pop(), trash, index, prune)
+        yield from matches
+        stack.extend(subdirs)
+
 
+def walk_trash_parallel(
+    topdir: Union[str, Path],
+    trash: TrashList,
+    jobs: int,
+    index: Optional[MtimeIndex] = None,
+    prune: Optional[Callable[[str], bool]] = None,
+) -> Sequence[Path]:
     """
-    subdirs = [Path(f.path) for f in os.scandir(topdir) if Path(f).is_dir()]
-    for dirname in list(subdirs):
-        if (
-            dirname.is_dir()
-            and dirname.name
-            not in {".tox", ".pytest_cache", ".git", ".idea", "docs", "__pycache__"}
-            and dirname.name not in {str(s) for s in trash.get_list()}
-        ):
-            subdirs.extend(scandir_fast(dirname, trash))
-    return subdirs
+    Like :func:`walk_trash`, but lists directories on ``jobs`` threads.
+    Each directory is a separate task, so one huge subtree doesn't hold up the rest.
+
+    Returns:
+        The matches, sorted so that the result doesn't depend on scheduling
+    """
+    found = []
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = {pool.submit(_list_trash, os.fspath(topdir), trash, index, prune)}
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                matches, subdirs = future.result()
+                found.extend(matches)
+                pending.update(pool.submit(_list_trash, d, trash, index, prune) for d in subdirs)
+    return sorted(found)
+
+
+def _list_trash(
+    directory: str,
+    trash: TrashList,
+    index: Optional[MtimeIndex] = None,
+    prune: Optional[Callable[[str], bool]] = None,
+) -> tuple[Sequence[Path], Sequence[str]]:
+    # lists fully before returning, since the caller may move matches away
+    try:
+        mtime = os.stat(directory).st_mtime_ns if index is not None else 0
+        if index is not None and (names := index.unchanged(directory, mtime)) is not None:
+            subdirs = [os.path.join(directory, name) for name in names]
+            return [], [d for d in subdirs if prune is None or not prune(d)]
+        with os.scandir(directory) as it:
+            entries = [e for e in it if e.is_dir(follow_symlinks=False)]
+    except OSError:
+        logger.debug(f"Could not list {directory}", exc_info=True)
+        return [], []
+    matches, subdirs = [], []
+    for entry, match in zip(entries, trash.classify(directory, [e.name for e in entries])):
+        if match:
+            matches.append(Path(entry.path))
+        elif entry.name not in walk_skip_dirs:
+            subdirs.append(entry)
+    if index is not None:
+        # only directories without trash are reused; the others change when it's moved out
+        if len(matches) == 0:
+            index.record(directory, mtime, [e.name for e in subdirs])
+        else:
+            index.forget(directory)
+    # pruning is applied after recording, so the index doesn't depend on it
+    return matches, [e.path for e in subdirs if prune is None or not prune(e.path)]
 
 
 __all__ = [
@@ -242,5 +670,11 @@ __all__ = [
     "CondaForgeHelper",
     "PyPiHelper",
     "EnvHelper",
-    "scandir_fast",
+    "normalize_pkg_name",
+    "MtimeIndex",
+    "format_size",
+    "parse_size",
+    "tree_size",
+    "walk_trash",
+    "walk_trash_parallel",
 ]
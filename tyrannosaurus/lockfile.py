@@ -0,0 +1,126 @@
+"""
+Streaming reader for poetry.lock files.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+from tyrannosaurus.cache import atomic_write, user_cache_dir
+
+logger = logging.getLogger(__package__)
+_key_pattern = re.compile(r'^(name|version|category|optional) = (?:"(.*)"|(true|false))\s*$')
+
+
+@dataclass(frozen=True)
+class LockedPackage:
+    name: str
+    version: str
+    category: str = "main"
+    optional: bool = False
+
+
+class LockFile:
+    """
+    Reads a ``poetry.lock`` one package at a time.
+
+    Only the keys needed to identify each package are read, line by line,
+    so memory use is flat and no TOML document is built.
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def digest(self) -> str:
+        """
+        The SHA-256 of the file's contents.
+        """
+        h = hashlib.sha256()
+        with self.path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def packages(self) -> Iterator[LockedPackage]:
+        current: Optional[dict[str, Union[str, bool]]] = None
+        in_package = False
+        with self.path.open(encoding="utf8") as f:
+            for line in f:
+                if line.startswith("["):
+                    if current is not None:
+                        yield self._to_package(current)
+                        current = None
+                    in_package = line.strip() == "[[package]]"
+                    if in_package:
+                        current = {}
+                elif in_package and (match := _key_pattern.match(line)) is not None:
+                    key, string, boolean = match.groups()
+                    current[key] = string if boolean is None else boolean == "true"
+        if current is not None:
+            yield self._to_package(current)
+
+    def _to_package(self, values: Mapping[str, Union[str, bool]]) -> LockedPackage:
+        if "name" not in values or "version" not in values:
+            raise ValueError(f"Package without a name or version in {self.path}: {values}")
+        return LockedPackage(
+            name=str(values["name"]),
+            version=str(values["version"]),
+            category=str(values.get("category", "main")),
+            optional=bool(values.get("optional", False)),
+        )
+
+
+class LockCache:
+    """
+    Remembers the updates found for a lock file, keyed by the lock file's content hash.
+    Entries expire after ``ttl`` seconds because new versions are released over time.
+    """
+
+    def __init__(self, path: Union[Path, str], ttl: float = 3600):
+        self.path = Path(path)
+        self.ttl = ttl
+
+    @classmethod
+    def default(cls) -> LockCache:
+        ttl = float(os.environ.get("TYRANNOSAURUS_CACHE_TTL", 3600))
+        return LockCache(user_cache_dir() / "locks", ttl=ttl)
+
+    def get(self, digest: str) -> Optional[Mapping[str, tuple[str, str]]]:
+        path = self.path / (digest + ".json")
+        try:
+            data = json.loads(path.read_text(encoding="utf8"))
+            stored_at = float(data["stored_at"])
+            updates = {str(k): (str(v[0]), str(v[1])) for k, v in data["updates"].items()}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, IndexError, AttributeError):
+            logger.debug(f"Ignoring corrupt lock cache entry {path}", exc_info=True)
+            return None
+        if time.time() - stored_at >= self.ttl:
+            return None
+        return updates
+
+    def put(self, digest: str, updates: Mapping[str, tuple[str, str]]) -> None:
+        data = {"stored_at": time.time(), "updates": {k: list(v) for k, v in updates.items()}}
+        atomic_write(self.path / (digest + ".json"), json.dumps(data))
+
+
+__all__ = ["LockCache", "LockFile", "LockedPackage"]
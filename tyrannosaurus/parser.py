@@ -11,6 +11,7 @@ from collections.abc import Sequence
 from typing import Any, Optional, Union
 
 from tyrannosaurus import TyrannoInfo
+from tyrannosaurus.endpoints import Endpoints
 from tyrannosaurus.enums import DevStatus, License
 
 
@@ -26,6 +27,7 @@ class LiteralParser:
         status: DevStatus,
         license_name: Union[str, License],
         tyranno_vr: str,
+        endpoints: Optional[Endpoints] = None,
     ):
         self.project = project.lower()
         # TODO doing this in two places
@@ -38,6 +40,7 @@ class LiteralParser:
         self.status = status
         self.license = License.of(license_name)
         self.tyranno_vr = tyranno_vr
+        self.endpoints = Endpoints.of() if endpoints is None else endpoints
 
     def parse(self, s: str) -> str:
         today, now, now_utc = TyrannoInfo.today, TyrannoInfo.now, TyrannoInfo.now_utc
@@ -83,17 +86,24 @@ class LiteralParser:
             "license.spdx": self.license.spdx,
             "license.official": self.license.spdx,
             "license.family": self.license.family,
-            "license.header": self.download_license_template(header=True),
-            "license.full": self.download_license_template(header=False),
             "license.url": self.license.url,
             "tyranno.version": self.tyranno_vr,
         }
         for k, v in reps.items():
             s = s.replace("$${" + k + "}", v)
+        # these require a download, so only get them if they're used
+        if "$${license.header}" in s:
+            s = s.replace("$${license.header}", self.download_license_template(header=True))
+        if "$${license.full}" in s:
+            s = s.replace("$${license.full}", self.download_license_template(header=False))
         return s
 
     def download_license_template(self, header: bool) -> str:
-        text = self.license.download_header() if header else self.license.download_license()
+        bases = self.endpoints.licenses
+        if header:
+            text = self.license.download_header(bases)
+        else:
+            text = self.license.download_license(bases)
         return (
             text.replace("{{ organization }}", self.project + " authors")
             .replace("{{ year }}", str(TyrannoInfo.today.year))
@@ -0,0 +1,521 @@
+"""
+Backups in ``.tyrannosaurus``: content-addressed storage, retention, compaction, and purging.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tarfile
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from tyrannosaurus.cache import atomic_write
+from tyrannosaurus.helpers import MtimeIndex, parse_size, tree_size
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__package__)
+# ioctl to clone a file's extents (copy-on-write) on Btrfs, XFS, and others
+_FICLONE = 0x40049409
+_stamp_format = "%Y-%m-%dT%H-%M-%S"
+_stamp = r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}-[0-9]{2}-[0-9]{2}"
+_backup_pattern = re.compile(rf"^(.+)\.({_stamp})\.bak$")
+_archive_pattern = re.compile(rf"^backups-({_stamp})(?:-[0-9]+)?\.tar\.gz$")
+_age_units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+@dataclass(frozen=True)
+class Backup:
+    """
+    A backed-up file or trashed directory, or a compacted archive of them.
+
+    Attributes:
+        path: Where it is stored
+        original: Path of what was backed up, relative to the project (or None for an archive)
+        time: When it was backed up, in seconds since the epoch
+        size: Bytes on disk (for a blob shared by several backups, counted for the newest only)
+        stored: Whether it's in the :class:`BackupStore` (``path`` is then its blob)
+    """
+
+    path: Path
+    original: Optional[str]
+    time: float
+    size: int
+    stored: bool = False
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Limits on what is kept in ``.tyrannosaurus``.
+    Any limit left as None is not applied.
+
+    Attributes:
+        max_age: Purge backups older than this many seconds
+        max_size: Purge the oldest backups until the total is at most this many bytes
+        keep: Keep this many of the newest backups of each file as-is; compact older ones
+    """
+
+    max_age: Optional[float] = None
+    max_size: Optional[int] = None
+    keep: Optional[int] = None
+
+    @classmethod
+    def of(cls, data: Any) -> Optional[RetentionPolicy]:
+        """
+        Reads ``[tool.tyrannosaurus.retention]`` from pyproject.toml, if it's there.
+
+        Accepts ``max-age`` (e.g. ``"30d"`` or seconds), ``max-size`` (e.g. ``"500M"``),
+        and ``keep`` (a count).
+        """
+        table = data.get("tool.tyrannosaurus.retention")
+        if table is None:
+            return None
+        max_age, max_size, keep = table.get("max-age"), table.get("max-size"), table.get("keep")
+        return RetentionPolicy(
+            max_age=None if max_age is None else cls.parse_age(str(max_age)),
+            max_size=None if max_size is None else parse_size(str(max_size)),
+            keep=None if keep is None else int(keep),
+        )
+
+    @classmethod
+    def parse_age(cls, value: str) -> float:
+        """
+        Parses an age like ``30d``, ``12h``, ``2w``, or ``3600`` (seconds) into seconds.
+        """
+        match = re.fullmatch(r" *([0-9]+(?:\.[0-9]*)?) *([smhdw]?) *", value.lower())
+        if match is None:
+            raise ValueError(f"Invalid age {value}")
+        return float(match.group(1)) * _age_units[match.group(2) or "s"]
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    """
+    A line in the :class:`BackupStore` manifest.
+
+    Attributes:
+        path: The file backed up, relative to the project
+        time: When it was backed up, formatted like :attr:`tyrannosaurus.TyrannoInfo.timestamp`
+        blob: SHA-256 hex digest of its contents
+        size: Size in bytes
+        mtime: The file's mtime in ns, if old enough to trust as a fingerprint
+    """
+
+    path: str
+    time: str
+    blob: str
+    size: int
+    mtime: Optional[int] = None
+
+
+class BackupStore:
+    """
+    Content-addressed backups of files.
+
+    Contents are stored once each, as ``blobs/<xx>/<sha256>``,
+    and ``manifest.jsonl`` records which blob each (path, time) backup refers to.
+    A backup identical to the file's previous backup adds nothing.
+    If a file's size and mtime match its previous backup, it isn't even read.
+
+    Blobs are created by a copy-on-write reflink where the filesystem supports it.
+    Otherwise, if the caller will atomically replace the file afterward, the blob is a hardlink
+    to it, which the replacement then leaves as the blob's only link.
+    Failing both, the file is copied.
+    """
+
+    blob_dir = "blobs"
+    manifest_name = "manifest.jsonl"
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self._entries: Optional[list[ManifestEntry]] = None
+        self._can_reflink = fcntl is not None and sys.platform.startswith("linux")
+        self._lock = threading.Lock()
+
+    @property
+    def manifest(self) -> Path:
+        return self.path / self.manifest_name
+
+    def blob_path(self, digest: str) -> Path:
+        return self.path / self.blob_dir / digest[:2] / digest
+
+    def entries(self) -> Sequence[ManifestEntry]:
+        with self._lock:
+            return list(self._load())
+
+    def latest(self, path: str) -> Optional[ManifestEntry]:
+        """
+        The newest backup of ``path`` (relative to the project), if any.
+        """
+        with self._lock:
+            return self._latest(path)
+
+    def put(self, source: Path, path: str, stamp: str, link: bool = False) -> ManifestEntry:
+        """
+        Backs up a file.
+
+        Args:
+            source: The file
+            path: The file relative to the project, as recorded in the manifest
+            stamp: The backup time, formatted like :attr:`tyrannosaurus.TyrannoInfo.timestamp`
+            link: The caller will replace ``source`` with :func:`os.replace` rather than rewrite
+                  it, so a hardlink is safe
+
+        Returns:
+            The new entry, or the previous one if the contents are unchanged
+        """
+        info = os.stat(source)
+        with self._lock:
+            latest = self._latest(path)
+        if (
+            latest is not None
+            and latest.mtime == info.st_mtime_ns
+            and latest.size == info.st_size
+            and self.blob_path(latest.blob).exists()
+        ):
+            return latest
+        digest = self._digest(source)
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            self._write_blob(source, blob, link)
+        if latest is not None and latest.blob == digest:
+            return latest
+        trusted = time.time_ns() - info.st_mtime_ns > MtimeIndex.min_age_ns
+        entry = ManifestEntry(
+            path, stamp, digest, info.st_size, info.st_mtime_ns if trusted else None
+        )
+        with self._lock:
+            self._load().append(entry)
+            self.path.mkdir(parents=True, exist_ok=True)
+            with self.manifest.open("a", encoding="utf8") as f:
+                f.write(json.dumps(entry.__dict__) + "\n")
+        return entry
+
+    def remove(self, entries: Iterable[ManifestEntry]) -> Sequence[Path]:
+        """
+        Drops entries from the manifest.
+
+        Returns:
+            The blobs that are no longer referenced, which the caller should delete
+        """
+        doomed = set(entries)
+        with self._lock:
+            kept = [e for e in self._load() if e not in doomed]
+            self._entries = kept
+            if self.path.exists():
+                atomic_write(self.manifest, "".join(json.dumps(e.__dict__) + "\n" for e in kept))
+        return self.unreferenced()
+
+    def unreferenced(self) -> Sequence[Path]:
+        """
+        Blobs that no manifest entry refers to.
+        """
+        with self._lock:
+            referenced = {e.blob for e in self._load()}
+        blobs = self.path / self.blob_dir
+        if not blobs.exists():
+            return []
+        return [
+            p
+            for d in blobs.iterdir()
+            for p in d.iterdir()
+            if p.name not in referenced and not p.name.endswith(".tmp")
+        ]
+
+    def _load(self) -> list[ManifestEntry]:
+        if self._entries is None:
+            self._entries = []
+            if self.manifest.exists():
+                for line in self.manifest.read_text(encoding="utf8").splitlines():
+                    if line.strip() != "":
+                        self._entries.append(ManifestEntry(**json.loads(line)))
+        return self._entries
+
+    def _latest(self, path: str) -> Optional[ManifestEntry]:
+        return next((e for e in reversed(self._load()) if e.path == path), None)
+
+    def _digest(self, source: Path) -> str:
+        digest = hashlib.sha256()
+        with source.open("rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _write_blob(self, source: Path, blob: Path, link: bool) -> None:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp = blob.with_name(blob.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        if self._reflink(source, tmp):
+            how = "Reflinked"
+        elif link and self._hardlink(source, tmp):
+            how = "Hardlinked"
+        else:
+            shutil.copyfile(source, tmp)
+            how = "Copied"
+        os.replace(tmp, blob)
+        logger.debug(f"{how} {source} to {blob}")
+
+    def _reflink(self, source: Path, target: Path) -> bool:
+        if not self._can_reflink:
+            return False
+        try:
+            with source.open("rb") as s, target.open("wb") as t:
+                fcntl.ioctl(t.fileno(), _FICLONE, s.fileno())
+            return True
+        except OSError:
+            # unsupported here; don't keep trying
+            self._can_reflink = False
+            target.unlink(missing_ok=True)
+            return False
+
+    def _hardlink(self, source: Path, target: Path) -> bool:
+        try:
+            os.link(source, target)
+            return True
+        except OSError:
+            return False
+
+
+class BackupArea:
+    """
+    The ``.tyrannosaurus`` directory: backups from sync and directories trashed by clean.
+
+    Backups from sync are in a :class:`BackupStore` under ``store/``.
+    Other entries are named ``<original>.<timestamp>.bak``.
+    Older backups can be compacted into ``archives/backups-<timestamp>.tar.gz``.
+    Purged entries are first renamed into ``.purge/`` and then deleted on a daemon thread,
+    so callers don't wait on a large ``rmtree``.
+    At exit, the process waits up to ``exit_timeout`` seconds for purges to finish;
+    anything left by an interrupted purge or a longer one is deleted on the next purge.
+    """
+
+    archive_dir = "archives"
+    purge_dir = ".purge"
+    store_dir = "store"
+    exit_timeout = 2.0
+    _threads: list[threading.Thread] = []
+    _threads_lock = threading.Lock()
+    _exit_hooked = False
+
+    def __init__(self, path: Union[Path, str], policy: Optional[RetentionPolicy] = None):
+        self.path = Path(path)
+        self.policy = RetentionPolicy() if policy is None else policy
+        self.store = BackupStore(self.path / self.store_dir)
+
+    def backups(self) -> Sequence[Backup]:
+        """
+        Finds the loose backups (not archives), without descending into backed-up directories.
+        """
+        found = []
+        stack = [self.path]
+        while len(stack) > 0:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                if current == self.path and entry.name in {
+                    self.archive_dir,
+                    self.purge_dir,
+                    self.store_dir,
+                }:
+                    continue
+                match = _backup_pattern.fullmatch(entry.name)
+                if match is not None:
+                    original = Path(entry.path).parent.relative_to(self.path) / match.group(1)
+                    found.append(
+                        Backup(
+                            path=Path(entry.path),
+                            original=original.as_posix(),
+                            time=_parse_stamp(match.group(2)),
+                            size=tree_size(entry.path),
+                        )
+                    )
+                elif entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+        return found
+
+    def archives(self) -> Sequence[Backup]:
+        found = []
+        directory = self.path / self.archive_dir
+        if directory.exists():
+            for p in directory.iterdir():
+                match = _archive_pattern.fullmatch(p.name)
+                if match is not None:
+                    found.append(Backup(p, None, _parse_stamp(match.group(1)), tree_size(p)))
+        return found
+
+    def stored(self) -> Sequence[Backup]:
+        """
+        The backups in the :class:`BackupStore`.
+        """
+        found, counted = [], set()
+        for e in reversed(self.store.entries()):
+            size = 0 if e.blob in counted else e.size
+            counted.add(e.blob)
+            blob = self.store.blob_path(e.blob)
+            found.append(Backup(blob, e.path, _parse_stamp(e.time), size, stored=True))
+        return found
+
+    def enforce(self, now: Optional[float] = None) -> Sequence[Path]:
+        """
+        Applies the policy: compacts, then purges by age, then purges by size.
+
+        Returns:
+            The paths purged (not including those compacted into an archive),
+            where blobs are included only once nothing refers to them
+        """
+        now = time.time() if now is None else now
+        backups = [*self.backups(), *self.stored()]
+        if self.policy.keep is not None:
+            backups = self._compact(backups)
+        entries = sorted([*backups, *self.archives()], key=lambda b: b.time)
+        doomed = []
+        if self.policy.max_age is not None:
+            doomed = [e for e in entries if now - e.time > self.policy.max_age]
+            entries = [e for e in entries if now - e.time <= self.policy.max_age]
+        if self.policy.max_size is not None:
+            total = sum(e.size for e in entries)
+            while len(entries) > 0 and total > self.policy.max_size:
+                total -= entries[0].size
+                doomed.append(entries.pop(0))
+        paths = [e.path for e in doomed if not e.stored]
+        paths += self._unstore([e for e in doomed if e.stored])
+        self.purge(paths)
+        return paths
+
+    def purge_all(self, keep: Iterable[str] = ()) -> bool:
+        """
+        Purges everything except the named top-level entries.
+
+        Returns:
+            Whether anything was purged
+        """
+        keep = {*keep, self.purge_dir}
+        if not self.path.exists():
+            return False
+        doomed = [p for p in self.path.iterdir() if p.name not in keep]
+        self.purge(doomed)
+        return len(doomed) > 0
+
+    def purge(self, paths: Iterable[Path]) -> None:
+        """
+        Moves paths aside into ``.purge/`` and deletes them (and any leftovers) in the background.
+        """
+        purge_dir = self.path / self.purge_dir
+        staging = purge_dir / f"{time.time_ns()}-{os.getpid()}"
+        for p in paths:
+            target = staging / p.relative_to(self.path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(p, target)
+        doomed = list(purge_dir.iterdir()) if purge_dir.exists() else []
+        if len(doomed) > 0:
+            # a daemon, so exiting doesn't wait; the next purge finishes the job
+            thread = threading.Thread(
+                target=self._delete, args=(doomed,), name="purge", daemon=True
+            )
+            with self._threads_lock:
+                self._threads.append(thread)
+                if not BackupArea._exit_hooked:
+                    atexit.register(BackupArea._wait_at_exit)
+                    BackupArea._exit_hooked = True
+            thread.start()
+
+    @classmethod
+    def wait(cls, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until every background purge has finished, or until ``timeout`` seconds pass.
+
+        Returns:
+            Whether every purge finished
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with cls._threads_lock:
+            threads = list(cls._threads)
+        for thread in threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        with cls._threads_lock:
+            cls._threads[:] = [t for t in cls._threads if t.is_alive()]
+            return len(cls._threads) == 0
+
+    @classmethod
+    def _wait_at_exit(cls) -> None:
+        # daemon threads still run during atexit, so a normal exit usually finishes the purge
+        if not cls.wait(cls.exit_timeout):
+            logger.debug("Purging is still running; leaving the rest for the next purge")
+
+    def _compact(self, backups: Sequence[Backup]) -> Sequence[Backup]:
+        by_original = {}
+        for b in backups:
+            by_original.setdefault(b.original, []).append(b)
+        kept, old = [], []
+        for group in by_original.values():
+            group = sorted(group, key=lambda b: -b.time)
+            kept.extend(group[: self.policy.keep])
+            old.extend(group[self.policy.keep :])
+        if len(old) == 0:
+            return kept
+        newest = datetime.fromtimestamp(max(b.time for b in old)).strftime(_stamp_format)
+        directory = self.path / self.archive_dir
+        directory.mkdir(parents=True, exist_ok=True)
+        archive = directory / f"backups-{newest}.tar.gz"
+        n = 1
+        while archive.exists():
+            n += 1
+            archive = directory / f"backups-{newest}-{n}.tar.gz"
+        tmp = archive.with_name(archive.name + ".tmp")
+        with tarfile.open(tmp, "w:gz") as tar:
+            for b in old:
+                stamp = datetime.fromtimestamp(b.time).strftime(_stamp_format)
+                tar.add(b.path, arcname=f"{b.original}.{stamp}.bak")
+        os.replace(tmp, archive)
+        logger.debug(f"Compacted {len(old)} backups into {archive}")
+        loose = [b.path for b in old if not b.stored]
+        self.purge([*loose, *self._unstore(b for b in old if b.stored)])
+        return kept
+
+    def _unstore(self, backups: Iterable[Backup]) -> Sequence[Path]:
+        # the same blob can back several entries, so match on what's in the manifest
+        doomed = {(b.original, b.time, b.path.name) for b in backups}
+        if len(doomed) == 0:
+            return []
+        entries = [
+            e for e in self.store.entries() if (e.path, _parse_stamp(e.time), e.blob) in doomed
+        ]
+        return self.store.remove(entries)
+
+    def _delete(self, paths: Sequence[Path]) -> None:
+        # leftovers may be picked up by more than one purge; that's fine
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+        logger.debug(f"Finished purging {len(paths)} staged dirs")
+
+
+def _parse_stamp(stamp: str) -> float:
+    return datetime.strptime(stamp, _stamp_format).timestamp()
+
+
+__all__ = ["Backup", "BackupArea", "BackupStore", "ManifestEntry", "RetentionPolicy"]
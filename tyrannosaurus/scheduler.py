@@ -0,0 +1,333 @@
+"""
+Rate limiting, retries, and per-host statistics for HTTP requests.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__package__)
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` requests per second on average, with bursts of up to ``burst``.
+
+    :meth:`reserve` takes a token immediately, going into debt if needed,
+    and returns how long the caller must wait before using it.
+    This works the same way for threads and coroutines, which then sleep however they sleep.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Holds back every request for ``seconds``, such as when a server sends ``Retry-After``.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+@dataclass(frozen=True)
+class HostStats:
+    """
+    Counts and timings for one host.
+
+    Attributes:
+        requests: Attempts sent, including retries
+        retries: Attempts that were retried
+        throttled: Responses with status 429 or a ``Retry-After`` header
+        errors: Attempts that failed without a response (e.g. timeouts)
+        latency: Total seconds spent waiting for responses
+        max_latency: The slowest single attempt, in seconds
+        waited: Total seconds spent waiting for the rate limit or backoff
+    """
+
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0
+    errors: int = 0
+    latency: float = 0.0
+    max_latency: float = 0.0
+    waited: float = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.latency / self.requests if self.requests > 0 else 0.0
+
+
+class Scheduler:
+    """
+    Paces, retries, and records every request made through a :class:`tyrannosaurus.session.Session`.
+
+    Each host gets its own token bucket and concurrency cap.
+    Responses with a status in ``retry_codes`` and transport errors are retried
+    with jittered exponential backoff, or after the server's ``Retry-After`` if it sent one.
+    A ``Retry-After`` also pauses the host's bucket, so concurrent requests back off together.
+    """
+
+    retry_codes = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(
+        self,
+        rate: float = 10,
+        burst: int = 20,
+        per_host: int = 8,
+        retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30,
+        max_retry_after: float = 120,
+    ):
+        """
+        Constructor.
+
+        Args:
+            rate: Average requests per second to any one host
+            burst: Requests allowed at once before ``rate`` applies
+            per_host: Maximum simultaneous requests to any one host
+            retries: Maximum number of retries per request
+            backoff: Base delay in seconds, doubled after each failed attempt
+            max_backoff: Maximum delay between attempts, in seconds, unless the server asks
+            max_retry_after: Give up rather than honor a ``Retry-After`` longer than this
+        """
+        self.rate = rate
+        self.burst = burst
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self._buckets: dict[str, TokenBucket] = {}
+        self._limits: dict[str, threading.BoundedSemaphore] = {}
+        self._stats: dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Scheduler:
+        """
+        Reads settings from ``$TYRANNOSAURUS_HTTP_RATE``, ``$TYRANNOSAURUS_HTTP_PER_HOST``,
+        and ``$TYRANNOSAURUS_HTTP_RETRIES``.
+        """
+        return Scheduler(
+            rate=float(os.environ.get("TYRANNOSAURUS_HTTP_RATE", 10)),
+            per_host=int(os.environ.get("TYRANNOSAURUS_HTTP_PER_HOST", 8)),
+            retries=int(os.environ.get("TYRANNOSAURUS_HTTP_RETRIES", 4)),
+        )
+
+    def stats(self) -> Mapping[str, HostStats]:
+        with self._lock:
+            return dict(self._stats)
+
+    def report(self) -> Sequence[str]:
+        """
+        One human-readable line per host, busiest first.
+        """
+        stats = sorted(self.stats().items(), key=lambda e: -e[1].requests)
+        return [
+            f"{host}: {s.requests} requests, {s.retries} retries, {s.throttled} throttled, "
+            f"{s.errors} errors; latency {1000 * s.mean_latency:.0f} ms mean, "
+            f"{1000 * s.max_latency:.0f} ms max; waited {s.waited:.1f} s"
+            for host, s in stats
+        ]
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+    def limit(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._limits:
+                self._limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._limits[host]
+
+    def delay(self, host: str, attempt: int, response: Optional[httpx.Response]) -> Optional[float]:
+        """
+        Decides whether and how long to wait before retrying.
+
+        Args:
+            host: The request's host
+            attempt: The number of attempts already made (starting at 1)
+            response: The response, or None if the attempt raised a transport error
+
+        Returns:
+            Seconds to wait, or None to stop and return the response (or raise)
+        """
+        if attempt > self.retries:
+            return None
+        if response is not None and response.status_code not in self.retry_codes:
+            return None
+        retry_after = None if response is None else self._retry_after(response)
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                logger.warning(f"{host} asked to retry after {retry_after:.0f} s; giving up")
+                return None
+            self.bucket(host).pause(retry_after)
+            return retry_after
+        cap = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, cap)  # nosec
+
+    def record(
+        self,
+        host: str,
+        latency: float,
+        response: Optional[httpx.Response] = None,
+        retried: bool = False,
+        waited: float = 0.0,
+    ) -> None:
+        throttled = response is not None and (
+            response.status_code == 429 or "Retry-After" in response.headers
+        )
+        with self._lock:
+            s = self._stats.get(host, HostStats())
+            self._stats[host] = replace(
+                s,
+                requests=s.requests + 1,
+                retries=s.retries + int(retried),
+                throttled=s.throttled + int(throttled),
+                errors=s.errors + int(response is None),
+                latency=s.latency + latency,
+                max_latency=max(s.max_latency, latency),
+                waited=s.waited + waited,
+            )
+
+    def _retry_after(self, response: httpx.Response) -> Optional[float]:
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            logger.debug(f"Ignoring malformed Retry-After: {value}")
+            return None
+        return max(0.0, when.timestamp() - time.time())
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    """
+    Sends requests through a :class:`Scheduler`, wrapping another transport.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, scheduler: Scheduler):
+        self.transport = transport
+        self.scheduler = scheduler
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        for attempt in itertools.count(1):
+            waited = self.scheduler.bucket(host).reserve()
+            if waited > 0:
+                time.sleep(waited)
+            with self.scheduler.limit(host):
+                t0 = time.monotonic()
+                try:
+                    response, error = self.transport.handle_request(request), None
+                except httpx.TransportError as e:
+                    response, error = None, e
+            delay = self.scheduler.delay(host, attempt, response)
+            latency = time.monotonic() - t0
+            self.scheduler.record(host, latency, response, delay is not None, waited + (delay or 0))
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+            _log_retry(request, response, delay)
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+    """
+    Like :class:`ScheduledTransport`, for async clients.
+    The per-host caps are asyncio semaphores, so each instance must stay on one event loop.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, scheduler: Scheduler):
+        self.transport = transport
+        self.scheduler = scheduler
+        self._limits: dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if host not in self._limits:
+            self._limits[host] = asyncio.Semaphore(self.scheduler.per_host)
+        for attempt in itertools.count(1):
+            waited = self.scheduler.bucket(host).reserve()
+            if waited > 0:
+                await asyncio.sleep(waited)
+            async with self._limits[host]:
+                t0 = time.monotonic()
+                try:
+                    response, error = await self.transport.handle_async_request(request), None
+                except httpx.TransportError as e:
+                    response, error = None, e
+            delay = self.scheduler.delay(host, attempt, response)
+            latency = time.monotonic() - t0
+            self.scheduler.record(host, latency, response, delay is not None, waited + (delay or 0))
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                await response.aclose()
+            _log_retry(request, response, delay)
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def _log_retry(request: httpx.Request, response: Optional[httpx.Response], delay: float) -> None:
+    reason = "Transport error" if response is None else f"Status {response.status_code}"
+    logger.debug(f"{reason} from {request.url}; retrying in {delay:.1f} s")
+
+
+__all__ = [
+    "AsyncScheduledTransport",
+    "HostStats",
+    "ScheduledTransport",
+    "Scheduler",
+    "TokenBucket",
+]
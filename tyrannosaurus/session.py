@@ -0,0 +1,155 @@
+"""
+A shared, pooled HTTP session for all network access.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+from tyrannosaurus.scheduler import AsyncScheduledTransport, ScheduledTransport, Scheduler
+
+logger = logging.getLogger(__package__)
+
+
+class Session:
+    """
+    HTTP clients shared by the whole process, with keep-alive, bounded pools, and explicit timeouts.
+
+    Use :meth:`Session.get` for the process-wide instance and :meth:`Session.configure` to replace it.
+    The synchronous client is created once and reused.
+    Async clients are bound to an event loop, so :meth:`async_client` makes a new one per fan-out
+    with the same settings.
+    """
+
+    _instance: Optional[Session] = None
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        timeout: float = 30,
+        connect_timeout: float = 10,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        http2: bool = False,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
+        scheduler: Optional[Scheduler] = None,
+    ):
+        """
+        Constructor.
+
+        Args:
+            timeout: Seconds to wait for reads, writes, and a pooled connection
+            connect_timeout: Seconds to wait to establish a connection
+            max_connections: Maximum number of open connections per client
+            max_keepalive: Maximum number of idle connections to keep open
+            http2: Use HTTP/2 where the server supports it (requires the ``h2`` package)
+            transport: Transport for the sync client (mostly for testing)
+            async_transport: Transport for async clients (mostly for testing)
+            scheduler: Rate limits and retries for every request [default: from the environment]
+        """
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but package 'h2' is not installed; using HTTP/1.1")
+            http2 = False
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.http2 = http2
+        self.transport = transport
+        self.async_transport = async_transport
+        self.scheduler = Scheduler.from_env() if scheduler is None else scheduler
+        self._client: Optional[httpx.Client] = None
+
+    @classmethod
+    def from_env(cls) -> Session:
+        """
+        Reads settings from ``$TYRANNOSAURUS_HTTP_TIMEOUT``, ``$TYRANNOSAURUS_HTTP_CONNECTIONS``,
+        and ``$TYRANNOSAURUS_HTTP2``, and the scheduler's from :meth:`Scheduler.from_env`.
+        """
+        return Session(
+            timeout=float(os.environ.get("TYRANNOSAURUS_HTTP_TIMEOUT", 30)),
+            max_connections=int(os.environ.get("TYRANNOSAURUS_HTTP_CONNECTIONS", 20)),
+            http2=os.environ.get("TYRANNOSAURUS_HTTP2", "").lower() in {"1", "true", "yes"},
+        )
+
+    @classmethod
+    def get(cls) -> Session:
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls.from_env()
+            return cls._instance
+
+    @classmethod
+    def configure(cls, session: Optional[Session] = None, **kwargs) -> Session:
+        """
+        Replaces the process-wide session, closing the old one.
+
+        Args:
+            session: The new session; if None, one is constructed from ``kwargs``
+            kwargs: Passed to the constructor
+        """
+        with cls._lock:
+            if cls._instance is not None:
+                cls._instance.close()
+            cls._instance = Session(**kwargs) if session is None else session
+            return cls._instance
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive
+        )
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                transport = self.transport
+                if transport is None:
+                    transport = httpx.HTTPTransport(limits=self.limits, http2=self.http2)
+                self._client = httpx.Client(
+                    timeout=self.timeout,
+                    transport=ScheduledTransport(transport, self.scheduler),
+                )
+            return self._client
+
+    def async_client(self, max_connections: Optional[int] = None) -> httpx.AsyncClient:
+        """
+        Creates an async client with this session's settings.
+        Use it as an ``async with`` block around a batch of requests.
+
+        Args:
+            max_connections: Overrides the pool size (e.g. to match a concurrency limit)
+        """
+        limits = self.limits
+        if max_connections is not None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=min(max_connections, self.max_keepalive),
+            )
+        transport = self.async_transport
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=limits, http2=self.http2)
+        return httpx.AsyncClient(
+            timeout=self.timeout, transport=AsyncScheduledTransport(transport, self.scheduler)
+        )
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+__all__ = ["Session"]
@@ -9,33 +9,415 @@ You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-
 """
 from __future__ import annotations
 
+import difflib
+import functools
+import hashlib
+import json
 import logging
+import os
 import re
 import textwrap
-from collections.abc import Mapping, Sequence
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Union
+from typing import Any, Optional, Union
 
-from tyrannosaurus.context import Context
+from tyrannosaurus import TyrannoInfo
+from tyrannosaurus.cache import atomic_write
+from tyrannosaurus.context import Context, WriteBatch
 from tyrannosaurus.envs import CondaEnv
+from tyrannosaurus.helpers import MtimeIndex
 
 logger = logging.getLogger(__package__)
+# inline flags that can be scoped to one alternative of a combined pattern
+_scoped_flags = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s", re.VERBOSE: "x"}
+
+
+class LineRewriter:
+    """
+    Replaces whole lines that match any of a sequence of keys.
+
+    A ``str`` key matches lines starting with it; a pattern matches lines it fully matches.
+    The line becomes the value for the first matching key
+    (expanded with :meth:`re.Match.expand` for a pattern, so it can refer to groups).
+    The prefixes are compiled into a character trie and the patterns into one alternation,
+    so each line is checked once however many keys there are.
+    Compiled rewriters depend only on the keys, so :meth:`of` shares them across files and projects.
+    """
+
+    def __init__(self, keys: Sequence[Union[str, re.Pattern]]):
+        self.keys = tuple(keys)
+        self._trie = {}
+        alternatives = []
+        for i, k in enumerate(self.keys):
+            if isinstance(k, re.Pattern):
+                flags = "".join(c for f, c in _scoped_flags.items() if k.flags & f)
+                scoped = f"(?{flags}:{k.pattern})" if flags else k.pattern
+                alternatives.append(f"(?P<k{i}>{scoped})")
+            else:
+                node = self._trie
+                for c in k:
+                    node = node.setdefault(c, {})
+                node.setdefault(None, i)
+        self._regex = re.compile("|".join(alternatives)) if len(alternatives) > 0 else None
+
+    @classmethod
+    @functools.lru_cache(maxsize=64)
+    def of(cls, keys: tuple[Union[str, re.Pattern], ...]) -> LineRewriter:
+        return LineRewriter(keys)
+
+    def rewrite(self, lines: Iterable[str], values: Sequence[str]) -> Iterator[str]:
+        """
+        Lazily rewrites lines, using ``values[i]`` for ``keys[i]``.
+        """
+        for line in lines:
+            i = self.match(line)
+            if i is None:
+                yield line
+            elif isinstance(self.keys[i], re.Pattern):
+                yield self.keys[i].fullmatch(line).expand(values[i])
+            else:
+                yield values[i]
+
+    def match(self, line: str) -> Optional[int]:
+        """
+        The index of the first key that matches, or None.
+        """
+        node = self._trie
+        best = node.get(None)
+        for c in line:
+            node = node.get(c)
+            if node is None:
+                break
+            i = node.get(None)
+            if i is not None and (best is None or i < best):
+                best = i
+        if self._regex is not None and (m := self._regex.fullmatch(line)) is not None:
+            i = int(m.lastgroup[1:])
+            if best is None or i < best:
+                best = i
+        return best
+
+
+@dataclass(frozen=True)
+class TargetResult:
+    """
+    The outcome of one sync target.
+
+    Attributes:
+        target: Name of the target, such as ``init``
+        lines: The lines written (empty if the target is disabled or failed)
+        seconds: Wall time taken
+        error: What the target raised, if it failed
+        skipped: Its inputs and output were unchanged since the last sync, so it didn't run
+    """
+
+    target: str
+    lines: Sequence[str]
+    seconds: float
+    error: Optional[Exception] = None
+    skipped: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class SyncState:
+    """
+    Fingerprints from the last sync, kept in ``.tyrannosaurus/sync-state.json``.
+
+    For each target, records a hash of its inputs and its output file's path, size, and hash.
+    The output's mtime is recorded too, once it's old enough to trust,
+    so an unchanged output is confirmed by a single stat.
+    """
+
+    version = 1
+    file_name = "sync-state.json"
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self._targets: dict[str, dict[str, Any]] = {}
+        self._dirty = False
+
+    def load(self) -> SyncState:
+        """
+        Reads the saved state; a missing, corrupt, or outdated file is treated as empty.
+        """
+        try:
+            data = json.loads(self.path.read_text(encoding="utf8"))
+            if data["version"] == self.version:
+                self._targets = data["targets"]
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.debug(f"Not using sync state {self.path}", exc_info=True)
+        return self
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        data = {"version": self.version, "targets": self._targets}
+        atomic_write(self.path, json.dumps(data))
+        self._dirty = False
+
+    def unchanged(self, target: str, inputs: str, output: Path) -> bool:
+        """
+        Whether ``target`` last ran with these inputs and its output hasn't changed since.
+        """
+        entry = self._targets.get(target)
+        if entry is None or entry["inputs"] != inputs or entry["path"] != os.fspath(output):
+            return False
+        try:
+            info = os.stat(output)
+        except OSError:
+            return False
+        if info.st_size != entry["size"]:
+            return False
+        if info.st_mtime_ns == entry["mtime"]:
+            return True
+        if self._digest(output) != entry["hash"]:
+            return False
+        # the same contents; remember the mtime so next time a stat is enough
+        self.record(target, inputs, output)
+        return True
+
+    def record(self, target: str, inputs: str, output: Path) -> None:
+        info = os.stat(output)
+        trusted = time.time_ns() - info.st_mtime_ns > MtimeIndex.min_age_ns
+        self._targets[target] = {
+            "inputs": inputs,
+            "path": os.fspath(output),
+            "size": info.st_size,
+            "mtime": info.st_mtime_ns if trusted else None,
+            "hash": self._digest(output),
+        }
+        self._dirty = True
+
+    def forget(self, target: str) -> None:
+        if self._targets.pop(target, None) is not None:
+            self._dirty = True
+
+    def _digest(self, path: Path) -> str:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
 
 
 class Sync:
+    # what each target reads: Context properties, tool.poetry keys, sources, and other keys
+    # targets not listed here, or without an output file, always run
+    inputs = {
+        "init": ["sources.status", "sources.copyright", "sources.date"],
+        "dockerfile": ["version", "description"],
+        "codemeta": ["version", "description"],
+        "citation": ["version", "description"],
+        "recipe": [
+            "version",
+            "license",
+            "build_sys_reqs",
+            "poetry.description",
+            "poetry.homepage",
+            "poetry.documentation",
+            "poetry.repository",
+            "sources.long_description",
+            "sources.maintainers",
+            # the line length for wrapping the descriptions
+            "sources.linelength",
+            "data.tool.black.line-length",
+        ],
+    }
+    # targets that make network requests
+    network_targets = frozenset({"environment"})
+
     def __init__(self, context: Context):
         self.context = context
+        self.results: Sequence[TargetResult] = []
+        # the batch for the target running on each thread
+        self._local = threading.local()
+
+    @property
+    def targets(self) -> Mapping[str, Callable[[], Sequence[str]]]:
+        return {
+            "init": self.fix_init,
+            "dockerfile": self.fix_dockerfile,
+            "pyproject": self.fix_pyproject,
+            "recipe": self.fix_recipe,
+            "environment": self.fix_env,
+            "codemeta": self.fix_codemeta,
+            "citation": self.fix_citation,
+        }
+
+    @property
+    def outputs(self) -> Mapping[str, Path]:
+        """
+        The file each target rewrites, for targets that rewrite exactly one.
+        """
+        outputs = {
+            "init": self.context.path / self.context.project / "__init__.py",
+            "dockerfile": self.context.path / "Dockerfile",
+            "codemeta": self.context.path / "codemeta.json",
+            "citation": self.context.path / "CITATION.cff",
+        }
+        if "recipe" in self.context.sources:
+            outputs["recipe"] = self.context.path_source("recipe")
+        return outputs
+
+    def fingerprint(self, target: str) -> Optional[str]:
+        """
+        A hash of everything the target reads from pyproject.toml, or None if that's unknown.
+        """
+        names = self.inputs.get(target)
+        if names is None:
+            return None
+        values = [TyrannoInfo.version, self.has(target)]
+        for name in names:
+            kind, _, key = name.partition(".")
+            if kind == "sources":
+                values.append(self.context.sources.get(key))
+            elif kind == "poetry":
+                values.append(self.context.data.get("tool.poetry." + key))
+            elif kind == "data":
+                values.append(self.context.data.get(key))
+            else:
+                values.append(getattr(self.context, name))
+        return hashlib.sha256(json.dumps(values, default=repr).encode(encoding="utf8")).hexdigest()
+
+    def sync(self, jobs: Optional[int] = None, full: bool = False) -> Sequence[str]:
+        """
+        Runs every target, each as a separate task.
+        Each target writes different files, so network-bound ones (like the environment)
+        overlap with the rest; a target that fails doesn't stop the others.
+        Results are in :attr:`results`, in the same order every time.
+
+        Files are only written if their contents change.
+        The writes of every target that succeeded are committed together at the end
+        (see :class:`WriteBatch`), so a crash partway leaves the metadata consistent.
 
-    def sync(self) -> Sequence[str]:
-        self.fix_init()
-        self.fix_dockerfile()
-        self.fix_pyproject()
-        self.fix_recipe()
-        self.fix_env()
-        self.fix_codemeta()
-        self.fix_citation()
+        A target is skipped if its :meth:`fingerprint` and its output file
+        are the same as after the last sync.
+
+        Args:
+            jobs: Number of threads [default: one per target]
+            full: Run every target, ignoring the state saved by the last sync
+
+        Returns:
+            The targets enabled in pyproject.toml
+        """
+        state = SyncState(self.context.tmp_path / SyncState.file_name)
+        if not full:
+            state.load()
+        outputs = self.outputs
+        prints = {name: self.fingerprint(name) for name in self.targets}
+        skipped, todo = {}, {}
+        for name, fn in self.targets.items():
+            output = outputs.get(name)
+            if prints[name] is not None and output is not None and self.has(name):
+                if state.unchanged(name, prints[name], output):
+                    skipped[name] = TargetResult(name, [], 0.0, skipped=True)
+                    continue
+            todo[name] = fn
+        batch = WriteBatch(self.context)
+        if jobs == 1 or len(todo) <= 1:
+            ran = {name: self._run(name, fn, batch) for name, fn in todo.items()}
+        else:
+            with ThreadPoolExecutor(max_workers=jobs or len(todo)) as pool:
+                futures = {
+                    name: pool.submit(self._run, name, fn, batch) for name, fn in todo.items()
+                }
+                ran = {name: f.result() for name, f in futures.items()}
+        self.results = [skipped.get(name) or ran[name] for name in self.targets]
+        written = batch.commit()
+        if not self.context.dry_run:
+            for r in ran.values():
+                output = outputs.get(r.target)
+                if r.ok and prints[r.target] is not None and output is not None and output.exists():
+                    state.record(r.target, prints[r.target], output)
+                else:
+                    state.forget(r.target)
+            state.save()
+        # backups are only made for files that were written
+        if len(written) > 0:
+            self.context.enforce_retention()
         return [str(s) for s in self.context.targets]
 
+    def check(self, network: bool = False) -> Mapping[Path, Sequence[str]]:
+        """
+        Computes what every target would write, in memory, and compares it with the files.
+        Nothing is written, backed up, or recorded. Results are in :attr:`results`.
+
+        Args:
+            network: Also run the :attr:`network_targets`
+
+        Returns:
+            A unified diff for each file that sync would change, in path order
+        """
+        batch = WriteBatch(self.context, in_memory=True)
+        self.results = [
+            self._run(name, fn, batch)
+            for name, fn in self.targets.items()
+            if network or name not in self.network_targets
+        ]
+        diffs = {}
+        for path, (old, new) in sorted(batch.changes.items()):
+            rel = path.relative_to(self.context.path).as_posix()
+            old_lines = [] if old is None else old.splitlines()
+            diff = difflib.unified_diff(
+                old_lines, new.splitlines(), f"a/{rel}", f"b/{rel}", n=1, lineterm=""
+            )
+            diffs[path] = list(diff)
+        return diffs
+
+    @property
+    def failures(self) -> Sequence[TargetResult]:
+        return [r for r in self.results if not r.ok]
+
+    def report(self) -> Sequence[str]:
+        """
+        One line per target that ran, in a fixed order.
+        """
+        return [
+            f"{r.target}: unchanged"
+            if r.skipped
+            else f"{r.target}: {len(r.lines)} lines in {r.seconds:.2f} s"
+            if r.ok
+            else f"{r.target}: failed after {r.seconds:.2f} s ({type(r.error).__name__}: {r.error})"
+            for r in self.results
+            if r.skipped or not r.ok or len(r.lines) > 0
+        ]
+
+    def _run(self, name: str, fn: Callable[[], Sequence[str]], into: WriteBatch) -> TargetResult:
+        # the target gets its own batch, merged into the shared one only if it succeeds
+        t0 = time.monotonic()
+        self._local.batch = batch = WriteBatch(self.context, in_memory=into.in_memory)
+        try:
+            lines = fn()
+        except Exception as e:
+            batch.discard()
+            logger.error(f"Failed to sync {name}", exc_info=True)
+            return TargetResult(name, [], time.monotonic() - t0, e)
+        finally:
+            self._local.batch = None
+        into.absorb(batch)
+        return TargetResult(name, lines, time.monotonic() - t0)
+
+    @contextmanager
+    def _batched(self) -> Iterator[WriteBatch]:
+        # the running target's batch, or a new one committed on exit if called outside of sync()
+        batch = getattr(self._local, "batch", None)
+        if batch is not None:
+            yield batch
+            return
+        self._local.batch = batch = WriteBatch(self.context)
+        try:
+            yield batch
+            batch.commit()
+        except BaseException:
+            batch.discard()
+            raise
+        finally:
+            self._local.batch = None
+
     def has(self, key: str):
         return self.context.has_target(key)
 
@@ -128,10 +510,16 @@ class Sync:
             and self.context.path_source("environment").exists()
         ):
             creator = CondaEnv(self.context.project, dev=True, extras=True)
-            return creator.create(self.context, self.context.path)
+            with self._batched() as batch:
+                return creator.create(self.context, self.context.path_source("environment"), batch)
         return []
 
     def fix_recipe_internal(self, recipe_path: Path) -> Sequence[str]:
+        # one batch, so the intermediate rewrite is never written on its own
+        with self._batched():
+            return self._fix_recipe(recipe_path)
+
+    def _fix_recipe(self, recipe_path: Path) -> Sequence[str]:
         # TODO this is all quite bad
         # Well, I guess this is still an alpha release
         # python_vr = self.context.deps["python"]
@@ -178,9 +566,8 @@ extra:
         final_lines = [x.rstrip(" ") for x in final_lines]
         final_str = "\n".join(final_lines)
         final_str = re.compile(r"\n\s*\n").sub("\n\n", final_str)
-        if not self.context.dry_run:
-            recipe_path.write_text(final_str, encoding="utf8")
-        logger.debug(f"Wrote to {recipe_path}")
+        with self._batched() as batch:
+            batch.write(recipe_path, final_str)
         return final_str.split("\n")
 
     def _until_line(self, lines: Sequence[str], stop_at: str):
@@ -210,36 +597,14 @@ extra:
         path: Path,
         replace: Mapping[Union[str, re.Pattern], str],
     ) -> Sequence[str]:
-        if not self.context.dry_run:
-            self.context.back_up(path)
-        new_lines = "\n".join(
-            [self._fix_line(line, replace) for line in path.read_text(encoding="utf8").splitlines()]
-        )
-        if not self.context.dry_run:
-            path.write_text(new_lines, encoding="utf8")
-        logger.debug(f"Wrote to {path}")
+        rewriter = LineRewriter.of(tuple(replace.keys()))
+        text = path.read_text(encoding="utf8")
+        new_lines = "\n".join(rewriter.rewrite(text.splitlines(), list(replace.values())))
+        # keep a final newline, so this doesn't fight with end-of-file fixers
+        with self._batched() as batch:
+            batch.write(path, new_lines + "\n" if text.endswith("\n") else new_lines)
         return new_lines.splitlines()
 
-    def _fix_line(self, line: str, replace: Mapping[Union[str, re.Pattern], str]) -> str:
-        for k, v in replace.items():
-            replace = self._replace(line, k, v)
-            if replace is not None:
-                return replace
-        else:
-            return line
-
-    def _replace(self, line: str, k: Union[str, re.Pattern], v: str) -> Optional[str]:
-        if isinstance(k, re.Pattern):
-            try:
-                if k.fullmatch(line) is not None:
-                    return k.sub(line, v)
-            except re.error:
-                logger.error(f"Failed to process '{line}' with pattern '{k}")
-                raise
-        elif line.startswith(k):
-            return v
-        return None
-
     def _get_line_length(self) -> int:
         if "linelength" in self.context.sources:
             return int(self.context.source("linelength"))
@@ -248,4 +613,4 @@ extra:
         return 100
 
 
-__all__ = ["Sync"]
+__all__ = ["LineRewriter", "Sync", "SyncState", "TargetResult"]
@@ -11,23 +11,145 @@ You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-
 from __future__ import annotations
 
 import logging
-from collections.abc import Mapping
+import os
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Optional
 
 from tyrannosaurus.context import Context
-from tyrannosaurus.helpers import PyPiHelper
+from tyrannosaurus.endpoints import Endpoints
+from tyrannosaurus.helpers import PyPiHelper, normalize_pkg_name
+from tyrannosaurus.lockfile import LockCache, LockFile
+from tyrannosaurus.versiondb import VersionDatabase
 
 logger = logging.getLogger(__package__)
+_skip_dirs = {"node_modules", "venv", "__pycache__", "build", "dist", "site-packages"}
 
 
 class Update:
-    def __init__(self, context: Context):
+    def __init__(
+        self,
+        context: Context,
+        concurrency: int = 16,
+        database: Optional[VersionDatabase] = None,
+    ):
         self.context = context
+        self.concurrency = concurrency
+        self.database = database
 
     def update(self) -> tuple[Mapping[str, tuple[str, str]], Mapping[str, tuple[str, str]]]:
-        helper = PyPiHelper()
-        updates = helper.new_versions(self.context.deps)
-        dev_updates = helper.new_versions(self.context.dev_deps)
+        helper = PyPiHelper(
+            concurrency=self.concurrency,
+            database=self.database,
+            endpoints=self.context.endpoints,
+        )
+        # main and dev dependencies are resolved together in a single fan-out
+        updates, dev_updates = helper.new_versions_many(self.context.deps, self.context.dev_deps)
         return updates, dev_updates
 
+    @classmethod
+    def update_many(
+        cls,
+        contexts: Sequence[Context],
+        concurrency: int = 16,
+        database: Optional[VersionDatabase] = None,
+    ) -> Mapping[Path, tuple[Mapping[str, tuple[str, str]], Mapping[str, tuple[str, str]]]]:
+        """
+        Finds updates for several projects at once.
+        Each distinct package across all of the projects is looked up exactly once.
+
+        Args:
+            contexts: One context per project
+            concurrency: Maximum number of simultaneous PyPi requests
+            database: Local version database to answer from first
+
+        Returns:
+            A mapping from each project path to its (main, dev) updates, like :meth:`update`
+        """
+        groups = []
+        for context in contexts:
+            groups += [context.deps, context.dev_deps]
+        helper = PyPiHelper(
+            concurrency=concurrency, database=database, endpoints=cls._endpoints(contexts)
+        )
+        results = helper.new_versions_many(*groups)
+        return {
+            context.path: (results[2 * i], results[2 * i + 1])
+            for i, context in enumerate(contexts)
+        }
+
+    def update_locked(self) -> Mapping[str, tuple[str, str]]:
+        """
+        Finds updates for every package pinned in ``poetry.lock``, including transitive ones.
+        """
+        results = self.update_locked_many([self.context], self.concurrency, database=self.database)
+        return results[self.context.path]
+
+    @classmethod
+    def update_locked_many(
+        cls,
+        contexts: Sequence[Context],
+        concurrency: int = 16,
+        cache: Optional[LockCache] = None,
+        database: Optional[VersionDatabase] = None,
+    ) -> Mapping[Path, Mapping[str, tuple[str, str]]]:
+        """
+        Like :meth:`update_locked`, for several projects in a single fan-out.
+        Results are cached by lock file content, so an unchanged ``poetry.lock`` is not re-resolved.
+        Results for a project are only cached if every one of its packages was found.
+
+        Returns:
+            A mapping from each project path to its updates, as (locked, latest) versions
+        """
+        cache = LockCache.default() if cache is None else cache
+        results, pending = {}, {}
+        for context in contexts:
+            lock = LockFile(context.path / "poetry.lock")
+            if not lock.exists():
+                logger.error(f"No poetry.lock in {context.path}")
+                results[context.path] = {}
+                continue
+            digest = lock.digest()
+            cached = cache.get(digest)
+            if cached is not None:
+                logger.debug(f"Using cached updates for {lock.path}")
+                results[context.path] = cached
+            else:
+                pending[context.path] = digest, {p.name: "==" + p.version for p in lock.packages()}
+        if len(pending) > 0:
+            helper = PyPiHelper(
+                concurrency=concurrency, database=database, endpoints=cls._endpoints(contexts)
+            )
+            found = helper.new_versions_many(*[locked for _, locked in pending.values()])
+            for (path, (digest, locked)), updates in zip(pending.items(), found):
+                results[path] = updates
+                failed = sorted(p for p in locked if normalize_pkg_name(p) in helper.failed)
+                if len(failed) > 0:
+                    logger.warning(f"Not caching updates for {path}; lookups failed for {failed}")
+                    continue
+                try:
+                    cache.put(digest, updates)
+                except OSError:
+                    logger.warning(f"Could not cache updates for {path}", exc_info=True)
+        return {context.path: results[context.path] for context in contexts}
+
+    @classmethod
+    def _endpoints(cls, contexts: Sequence[Context]) -> Optional[Endpoints]:
+        # one session serves every project, so the first project's mirrors are used for all
+        return contexts[0].endpoints if len(contexts) > 0 else None
+
+    @classmethod
+    def find_projects(cls, root: Path) -> Sequence[Path]:
+        """
+        Finds directories containing a ``pyproject.toml`` under ``root``.
+        Skips hidden directories and common virtualenv, cache, and build directories.
+        """
+        found = []
+        for parent, dirs, files in os.walk(root):
+            if "pyproject.toml" in files:
+                found.append(Path(parent))
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in _skip_dirs)
+        return found
+
 
 __all__ = ["Update"]
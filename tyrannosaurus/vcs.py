@@ -0,0 +1,291 @@
+"""
+Reads a git work tree's index and ignore files directly, without running git.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import struct
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger(__package__)
+
+
+class GitIndex:
+    """
+    The paths tracked in a git index (``.git/index``), plus every directory containing one.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        self.files = frozenset(p.rstrip("/") for p in paths)
+        dirs = set()
+        for p in self.files:
+            i = p.rfind("/")
+            while i > 0 and p[:i] not in dirs:
+                dirs.add(p[:i])
+                i = p.rfind("/", 0, i)
+        self.dirs = frozenset(dirs)
+
+    @classmethod
+    def read(cls, path: Union[Path, str], hash_size: int = 20) -> GitIndex:
+        """
+        Parses an index file (versions 2 through 4).
+
+        Args:
+            path: The index file
+            hash_size: Bytes per object ID: 20 for SHA-1 repos, 32 for SHA-256
+
+        Raises:
+            ValueError: If the file isn't a git index of a known version
+        """
+        data = Path(path).read_bytes()
+        if data[:4] != b"DIRC":
+            raise ValueError(f"{path} is not a git index")
+        version, count = struct.unpack_from(">II", data, 4)
+        if version not in {2, 3, 4}:
+            raise ValueError(f"Unsupported git index version {version} in {path}")
+        # 10 uint32 fields of stat data, the object ID, then 16 bits of flags
+        name_at = 40 + hash_size + 2
+        names, previous, pos = [], b"", 12
+        for _ in range(count):
+            start = pos
+            (flags,) = struct.unpack_from(">H", data, start + name_at - 2)
+            pos = start + name_at
+            if version >= 3 and flags & 0x4000:
+                pos += 2
+            if version == 4:
+                # each name drops some bytes from the end of the previous one and adds a suffix
+                strip, pos = _varint(data, pos)
+                end = data.index(b"\0", pos)
+                name = previous[: len(previous) - strip] + data[pos:end]
+                pos = end + 1
+            else:
+                end = data.index(b"\0", pos)
+                name = data[pos:end]
+                # entries are NUL-padded to a multiple of 8 bytes
+                pos = start + ((end - start + 8) & ~7)
+            names.append(name.decode(encoding="utf8", errors="surrogateescape"))
+            previous = name
+        return GitIndex(names)
+
+    def __contains__(self, path: str) -> bool:
+        """
+        Whether a path (relative to the work tree, with ``/``) is tracked or has tracked files.
+        """
+        return path in self.files or path in self.dirs
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+
+@dataclass(frozen=True)
+class IgnoreRule:
+    """
+    One line of a ``.gitignore``.
+
+    Attributes:
+        regex: Matches the path relative to ``base`` if anchored, otherwise the name
+        base: The directory of the ignore file, relative to the work tree ("" for the root)
+        negated: The line started with ``!``
+        dir_only: The line ended with ``/``
+        anchored: The pattern contained a ``/`` other than at the end
+    """
+
+    regex: re.Pattern
+    base: str
+    negated: bool
+    dir_only: bool
+    anchored: bool
+
+    @classmethod
+    def parse(cls, line: str, base: str) -> Optional[IgnoreRule]:
+        # trailing spaces are dropped unless escaped
+        line = re.sub(r"(?<!\\) +$", "", line.rstrip("\r\n"))
+        if line == "" or line.startswith("#"):
+            return None
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if line == "":
+            return None
+        return IgnoreRule(re.compile(_translate(line)), base, negated, dir_only, anchored)
+
+    def matches(self, path: str, name: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if not self.anchored:
+            return self.regex.fullmatch(name) is not None
+        if self.base != "":
+            if not path.startswith(self.base + "/"):
+                return False
+            path = path[len(self.base) + 1 :]
+        return self.regex.fullmatch(path) is not None
+
+
+class GitIgnore:
+    """
+    Decides whether paths are ignored by ``.gitignore`` files and ``.git/info/exclude``.
+    Each directory's ``.gitignore`` is read once, the first time a path under it is checked.
+    Global excludes (``core.excludesFile``) are not read.
+    """
+
+    def __init__(self, root: Union[Path, str], excludes: Iterable[Union[Path, str]] = ()):
+        self.root = Path(root)
+        self._excludes = [r for p in excludes for r in self._read(Path(p), "")]
+        self._rules: dict[str, Sequence[IgnoreRule]] = {}
+
+    def ignored(self, path: str, is_dir: bool) -> bool:
+        """
+        Whether ``path`` (relative to the work tree, with ``/``) is ignored.
+        As in git, the last matching line wins, and deeper ignore files take precedence.
+        """
+        parts = path.split("/")
+        name = parts[-1]
+        ignored = False
+        for rule in self._excludes:
+            if rule.matches(path, name, is_dir):
+                ignored = not rule.negated
+        for i in range(len(parts)):
+            for rule in self._rules_in("/".join(parts[:i])):
+                if rule.matches(path, name, is_dir):
+                    ignored = not rule.negated
+        return ignored
+
+    def _rules_in(self, directory: str) -> Sequence[IgnoreRule]:
+        rules = self._rules.get(directory)
+        if rules is None:
+            rules = self._read(self.root / directory / ".gitignore", directory)
+            self._rules[directory] = rules
+        return rules
+
+    def _read(self, path: Path, base: str) -> Sequence[IgnoreRule]:
+        try:
+            lines = path.read_text(encoding="utf8", errors="surrogateescape").splitlines()
+        except OSError:
+            return []
+        return [r for r in (IgnoreRule.parse(line, base) for line in lines) if r is not None]
+
+
+class GitTree:
+    """
+    A git work tree, with its index and ignore files.
+    """
+
+    def __init__(self, root: Union[Path, str], git_dir: Union[Path, str]):
+        self.root = Path(root)
+        self.git_dir = Path(git_dir)
+        index = self.git_dir / "index"
+        self.index = GitIndex.read(index, self._hash_size()) if index.exists() else GitIndex([])
+        self.ignore = GitIgnore(self.root, [self.git_dir / "info" / "exclude"])
+        self._root = os.fspath(self.root)
+
+    @classmethod
+    def find(cls, path: Union[Path, str]) -> Optional[GitTree]:
+        """
+        Finds the work tree containing ``path``, if any.
+        Understands ``.git`` files, as used by worktrees and submodules.
+        """
+        path = Path(path).resolve()
+        for directory in [path, *path.parents]:
+            dot_git = directory / ".git"
+            if dot_git.is_dir():
+                return GitTree(directory, dot_git)
+            if dot_git.is_file():
+                text = dot_git.read_text(encoding="utf8").strip()
+                if text.startswith("gitdir:"):
+                    return GitTree(directory, directory / text[len("gitdir:") :].strip())
+        return None
+
+    def relative(self, path: Union[Path, str]) -> Optional[str]:
+        """
+        The path relative to the work tree, with ``/``, or None if it's outside.
+        """
+        rel = os.path.relpath(os.fspath(path), self._root)
+        if rel == os.curdir or rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            return None
+        return rel.replace(os.sep, "/")
+
+    def tracked(self, path: Union[Path, str]) -> bool:
+        """
+        Whether the path is tracked or is a directory that contains tracked files.
+        """
+        rel = self.relative(path)
+        return rel is not None and rel in self.index
+
+    def prunes(self, directory: Union[Path, str]) -> bool:
+        """
+        Whether a directory is ignored and contains nothing tracked, so it needn't be searched.
+        """
+        rel = self.relative(directory)
+        return rel is not None and rel not in self.index and self.ignore.ignored(rel, True)
+
+    def _hash_size(self) -> int:
+        try:
+            config = (self.git_dir / "config").read_text(encoding="utf8")
+        except OSError:
+            return 20
+        sha256 = re.search(r"(?im)^\s*objectformat\s*=\s*sha256\s*$", config) is not None
+        return 32 if sha256 else 20
+
+
+def _varint(data: bytes, pos: int) -> tuple[int, int]:
+    # git's offset encoding: 7 bits per byte, most significant first, with an off-by-one per byte
+    c = data[pos]
+    pos += 1
+    value = c & 0x7F
+    while c & 0x80:
+        c = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (c & 0x7F)
+    return value, pos
+
+
+def _translate(pattern: str) -> str:
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+            while i < n and pattern[i] == "*":
+                i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[" and (j := pattern.find("]", i + 2)) > 0:
+            content = pattern[i + 1 : j].replace("\\", "\\\\")
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            out.append(f"[{content}]")
+            i = j + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+__all__ = ["GitIgnore", "GitIndex", "GitTree", "IgnoreRule"]
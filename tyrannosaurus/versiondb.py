@@ -0,0 +1,214 @@
+"""
+Local database of the latest PyPi versions, kept current with PyPi's changelog serial.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import xmlrpc.client
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import httpx
+
+from tyrannosaurus.cache import user_cache_dir
+from tyrannosaurus.endpoints import Endpoints
+from tyrannosaurus.session import Session
+from tyrannosaurus.versions import Version
+
+logger = logging.getLogger(__package__)
+
+_schema = """
+CREATE TABLE IF NOT EXISTS packages (
+    name    TEXT PRIMARY KEY,
+    version TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class VersionDatabase:
+    """
+    An SQLite table of normalized package names to their latest versions.
+
+    Packages are added as they are first resolved (see :meth:`put`).
+    :meth:`sync` then applies only the events since the last seen serial
+    from PyPi's ``changelog_since_serial`` XML-RPC feed (or any server speaking the same protocol),
+    so keeping many packages current costs one small request.
+    Serials from different indexes can't be compared, so the index that issued the serial is
+    recorded with it; if another index has to answer, the database starts over.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        url: Optional[str] = None,
+        client: Optional[httpx.Client] = None,
+        urls: Optional[Sequence[str]] = None,
+    ):
+        """
+        Constructor.
+
+        Args:
+            path: The SQLite file; created if needed
+            url: The XML-RPC endpoint; shorthand for ``urls=[url]``
+            client: HTTP client [default: the shared :class:`Session` client]
+            urls: XML-RPC endpoints to try in order [default: :attr:`Endpoints.pypi`]
+        """
+        self.path = Path(path)
+        if url is not None:
+            urls = [url]
+        self.urls = list(Endpoints.of().pypi if urls is None else urls)
+        self.client = client
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(_schema)
+
+    @classmethod
+    def default_path(cls) -> Path:
+        return user_cache_dir() / "versions.sqlite"
+
+    @property
+    def serial(self) -> Optional[int]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'serial'").fetchone()
+        return None if row is None else int(row[0])
+
+    @property
+    def serial_url(self) -> Optional[str]:
+        """
+        The endpoint that issued :attr:`serial`.
+        """
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'serial_url'").fetchone()
+        return None if row is None else row[0]
+
+    def get(self, name: str) -> Optional[str]:
+        row = self._conn.execute("SELECT version FROM packages WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def get_many(self, names: Sequence[str]) -> Mapping[str, str]:
+        found = {}
+        # SQLite limits the number of host parameters per statement
+        for i in range(0, len(names), 500):
+            chunk = names[i : i + 500]
+            marks = ",".join("?" * len(chunk))
+            query = f"SELECT name, version FROM packages WHERE name IN ({marks})"  # nosec
+            found.update(self._conn.execute(query, chunk).fetchall())
+        return found
+
+    def put(self, name: str, version: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO packages (name, version) VALUES (?, ?)", (name, version)
+            )
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM packages").fetchone()[0]
+
+    def sync(self) -> int:
+        """
+        Applies changelog events since the last sync.
+        On the first call, only records the current serial.
+        The events are only requested from the endpoint that issued the serial.
+        If it can't be reached (or is no longer configured), every package is forgotten
+        and the serial of the next endpoint that answers is recorded instead.
+
+        Returns:
+            The number of packages updated or removed
+        """
+        from tyrannosaurus.helpers import normalize_pkg_name
+
+        serial, source = self.serial, self.serial_url
+        events = None
+        if serial is not None and source in self.urls:
+            try:
+                events = self._call_at(source, "changelog_since_serial", serial)
+            except (OSError, httpx.HTTPError, xmlrpc.client.Error):
+                logger.warning(f"Could not get changelog events from {source}", exc_info=True)
+        if events is None:
+            return self._reset()
+        changed = 0
+        last = serial
+        with self._conn:
+            for name, version, _, action, serial in events:
+                last = max(last, serial)
+                name = normalize_pkg_name(name)
+                current = self.get(name)
+                if current is None:
+                    continue
+                changed += self._apply(name, current, version, str(action))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('serial', ?)", (str(last),)
+            )
+        logger.info(f"Applied {len(events)} PyPi changelog events; {changed} packages changed")
+        return changed
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _apply(self, name: str, current: str, version: Optional[str], action: str) -> int:
+        if action == "remove project" or (
+            version == current and action.startswith(("remove release", "yank release"))
+        ):
+            # forget it; it will be resolved again on the next lookup
+            self._conn.execute("DELETE FROM packages WHERE name = ?", (name,))
+            return 1
+        if version is None or action != "new release":
+            return 0
+        try:
+            new, old = Version.parse(version), Version.parse(current)
+        except ValueError:
+            return 0
+        if new.is_prerelease or new <= old:
+            return 0
+        self._conn.execute("UPDATE packages SET version = ? WHERE name = ?", (version, name))
+        return 1
+
+    def _reset(self) -> int:
+        serial, url = self._call("changelog_last_serial")
+        had_serial = self.serial is not None
+        with self._conn:
+            removed = self._conn.execute("DELETE FROM packages").rowcount if had_serial else 0
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("serial", str(serial)), ("serial_url", url)],
+            )
+        if removed > 0:
+            logger.warning(f"Started over with the serial from {url}; forgot {removed} packages")
+        return removed
+
+    def _call(self, method: str, *params) -> tuple[Any, str]:
+        # returns the result and the endpoint that gave it
+        for url in self.urls[:-1]:
+            try:
+                return self._call_at(url, method, *params), url
+            except (OSError, httpx.HTTPError, xmlrpc.client.Error):
+                logger.warning(f"XML-RPC call {method} to {url} failed", exc_info=True)
+        return self._call_at(self.urls[-1], method, *params), self.urls[-1]
+
+    def _call_at(self, url: str, method: str, *params) -> Any:
+        client = Session.get().client if self.client is None else self.client
+        body = xmlrpc.client.dumps(params, methodname=method)
+        r = client.post(url, content=body, headers={"Content-Type": "text/xml"})
+        r.raise_for_status()
+        (result,), _ = xmlrpc.client.loads(r.content)
+        return result
+
+    def __enter__(self) -> VersionDatabase:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+__all__ = ["VersionDatabase"]
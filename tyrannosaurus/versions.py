@@ -0,0 +1,379 @@
+"""
+PEP 440 versions and Poetry / PEP 440 version constraints.
+
+Original source: https://github.com/dmyersturnbull/tyrannosaurus
+Copyright 2020–2022 Douglas Myers-Turnbull
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://www.apache.org/licenses/LICENSE-2.0
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import re
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger(__package__)
+
+_version_pattern = re.compile(
+    r"""
+    v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:\.[0-9]+)*)
+    (?:[-_.]?(?P<pre_l>alpha|beta|preview|pre|rc|a|b|c)[-_.]?(?P<pre_n>[0-9]+)?)?
+    (?:-(?P<post_n1>[0-9]+)|[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?)?
+    (?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>[0-9]+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+_clause_pattern = re.compile(r"(\^|~=|~|===|==|!=|<=|>=|<|>|=)?\s*(\*|[0-9vV][0-9A-Za-z.*+!_-]*)")
+_pre_letters = {"a": "a", "alpha": "a", "b": "b", "beta": "b", "c": "rc", "rc": "rc"}
+_pre_letters.update({"pre": "rc", "preview": "rc"})
+_pre_ranks = {"a": 0, "b": 1, "rc": 2}
+
+
+@functools.total_ordering
+@dataclass(frozen=True, eq=False)
+class Version:
+    """
+    A PEP 440 version, ordered as PEP 440 specifies (e.g. ``1.0.dev1 < 1.0a1 < 1.0 < 1.0.post1``).
+    Trailing zeros are insignificant, so ``1.2 == 1.2.0``.
+    """
+
+    epoch: int
+    release: tuple[int, ...]
+    pre: Optional[tuple[str, int]] = None
+    post: Optional[int] = None
+    dev: Optional[int] = None
+    local: Optional[str] = None
+    text: str = field(default="", compare=False)
+
+    @classmethod
+    def parse(cls, s: str) -> Version:
+        """
+        Parses a version, memoized.
+
+        Raises:
+            ValueError: If ``s`` is not a valid PEP 440 version
+        """
+        return _parse_version(str(s).strip())
+
+    @property
+    def is_prerelease(self) -> bool:
+        return self.pre is not None or self.dev is not None
+
+    @property
+    def key(self) -> tuple:
+        release = self.release
+        while len(release) > 1 and release[-1] == 0:
+            release = release[:-1]
+        if self.pre is None and self.post is None and self.dev is not None:
+            pre = (0,)  # 1.0.dev1 sorts before 1.0a1
+        elif self.pre is None:
+            pre = (3,)
+        else:
+            pre = (1, _pre_ranks[self.pre[0]], self.pre[1])
+        post = (0,) if self.post is None else (1, self.post)
+        dev = (1,) if self.dev is None else (0, self.dev)
+        # numeric segments compare as integers and sort after (case-insensitive) strings
+        local = tuple(
+            (1, int(seg)) if seg.isdigit() else (0, seg.lower())
+            for seg in re.split(r"[-_.]", self.local or "")
+            if seg != ""
+        )
+        return self.epoch, release, pre, post, dev, local
+
+    def bump(self, index: int) -> Version:
+        """
+        The release with the component at ``index`` incremented and everything after it dropped.
+        For example, ``Version.parse("1.2.3").bump(1)`` is ``1.3``.
+        """
+        release = self.release + (0,) * (index + 1 - len(self.release))
+        bumped = (*release[:index], release[index] + 1)
+        return Version(self.epoch, bumped, text=".".join(str(r) for r in bumped))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Version) and self.key == other.key
+
+    def __lt__(self, other: Version) -> bool:
+        return self.key < other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@dataclass(frozen=True)
+class Bound:
+    version: Version
+    inclusive: bool
+
+
+@dataclass(frozen=True)
+class Interval:
+    """
+    A contiguous range of versions; a missing bound is unbounded.
+    """
+
+    lower: Optional[Bound] = None
+    upper: Optional[Bound] = None
+
+    def __contains__(self, v: Version) -> bool:
+        if self.lower is not None:
+            if v < self.lower.version or v == self.lower.version and not self.lower.inclusive:
+                return False
+        if self.upper is not None:
+            if v > self.upper.version or v == self.upper.version and not self.upper.inclusive:
+                return False
+        return True
+
+    @property
+    def is_empty(self) -> bool:
+        if self.lower is None or self.upper is None:
+            return False
+        lo, hi = self.lower, self.upper
+        return lo.version > hi.version or (
+            lo.version == hi.version and not (lo.inclusive and hi.inclusive)
+        )
+
+    def intersect(self, other: Interval) -> Interval:
+        return Interval(
+            self._tighter(self.lower, other.lower, lower=True),
+            self._tighter(self.upper, other.upper, lower=False),
+        )
+
+    def _tighter(self, a: Optional[Bound], b: Optional[Bound], lower: bool) -> Optional[Bound]:
+        if a is None or b is None:
+            return b if a is None else a
+        if a.version == b.version:
+            return a if not a.inclusive else b
+        if lower:
+            return a if a.version > b.version else b
+        return a if a.version < b.version else b
+
+
+@dataclass(frozen=True)
+class VersionRange:
+    """
+    A version constraint, as a union of :class:`Interval` objects.
+    """
+
+    intervals: tuple[Interval, ...]
+    text: str = ""
+
+    @classmethod
+    def parse(cls, spec: str) -> VersionRange:
+        """
+        Parses a Poetry or PEP 440 constraint, memoized.
+        Understands ``^``, ``~``, ``~=``, ``*`` and ``.*`` wildcards, comparison operators,
+        ``,`` or whitespace for "and", and ``||`` for "or".
+
+        Raises:
+            ValueError: If the constraint cannot be parsed
+        """
+        return _parse_range(str(spec).strip())
+
+    def __contains__(self, v: Version) -> bool:
+        return any(v in i for i in self.intervals)
+
+    @property
+    def floor(self) -> Optional[Version]:
+        """
+        The lowest version explicitly allowed, or None if unbounded below.
+        """
+        lowers = [i.lower.version for i in self.intervals if i.lower is not None]
+        if len(lowers) < len(self.intervals):
+            return None
+        return min(lowers) if len(lowers) > 0 else None
+
+    @property
+    def mentions_prerelease(self) -> bool:
+        bounds = [b for i in self.intervals for b in [i.lower, i.upper] if b is not None]
+        return any(b.version.is_prerelease for b in bounds)
+
+    def intersect(self, other: VersionRange) -> VersionRange:
+        intervals = [a.intersect(b) for a in self.intervals for b in other.intervals]
+        return VersionRange(tuple(i for i in intervals if not i.is_empty), self.text)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+class VersionEngine:
+    """
+    Compares dependency constraints against available versions, in batches.
+    Parsing is memoized, so the engine is cheap to share and to call repeatedly.
+    """
+
+    def constraint(self, spec: Any) -> Optional[VersionRange]:
+        """
+        Gets the constraint for a Poetry dependency value.
+
+        Args:
+            spec: A constraint string, a table like ``{version="^1.0", extras=[...]}``,
+                  or a list of such tables (for multiple-constraint dependencies)
+
+        Returns:
+            The constraint, or None for dependencies without one (e.g. git or path dependencies)
+        """
+        if isinstance(spec, (list, tuple)):
+            ranges = [r for r in map(self.constraint, spec) if r is not None]
+            if len(ranges) == 0:
+                return None
+            text = " || ".join(r.text for r in ranges)
+            return VersionRange(tuple(i for r in ranges for i in r.intervals), text)
+        if isinstance(spec, Mapping):
+            spec = spec.get("version")
+            if spec is None:
+                return None
+        try:
+            return VersionRange.parse(str(spec))
+        except ValueError:
+            logger.error(f"Could not parse version constraint '{spec}'")
+            return None
+
+    def is_update(self, constraint: VersionRange, latest: Version) -> bool:
+        """
+        Whether ``latest`` is newer than anything the constraint pins down.
+        Pre-releases only count if the constraint itself mentions one.
+        """
+        if latest.is_prerelease and not constraint.mentions_prerelease:
+            return False
+        floor = constraint.floor
+        if floor is None:
+            return latest not in constraint
+        return latest > floor
+
+    def find_updates(
+        self, current: Mapping[str, Any], latest: Mapping[str, str]
+    ) -> Mapping[str, tuple[str, str]]:
+        """
+        Finds real updates for a batch of dependencies.
+
+        Args:
+            current: Package names mapped to Poetry dependency values
+            latest: Package names mapped to their latest versions
+
+        Returns:
+            Package names mapped to (current floor, latest) for only the packages with updates
+        """
+        updates = {}
+        for pkg, spec in current.items():
+            if pkg not in latest:
+                continue
+            constraint = self.constraint(spec)
+            try:
+                version = Version.parse(latest[pkg])
+            except ValueError:
+                logger.error(f"Invalid version {latest[pkg]} for {pkg}")
+                continue
+            if constraint is not None and self.is_update(constraint, version):
+                floor = constraint.floor
+                updates[pkg] = (constraint.text if floor is None else str(floor), str(version))
+        return updates
+
+    def to_conda(self, spec: str) -> str:
+        """
+        Converts a Poetry constraint to a Conda match spec version, e.g. ``^1.2`` to ``>=1.2,<2.0``.
+        """
+        clauses = []
+        for clause in str(spec).split(","):
+            clause = clause.replace(" ", "")
+            if clause in {"", "*"}:
+                continue
+            if clause[0] in "^~" and not clause.startswith("~="):
+                interval = VersionRange.parse(clause).intervals[0]
+                lower, upper = interval.lower.version, interval.upper.version
+                padding = (0,) * (len(lower.release) - len(upper.release))
+                upper_text = ".".join(str(r) for r in upper.release + padding)
+                clauses.append(f">={lower},<{upper_text}")
+            else:
+                clauses.append(clause)
+        return ",".join(clauses)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_version(s: str) -> Version:
+    match = _version_pattern.fullmatch(s)
+    if match is None:
+        raise ValueError(f"Invalid version '{s}'")
+    pre = None
+    if match.group("pre_l") is not None:
+        pre = _pre_letters[match.group("pre_l").lower()], int(match.group("pre_n") or 0)
+    post = None
+    if match.group("post_n1") is not None:
+        post = int(match.group("post_n1"))
+    elif match.group("post_l") is not None:
+        post = int(match.group("post_n2") or 0)
+    dev = None if match.group("dev_l") is None else int(match.group("dev_n") or 0)
+    return Version(
+        epoch=int(match.group("epoch") or 0),
+        release=tuple(int(r) for r in match.group("release").split(".")),
+        pre=pre,
+        post=post,
+        dev=dev,
+        local=match.group("local"),
+        text=s.lstrip("vV"),
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_range(spec: str) -> VersionRange:
+    intervals = []
+    for alternative in re.split(r"\|\|?", spec):
+        combined = [Interval()]
+        matched = ""
+        for match in _clause_pattern.finditer(alternative):
+            op, text = match.group(1) or "", match.group(2)
+            matched += match.group(0)
+            clause = _parse_clause(op, text)
+            combined = [a.intersect(b) for a in combined for b in clause]
+            combined = [i for i in combined if not i.is_empty]
+        if re.sub(r"[\s,]", "", alternative) != re.sub(r"\s", "", matched):
+            raise ValueError(f"Invalid version constraint '{spec}'")
+        intervals.extend(combined)
+    return VersionRange(tuple(intervals), spec)
+
+
+def _parse_clause(op: str, text: str) -> list[Interval]:
+    if text == "*":
+        return [Interval()]
+    if text.endswith(".*"):
+        base = Version.parse(text[:-2])
+        matching = Interval(Bound(base, True), Bound(base.bump(len(base.release) - 1), False))
+        if op == "!=":
+            return [Interval(upper=Bound(base, False)), Interval(lower=matching.upper)]
+        return [matching]
+    v = Version.parse(text)
+    if op == "^":
+        nonzero = [i for i, r in enumerate(v.release) if r != 0]
+        index = nonzero[0] if len(nonzero) > 0 else len(v.release) - 1
+        return [Interval(Bound(v, True), Bound(v.bump(index), False))]
+    if op == "~":
+        return [Interval(Bound(v, True), Bound(v.bump(1 if len(v.release) > 1 else 0), False))]
+    if op == "~=":
+        if len(v.release) < 2:
+            raise ValueError(f"~= requires at least two release components, not '{text}'")
+        return [Interval(Bound(v, True), Bound(v.bump(len(v.release) - 2), False))]
+    if op in {"", "=", "==", "==="}:
+        return [Interval(Bound(v, True), Bound(v, True))]
+    if op == "!=":
+        return [Interval(upper=Bound(v, False)), Interval(lower=Bound(v, False))]
+    return [
+        {
+            ">=": Interval(lower=Bound(v, True)),
+            ">": Interval(lower=Bound(v, False)),
+            "<=": Interval(upper=Bound(v, True)),
+            "<": Interval(upper=Bound(v, False)),
+        }[op]
+    ]
+
+
+__all__ = ["Bound", "Interval", "Version", "VersionEngine", "VersionRange"]